@@ -57,6 +57,104 @@ uint8_t rx_byte;               // Donde cae el byte que acaba de llegar
 uint8_t rx_buffer[RX_BUFFER_SIZE]; // Donde armamos la frase completa
 uint8_t rx_index = 0;          // Posición actual en el buffer
 volatile uint8_t comando_listo = 0; // Bandera: 1 = ¡Llegó una orden completa!
+
+// --- PROTOCOLO BINARIO (ver protocolo_binario.py en la Raspberry) ---
+// Trama: A5 | largo | seq | tipo | carga | CRC-16 (CCITT-FALSE, little-endian)
+// La Raspberry lo pide con la línea "B"; la línea "I" vuelve al texto.
+#define TRAMA_SYNC       0xA5
+#define TRAMA_CABECERA   4
+#define TRAMA_CARGA_MAX  64  // La trama PROGRAMA lleva una ruta entera
+#define TRAMA_MAX        (TRAMA_CABECERA + TRAMA_CARGA_MAX + 2)
+#define VENTANA_SEQ      32  // Seq recientes que se recuerdan para no ejecutar dos veces
+#define PROTOCOLO_VERSION 4
+#define CAPACIDAD_BINARIO 0x01
+#define CAPACIDAD_PROGRAMAS 0x02
+
+// Tipos Raspberry -> placa
+#define TRAMA_MOVER_H    0x01
+#define TRAMA_MOVER_V    0x02
+#define TRAMA_MOVER_L    0x03
+#define TRAMA_MOVER_R    0x04
+#define TRAMA_SERVO      0x05
+#define TRAMA_RESET      0x06
+#define TRAMA_IDENTIFICAR 0x07
+#define TRAMA_PARADA     0x08  // H0 + V0 + servo cerrado
+#define TRAMA_PROGRAMA   0x09  // Largo variable: ver PROGRAMAS más abajo
+// Tipos placa -> Raspberry
+#define TRAMA_ACK        0x80
+#define TRAMA_FIN        0x81
+#define TRAMA_IN         0x82
+#define TRAMA_OUT        0x83
+#define TRAMA_STOP       0x84
+#define TRAMA_ID         0x85
+#define TRAMA_RST        0x86
+#define TRAMA_PROGRESO   0x87  // programa | paso | estado
+// Estados del ACK
+#define ACK_OK           0
+#define ACK_REPETIDO     1  // Ya se había ejecutado (se perdió el primer ACK)
+#define ACK_DESCONOCIDO  2
+#define ACK_VIEJO        3  // Fuera de la ventana: no se ejecutó
+
+volatile uint8_t modo_binario = 0;
+uint8_t seq_tx = 0;                  // Seq de los avisos que manda la placa
+uint8_t trama_rx[TRAMA_MAX];         // Trama que se está armando
+uint8_t trama_pos = 0;               // 0 = no hay trama en curso
+// Después de una trama rota (CRC o largo) el resto de sus bytes llega como
+// "texto": en binario se descarta todo hasta el próximo '\n'
+volatile uint8_t texto_descartar = 0;
+uint8_t ultimo_seq_rx = 0;
+uint32_t seq_vistos = 0;             // Bit k: ya se ejecutó ultimo_seq_rx - k (0 = ninguno)
+
+// Los ACK se arman en el ISR y se mandan desde el while(1)
+#define ACKS_COLA 8
+volatile uint8_t acks_seq[ACKS_COLA];
+volatile uint8_t acks_estado[ACKS_COLA];
+volatile uint8_t acks_escribir = 0;
+volatile uint8_t acks_leer = 0;
+volatile uint8_t aviso_id = 0;
+volatile uint8_t aviso_rst = 0;
+// Respuestas de texto a comandos del ISR: también las manda el while(1), así
+// nunca se mezclan con una trama a medio salir ni bloquean el ISR
+volatile uint8_t aviso_id_texto = 0;
+volatile uint8_t aviso_baudios_ok = 0;
+volatile uint8_t aviso_eco = 0;
+char eco_prueba[32];                 // Patrón del último T (RX_BUFFER_SIZE)
+
+// --- VELOCIDAD DE LA UART (comando U) ---
+// U<baudios>: se contesta #BAUD,<baudios> y se cambia; la Raspberry prueba el
+// enlace con T<patron> y confirma con U0. Sin confirmación se vuelve a la base.
+#define BAUDIOS_BASE        115200
+#define VENTANA_BAUDIOS_MS  1000
+volatile uint32_t baudios_pedidos = 0;       // Lo levanta el ISR, lo atiende el while(1)
+volatile uint8_t baudios_sin_confirmar = 0;
+uint32_t baudios_limite = 0;
+
+// --- PROGRAMAS (ver programa_placa.py en la Raspberry) ---
+// Carga: programa | op valores | op valores | ... El while(1) ejecuta los
+// pasos seguidos (EjecutarPrograma) y avisa con TRAMA_PROGRESO cuando empieza
+// cada uno, cuando termina y si se aborta (botón azul o TRAMA_PARADA).
+#define OP_MOVER_H       0x01  // int32: pasos; sigue cuando salió el #FIN,H
+#define OP_MOVER_V       0x02  // int32: pasos; sigue cuando salió el #FIN,V
+#define OP_COMBINADO     0x03  // int32 H + int32 V: espera los dos
+#define OP_SERVO         0x04  // uint16: ángulo
+#define OP_PAUSA         0x05  // uint16: milisegundos
+#define PRG_PASO         0
+#define PRG_TERMINADO    1
+#define PRG_ABORTADO     2
+#define ESPERA_H         0x01
+#define ESPERA_V         0x02
+#define ESPERA_PAUSA     0x04
+
+uint8_t programa_rx[TRAMA_CARGA_MAX];        // Lo copia el ISR
+volatile uint8_t programa_rx_largo = 0;      // != 0: hay uno nuevo para arrancar
+volatile uint8_t programa_abortar = 0;
+uint8_t programa[TRAMA_CARGA_MAX];           // El que ejecuta el while(1)
+uint8_t programa_largo = 0;
+uint8_t programa_pos = 0;
+uint8_t programa_paso = 0;
+uint8_t programa_corriendo = 0;
+uint8_t programa_espera = 0;                 // ESPERA_* que faltan para el próximo paso
+uint32_t programa_pausa_hasta = 0;
 /* USER CODE END PV */
 
 /* Private function prototypes -----------------------------------------------*/
@@ -80,6 +178,12 @@ volatile int32_t pasos_restantes_horiz = 0;
 volatile int32_t pasos_restantes_v_izq = 0; // Motor M1
 volatile int32_t pasos_restantes_v_der = 0; // Motor M2
 
+// --- AVISOS DE FIN DE MOVIMIENTO ---
+// El ISR solo levanta la bandera; el envío por UART se hace en el while(1)
+volatile uint8_t fin_horiz = 0;
+volatile uint8_t fin_vert  = 0;
+volatile uint8_t parada_boton = 0;
+
 // --- CONTADOR DE CANICAS (DOS SENSORES HC-SR04) ---
 
 int canicasEntrada  = 0;
@@ -148,23 +252,28 @@ void stepper_write(int motor_id, int step_index) {
     }
 }
 
+// Cada orden nueva descarta un aviso de fin pendiente del movimiento anterior
 void Mover_Horizontal(int32_t pasos) {
+    fin_horiz = 0;
     pasos_restantes_horiz = pasos; // + Derecha, - Izquierda
 }
 
 // Mover AMBOS (Comando V normal)
 void Mover_Vertical_Sync(int32_t pasos) {
+    fin_vert = 0;
     pasos_restantes_v_izq = pasos;
     pasos_restantes_v_der = pasos;
 }
 
 // Mover SOLO IZQUIERDA (Nuevo Comando L)
 void Mover_Vertical_L(int32_t pasos) {
+    fin_vert = 0;
     pasos_restantes_v_izq = pasos;
 }
 
 // Mover SOLO DERECHA (Nuevo Comando R)
 void Mover_Vertical_R(int32_t pasos) {
+    fin_vert = 0;
     pasos_restantes_v_der = pasos;
 }
 
@@ -185,12 +294,16 @@ void Mover_Servo(uint16_t angulo) {
 void HAL_TIM_PeriodElapsedCallback(TIM_HandleTypeDef *htim) {
     if (htim->Instance == TIM2) {
 
+        // El eje vertical termina cuando AMBOS motores llegan a cero
+        bool vert_activo = (pasos_restantes_v_izq != 0) || (pasos_restantes_v_der != 0);
+
         // 1. Motor Horizontal (Sin cambios)
         if (pasos_restantes_horiz != 0) {
             int8_t dir = (pasos_restantes_horiz > 0) ? 1 : -1;
             idx_h = (idx_h + 8 + dir) % 8;
             stepper_write(0, idx_h);
             pasos_restantes_horiz -= dir;
+            if (pasos_restantes_horiz == 0) fin_horiz = 1;
         }
 
         // 2. Motor Vertical IZQUIERDO (M1) - Independiente
@@ -212,6 +325,10 @@ void HAL_TIM_PeriodElapsedCallback(TIM_HandleTypeDef *htim) {
             stepper_write(2, idx_vR);
             pasos_restantes_v_der -= dir_input; // Restamos la intención lógica
         }
+
+        if (vert_activo && pasos_restantes_v_izq == 0 && pasos_restantes_v_der == 0) {
+            fin_vert = 1;
+        }
     }
 }
 
@@ -290,8 +407,46 @@ float MedirDistancia_cm(uint8_t sensor_id)
 //
 // La Raspi simplemente escucha y parsea las líneas que empiezan con "#".
 
+// ================== TRAMAS BINARIAS ==================
+
+uint16_t Crc16(const uint8_t *datos, uint8_t largo)
+{
+    uint16_t crc = 0xFFFF;
+    for (uint8_t i = 0; i < largo; i++)
+    {
+        crc ^= (uint16_t)datos[i] << 8;
+        for (uint8_t b = 0; b < 8; b++)
+        {
+            crc = (crc & 0x8000) ? (uint16_t)((crc << 1) ^ 0x1021) : (uint16_t)(crc << 1);
+        }
+    }
+    return crc;
+}
+
+// Solo desde el while(1): seq_tx no se toca desde los ISR en modo binario
+void EnviarTrama(uint8_t tipo, const void *carga, uint8_t largo)
+{
+    uint8_t trama[TRAMA_MAX];
+    trama[0] = TRAMA_SYNC;
+    trama[1] = largo;
+    trama[2] = seq_tx++;
+    trama[3] = tipo;
+    memcpy(&trama[TRAMA_CABECERA], carga, largo);
+    uint16_t crc = Crc16(&trama[1], TRAMA_CABECERA - 1 + largo);
+    trama[TRAMA_CABECERA + largo]     = crc & 0xFF;
+    trama[TRAMA_CABECERA + largo + 1] = crc >> 8;
+    HAL_UART_Transmit(&huart2, trama, TRAMA_CABECERA + largo + 2, 50);
+}
+
 void EnviarEventoCanica(const char *tipo)  // tipo = "IN" o "OUT"
 {
+    if (modo_binario)
+    {
+        int16_t contadores[3] = { canicasEntrada, canicasSalida, canicasActuales };
+        EnviarTrama(tipo[0] == 'I' ? TRAMA_IN : TRAMA_OUT, contadores, sizeof(contadores));
+        return;
+    }
+
     char msg[64];
     int len = snprintf(msg, sizeof(msg),
                        "#%s,%d,%d,%d\n",
@@ -306,6 +461,244 @@ void EnviarEventoCanica(const char *tipo)  // tipo = "IN" o "OUT"
     }
 }
 
+// ================== AVISOS DE MOVIMIENTO A RASPBERRY ==================
+//
+//   #FIN,H\n   -> el motor horizontal consumió todos sus pasos
+//   #FIN,V\n   -> ambos motores verticales consumieron sus pasos
+//   #STOP\n    -> se presionó el botón de parada de emergencia
+//
+// Se llama desde el while(1): el ISR de TIM2 solo levanta las banderas.
+// En modo binario manda primero los ACK pendientes y cada aviso va en su trama.
+
+void EnviarAvisosMovimiento(void)
+{
+    while (acks_leer != acks_escribir)
+    {
+        uint8_t ack[2] = { acks_seq[acks_leer], acks_estado[acks_leer] };
+        acks_leer = (acks_leer + 1) % ACKS_COLA;
+        EnviarTrama(TRAMA_ACK, ack, sizeof(ack));
+    }
+    if (aviso_id)
+    {
+        aviso_id = 0;
+        uint8_t id[2] = { PROTOCOLO_VERSION, CAPACIDAD_BINARIO | CAPACIDAD_PROGRAMAS };
+        EnviarTrama(TRAMA_ID, id, sizeof(id));
+    }
+    if (aviso_rst)
+    {
+        aviso_rst = 0;
+        const char *msg = "#RST\n";
+        if (modo_binario) EnviarTrama(TRAMA_RST, NULL, 0);
+        else HAL_UART_Transmit(&huart2, (uint8_t*)msg, strlen(msg), 50);
+    }
+    // I, U0 y T se contestan siempre en texto, también en modo binario
+    if (aviso_id_texto)
+    {
+        aviso_id_texto = 0;
+        const char *msg = "#ID,CANICAS,4,BIN,BAUD,PRG\n";
+        HAL_UART_Transmit(&huart2, (uint8_t*)msg, strlen(msg), 50);
+    }
+    if (aviso_baudios_ok)
+    {
+        aviso_baudios_ok = 0;
+        const char *msg = "#BAUD,OK\n";
+        HAL_UART_Transmit(&huart2, (uint8_t*)msg, strlen(msg), 50);
+    }
+    if (aviso_eco)
+    {
+        char msg[sizeof(eco_prueba) + 8];
+        __disable_irq();  // Un T nuevo no pisa el patrón mientras se copia
+        int len = snprintf(msg, sizeof(msg), "#T,%s\n", eco_prueba);
+        aviso_eco = 0;
+        __enable_irq();
+        HAL_UART_Transmit(&huart2, (uint8_t*)msg, (uint16_t)len, 50);
+    }
+    if (fin_horiz)
+    {
+        fin_horiz = 0;
+        const char *msg = "#FIN,H\n";
+        if (modo_binario) EnviarTrama(TRAMA_FIN, "H", 1);
+        else HAL_UART_Transmit(&huart2, (uint8_t*)msg, strlen(msg), 50);
+    }
+    if (fin_vert)
+    {
+        fin_vert = 0;
+        const char *msg = "#FIN,V\n";
+        if (modo_binario) EnviarTrama(TRAMA_FIN, "V", 1);
+        else HAL_UART_Transmit(&huart2, (uint8_t*)msg, strlen(msg), 50);
+    }
+    if (parada_boton)
+    {
+        parada_boton = 0;
+        const char *msg = "#STOP\n";
+        if (modo_binario) EnviarTrama(TRAMA_STOP, NULL, 0);
+        else HAL_UART_Transmit(&huart2, (uint8_t*)msg, strlen(msg), 50);
+    }
+}
+
+
+// ================== PROGRAMAS ==================
+
+static void EnviarProgreso(uint8_t estado)
+{
+    uint8_t progreso[3] = { programa[0], programa_paso, estado };
+    EnviarTrama(TRAMA_PROGRESO, progreso, sizeof(progreso));
+}
+
+// Se llama desde el while(1) después de EnviarAvisosMovimiento: cuando un
+// movimiento terminó su #FIN ya salió y el próximo paso arranca enseguida.
+// Atiende un STOP (botón o TRAMA_PARADA); devuelve 1 si había uno
+static uint8_t AbortarPrograma(void)
+{
+    if (!programa_abortar) return 0;
+    programa_abortar = 0;
+    if (programa_corriendo)
+    {
+        programa_corriendo = 0;
+        if (programa_paso > 0) programa_paso--;  // El que se estaba ejecutando
+        EnviarProgreso(PRG_ABORTADO);
+    }
+    return 1;
+}
+
+void EjecutarPrograma(void)
+{
+    AbortarPrograma();
+
+    // Con las interrupciones apagadas: un STOP no puede colarse entre mirar
+    // programa_rx_largo y copiarlo (el ISR lo pone en 0 al parar)
+    __disable_irq();
+    uint8_t nuevo = programa_rx_largo;
+    if (nuevo)
+    {
+        memcpy(programa, programa_rx, nuevo);
+        programa_largo = nuevo;
+        programa_rx_largo = 0;
+    }
+    __enable_irq();
+    if (nuevo)
+    {
+        // Uno nuevo reemplaza al que estuviera corriendo
+        programa_pos = 1;
+        programa_paso = 0;
+        programa_espera = 0;
+        programa_corriendo = 1;
+    }
+
+    while (programa_corriendo)
+    {
+        // EnviarProgreso bloquea: un STOP en el medio no deja arrancar otro paso
+        if (AbortarPrograma()) return;
+        if ((programa_espera & ESPERA_H) && (pasos_restantes_horiz != 0 || fin_horiz)) return;
+        if ((programa_espera & ESPERA_V) &&
+            (pasos_restantes_v_izq != 0 || pasos_restantes_v_der != 0 || fin_vert)) return;
+        if ((programa_espera & ESPERA_PAUSA) && (int32_t)(HAL_GetTick() - programa_pausa_hasta) < 0) return;
+        programa_espera = 0;
+
+        if (programa_pos >= programa_largo)
+        {
+            programa_corriendo = 0;
+            EnviarProgreso(PRG_TERMINADO);
+            return;
+        }
+        EnviarProgreso(PRG_PASO);
+        programa_paso++;
+
+        // ProgramaValido ya revisó que cada op trae sus valores completos
+        uint8_t op = programa[programa_pos++];
+        int32_t horiz = 0, vert = 0;
+        uint16_t valor = 0;
+        switch (op)
+        {
+            case OP_MOVER_H:
+                memcpy(&horiz, &programa[programa_pos], 4);
+                programa_pos += 4;
+                break;
+            case OP_MOVER_V:
+                memcpy(&vert, &programa[programa_pos], 4);
+                programa_pos += 4;
+                break;
+            case OP_COMBINADO:
+                memcpy(&horiz, &programa[programa_pos], 4);
+                memcpy(&vert, &programa[programa_pos + 4], 4);
+                programa_pos += 8;
+                break;
+            default:  // OP_SERVO, OP_PAUSA
+                memcpy(&valor, &programa[programa_pos], 2);
+                programa_pos += 2;
+                break;
+        }
+        // El STOP se revisa con las interrupciones apagadas: si el botón llegó
+        // durante el aviso de progreso, el paso no mueve nada
+        __disable_irq();
+        if (!programa_abortar)
+        {
+            if (horiz != 0)
+            {
+                Mover_Horizontal(horiz);
+                programa_espera |= ESPERA_H;
+            }
+            if (vert != 0)
+            {
+                Mover_Vertical_Sync(vert);
+                programa_espera |= ESPERA_V;
+            }
+            if (op == OP_SERVO) Mover_Servo(valor);
+        }
+        __enable_irq();
+        if (op == OP_PAUSA && valor != 0)
+        {
+            programa_pausa_hasta = HAL_GetTick() + valor;
+            programa_espera |= ESPERA_PAUSA;
+        }
+    }
+}
+
+
+// ================== CAMBIO DE VELOCIDAD DE LA UART ==================
+
+static uint8_t BaudiosValidos(uint32_t baudios)
+{
+    // USART2 en APB1 (42 MHz): hasta 921600 el error del divisor queda debajo del 1%
+    return baudios == 115200 || baudios == 230400 || baudios == 460800 || baudios == 921600;
+}
+
+static void CambiarBaudios(uint32_t baudios)
+{
+    HAL_UART_AbortReceive(&huart2);
+    huart2.Init.BaudRate = baudios;
+    if (HAL_UART_Init(&huart2) != HAL_OK)
+    {
+        Error_Handler();
+    }
+    rx_index = 0;  // Lo que llegó a mitad del cambio es basura
+    trama_pos = 0;
+    texto_descartar = 0;
+    HAL_UART_Receive_IT(&huart2, &rx_byte, 1);
+}
+
+// Se llama desde el while(1): contesta a la velocidad vieja y recién ahí cambia
+void AtenderBaudios(void)
+{
+    if (baudios_pedidos)
+    {
+        uint32_t baudios = baudios_pedidos;
+        baudios_pedidos = 0;
+        char msg[24];
+        int len = snprintf(msg, sizeof(msg), "#BAUD,%lu\n", (unsigned long)baudios);
+        // HAL_UART_Transmit espera TC: cuando vuelve ya salió el último bit
+        HAL_UART_Transmit(&huart2, (uint8_t*)msg, (uint16_t)len, 50);
+        CambiarBaudios(baudios);
+        baudios_limite = HAL_GetTick() + VENTANA_BAUDIOS_MS;
+        baudios_sin_confirmar = 1;
+    }
+    if (baudios_sin_confirmar && (int32_t)(HAL_GetTick() - baudios_limite) >= 0)
+    {
+        // No llegó U0: la Raspberry no pudo leer la prueba a esta velocidad
+        baudios_sin_confirmar = 0;
+        CambiarBaudios(BAUDIOS_BASE);
+    }
+}
 
 /* USER CODE END 0 */
 
@@ -361,6 +754,11 @@ int main(void)
     while (1)
     {
         // ====================== ULTRASONIDO: MEDICIÓN Y CONTEO ======================
+        // Avisar primero los fines de movimiento (la Raspi espera por ellos)
+        EnviarAvisosMovimiento();
+        EjecutarPrograma();
+        AtenderBaudios();
+
         uint32_t ahora = HAL_GetTick();
 
         // Medimos solo cada 'intervaloMuestreo' ms para no saturar
@@ -734,18 +1132,171 @@ static void MX_GPIO_Init(void)
 }
 
 /* USER CODE BEGIN 4 */
+// --- RECEPCION DE TRAMAS BINARIAS (desde el ISR del UART) ---
+
+// Devuelve ACK_OK si el seq es nuevo (o uno perdido dentro de la ventana)
+static uint8_t RegistrarSeq(uint8_t seq)
+{
+    if (seq_vistos == 0)
+    {
+        ultimo_seq_rx = seq;
+        seq_vistos = 1;
+        return ACK_OK;
+    }
+    int8_t d = (int8_t)(uint8_t)(seq - ultimo_seq_rx);
+    if (d > 0)
+    {
+        seq_vistos = (d >= VENTANA_SEQ) ? 1 : ((seq_vistos << d) | 1);
+        ultimo_seq_rx = seq;
+        return ACK_OK;
+    }
+    if (-d >= VENTANA_SEQ) return ACK_VIEJO;
+    if (seq_vistos & (1UL << -d)) return ACK_REPETIDO;
+    seq_vistos |= (1UL << -d);
+    return ACK_OK;
+}
+
+// Revisa que cada operación del programa sea conocida y traiga sus valores
+static uint8_t ProgramaValido(const uint8_t *carga, uint8_t largo)
+{
+    if (largo == 0) return 0;
+    uint8_t i = 1;
+    while (i < largo)
+    {
+        uint8_t op = carga[i++];
+        uint8_t valores;
+        if (op == OP_MOVER_H || op == OP_MOVER_V) valores = 4;
+        else if (op == OP_COMBINADO) valores = 8;
+        else if (op == OP_SERVO || op == OP_PAUSA) valores = 2;
+        else return 0;
+        if (i + valores > largo) return 0;
+        i += valores;
+    }
+    return 1;
+}
+
+// Ejecuta la orden de una trama; devuelve 0 si el tipo o el largo no se conocen
+static uint8_t EjecutarTrama(uint8_t tipo, const uint8_t *carga, uint8_t largo)
+{
+    int32_t pasos = 0;
+    uint16_t angulo = 0;
+    if (tipo == TRAMA_PROGRAMA)
+    {
+        // Lo arranca el while(1); acá solo se copia
+        if (!ProgramaValido(carga, largo)) return 0;
+        memcpy(programa_rx, carga, largo);
+        programa_rx_largo = largo;
+        return 1;
+    }
+    if (tipo >= TRAMA_MOVER_H && tipo <= TRAMA_MOVER_R)
+    {
+        if (largo != sizeof(pasos)) return 0;
+        memcpy(&pasos, carga, sizeof(pasos));
+    }
+    else if (tipo == TRAMA_SERVO)
+    {
+        if (largo != sizeof(angulo)) return 0;
+        memcpy(&angulo, carga, sizeof(angulo));
+    }
+    else if (largo != 0)
+    {
+        return 0;
+    }
+
+    switch (tipo)
+    {
+        case TRAMA_MOVER_H: Mover_Horizontal(pasos); break;
+        case TRAMA_MOVER_V: Mover_Vertical_Sync(pasos); break;
+        case TRAMA_MOVER_L: Mover_Vertical_L(pasos); break;
+        case TRAMA_MOVER_R: Mover_Vertical_R(pasos); break;
+        case TRAMA_SERVO:   Mover_Servo(angulo); break;
+        case TRAMA_RESET:
+            canicasEntrada  = 0;
+            canicasSalida   = 0;
+            canicasActuales = 0;
+            canicaDetectada1 = false;
+            canicaDetectada2 = false;
+            aviso_rst = 1;
+            break;
+        case TRAMA_IDENTIFICAR: aviso_id = 1; break;
+        case TRAMA_PARADA:
+            // También el que llegó y todavía no arrancó el while(1)
+            programa_rx_largo = 0;
+            programa_abortar = 1;
+            Mover_Horizontal(0);
+            Mover_Vertical_Sync(0);
+            Mover_Servo(SERVO_ANGULO_CERRADO);
+            break;
+        default: return 0;
+    }
+    return 1;
+}
+
+static void TramaRota(void)
+{
+    trama_pos = 0;
+    rx_index = 0;
+    if (modo_binario) texto_descartar = 1;
+}
+
+static void RecibirByteTrama(uint8_t byte)
+{
+    trama_rx[trama_pos++] = byte;
+    if (trama_pos == 2 && byte > TRAMA_CARGA_MAX)
+    {
+        TramaRota(); // Largo imposible: era ruido, se espera el próximo A5
+        return;
+    }
+    if (trama_pos < TRAMA_CABECERA || trama_pos < TRAMA_CABECERA + trama_rx[1] + 2) return;
+
+    uint8_t largo = trama_rx[1];
+    uint8_t seq = trama_rx[2];
+    trama_pos = 0;
+    uint16_t crc = trama_rx[TRAMA_CABECERA + largo] | (trama_rx[TRAMA_CABECERA + largo + 1] << 8);
+    if (Crc16(&trama_rx[1], TRAMA_CABECERA - 1 + largo) != crc)
+    {
+        TramaRota(); // Sin ACK: la Raspi reenvía
+        return;
+    }
+
+    uint8_t estado = RegistrarSeq(seq);
+    if (estado == ACK_OK && !EjecutarTrama(trama_rx[3], &trama_rx[TRAMA_CABECERA], largo))
+    {
+        estado = ACK_DESCONOCIDO;
+    }
+    uint8_t siguiente = (acks_escribir + 1) % ACKS_COLA;
+    if (siguiente != acks_leer) // Cola llena: se pierde el ACK y el reenvío vuelve como repetido
+    {
+        acks_seq[acks_escribir] = seq;
+        acks_estado[acks_escribir] = estado;
+        acks_escribir = siguiente;
+    }
+}
+
 // Callback: Se llama cada vez que llega un byte por UART
 void HAL_UART_RxCpltCallback(UART_HandleTypeDef *huart)
 {
   // Verificar que la interrupción viene del UART2 (USB)
   if (huart->Instance == USART2)
   {
+    // CASO 0: Trama binaria (0xA5 nunca aparece en una línea de texto)
+    if (trama_pos > 0 || rx_byte == TRAMA_SYNC)
+    {
+        rx_index = 0;
+        RecibirByteTrama(rx_byte);
+    }
     // CASO 1: Recibimos el caracter de final de linea ('\n')
     // Aquí es donde procesamos el comando completo
-    if (rx_byte == '\n')
+    else if (rx_byte == '\n')
     {
       rx_buffer[rx_index] = '\0'; // Terminamos el string
       rx_index = 0;               // Reiniciamos índice para el próximo
+      if (texto_descartar)
+      {
+          // Era el resto de una trama rota: no se ejecuta
+          texto_descartar = 0;
+          rx_buffer[0] = '\0';
+      }
 
       // --- PARSEO DE COMANDOS ---
       char cmd_char = rx_buffer[0];           // La letra (H, V, S)
@@ -787,9 +1338,47 @@ void HAL_UART_RxCpltCallback(UART_HandleTypeDef *huart)
            canicaDetectada1 = false;
            canicaDetectada2 = false;
 
-           // Opcional: notificar a la Raspberry que se ha reseteado
-           const char *msg = "#RST\n";
-           HAL_UART_Transmit(&huart2, (uint8_t*)msg, strlen(msg), 50);
+           // Opcional: notificar a la Raspberry que se ha reseteado (desde el while(1))
+           aviso_rst = 1;
+       }
+
+       // --- IDENTIFICACION (sonda de la Raspberry al conectar) ---
+       else if (cmd_char == 'I' || cmd_char == 'i')
+       {
+           modo_binario = 0;
+           aviso_id_texto = 1;
+       }
+
+       // --- VELOCIDAD DE LA UART: U<baudios> propone, U0 confirma ---
+       else if (cmd_char == 'U' || cmd_char == 'u')
+       {
+           if (valor == 0)
+           {
+               baudios_sin_confirmar = 0;
+               aviso_baudios_ok = 1;
+           }
+           else if (BaudiosValidos((uint32_t)valor))
+           {
+               baudios_pedidos = (uint32_t)valor; // Contesta y cambia el while(1)
+           }
+       }
+
+       // --- PATRON DE PRUEBA: se devuelve tal cual ---
+       else if (cmd_char == 'T' || cmd_char == 't')
+       {
+           strncpy(eco_prueba, (char*)&rx_buffer[1], sizeof(eco_prueba) - 1);
+           eco_prueba[sizeof(eco_prueba) - 1] = '\0';
+           aviso_eco = 1;
+       }
+
+       // --- PASO A PROTOCOLO BINARIO (contesta con una trama ID) ---
+       else if (cmd_char == 'B' || cmd_char == 'b')
+       {
+           seq_tx = 0;
+           seq_vistos = 0;
+           acks_leer = acks_escribir;
+           modo_binario = 1;
+           aviso_id = 1;
        }
     }
     // CASO 2: Buffer lleno (Seguridad)
@@ -800,8 +1389,8 @@ void HAL_UART_RxCpltCallback(UART_HandleTypeDef *huart)
     // CASO 3: Recibimos un caracter normal
     else
     {
-        // Guardar caracter (ignorando el 'Carriage Return' \r de Windows)
-        if(rx_byte != '\r')
+        // Solo ASCII imprimible: '\r' de Windows y bytes binarios sueltos no son comandos
+        if (rx_byte >= 0x20 && rx_byte <= 0x7E)
         {
             rx_buffer[rx_index++] = rx_byte;
         }
@@ -822,8 +1411,12 @@ void HAL_GPIO_EXTI_Callback(uint16_t GPIO_Pin)
       pasos_restantes_horiz = 0;
       pasos_restantes_v_der = 0;
       pasos_restantes_v_izq = 0;
+      fin_horiz = 0;
+      fin_vert = 0;
+      parada_boton = 1; // El while(1) avisa a la Raspi con #STOP
+      programa_rx_largo = 0; // Un programa recibido que no arrancó tampoco corre
+      programa_abortar = 1;
 
-      
       // 2. SERVO A POSICION SEGURA (Cerrado = 65 grados)
       Mover_Servo(SERVO_ANGULO_CERRADO);
   }
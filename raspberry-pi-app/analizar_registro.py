@@ -0,0 +1,181 @@
+"""Analiza un registro de tramas (registro_serial.py) y calcula latencias.
+
+    python3 analizar_registro.py tramas.log
+    python3 analizar_registro.py tramas.log --histograma --json latencias.json
+
+Distribuciones que calcula (percentiles en ms):
+  comando->fin   desde que se escribe H/V/L/R hasta el #FIN de ese eje
+  sobrecarga     comando->fin menos lo que tardan los pasos en TIM2
+  evento->ui     desde el #IN/#OUT hasta que la interfaz muestra el contador
+  fin->ui        desde el #FIN hasta que la interfaz mueve la posicion
+  stop->cable    desde que se pide el STOP hasta que sus tramas se escriben
+"""
+import argparse
+import json
+import math
+import sys
+
+from modelo_tiempos import PERIODO_PASO
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def leer(archivo):
+    """Devuelve las anotaciones (t_ns, tipo, texto) del archivo, en orden."""
+    anotaciones = []
+    with open(archivo, encoding="utf-8") as f:
+        for linea in f:
+            partes = linea.rstrip("\n").split(" ", 2)
+            if len(partes) < 2 or not partes[0].isdigit():
+                continue
+            anotaciones.append((int(partes[0]), partes[1], partes[2] if len(partes) > 2 else ""))
+    anotaciones.sort(key=lambda a: a[0])
+    return anotaciones
+
+
+def _eje_y_pasos(comando):
+    letra = comando[:1].upper()
+    try:
+        pasos = int(comando[1:])
+    except ValueError:
+        return None, 0
+    if letra == "H":
+        return "H", pasos
+    if letra in ("V", "L", "R"):
+        return "V", pasos
+    return None, 0
+
+
+def latencias(anotaciones, escala=1.0):
+    """Empareja las anotaciones y devuelve {nombre: [segundos, ...]}.
+
+    `escala` es la del emulador si se grabo con tiempo acelerado.
+    """
+    resultado = {"comando->fin": [], "sobrecarga": [], "evento->ui": [], "fin->ui": [], "stop->cable": []}
+    # Eje -> (t_ns del comando, pasos del comando mas largo pendiente)
+    pendientes = {}
+    evento_sin_ui = None
+    fin_sin_ui = None
+    parada = None
+
+    for t, tipo, texto in anotaciones:
+        if tipo == "TX":
+            eje, pasos = _eje_y_pasos(texto)
+            if eje is None:
+                continue
+            if pasos == 0:
+                pendientes.pop(eje, None)  # H0 / V0 cancelan sin #FIN
+            elif eje == "V" and eje in pendientes and texto[0] in "LR":
+                # L y R del mismo movimiento: el #FIN,V llega con el mas largo
+                pendientes[eje] = (pendientes[eje][0], max(pendientes[eje][1], abs(pasos)))
+            else:
+                pendientes[eje] = (t, abs(pasos))
+        elif tipo == "TXP":
+            pendientes.clear()
+            if parada is not None:
+                resultado["stop->cable"].append((t - parada) / 1e9)
+                parada = None
+        elif tipo == "PARADA":
+            parada = t
+        elif tipo == "RX":
+            if texto.startswith("#FIN,"):
+                pendiente = pendientes.pop(texto[5:], None)
+                if pendiente:
+                    duracion = (t - pendiente[0]) / 1e9
+                    resultado["comando->fin"].append(duracion)
+                    resultado["sobrecarga"].append(duracion - pendiente[1] * PERIODO_PASO / escala)
+                    fin_sin_ui = t
+            elif texto.startswith(("#IN", "#OUT")):
+                evento_sin_ui = t
+        elif tipo == "UI":
+            if texto == "contador" and evento_sin_ui is not None:
+                resultado["evento->ui"].append((t - evento_sin_ui) / 1e9)
+                evento_sin_ui = None
+            elif texto == "posicion" and fin_sin_ui is not None:
+                resultado["fin->ui"].append((t - fin_sin_ui) / 1e9)
+                fin_sin_ui = None
+    return resultado
+
+
+def percentil(ordenados, p):
+    """Percentil por rango mas cercano sobre una lista ya ordenada."""
+    i = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[i]
+
+
+def resumen(valores):
+    if not valores:
+        return {"n": 0}
+    ms = sorted(v * 1000 for v in valores)
+    datos = {"n": len(ms), "min": ms[0], "media": sum(ms) / len(ms)}
+    for p in PERCENTILES:
+        datos[f"p{p}"] = percentil(ms, p)
+    datos["max"] = ms[-1]
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in datos.items()}
+
+
+def histograma(valores, ancho=40):
+    """Histograma en texto con cubetas logaritmicas (x2) en ms."""
+    ms = [v * 1000 for v in valores if v > 0]
+    lineas = []
+    if len(ms) < len(valores):
+        lineas.append(f"  {'<= 0':>21} ms {len(valores) - len(ms):>6}")
+    if not ms:
+        return lineas
+    cubetas = {}
+    for v in ms:
+        k = math.floor(math.log2(v))
+        cubetas[k] = cubetas.get(k, 0) + 1
+    mayor = max(cubetas.values())
+    for k in range(min(cubetas), max(cubetas) + 1):
+        n = cubetas.get(k, 0)
+        barra = "#" * max(1 if n else 0, round(n / mayor * ancho))
+        lineas.append(f"  {2.0 ** k:>9.3f} - {2.0 ** (k + 1):<9.3f} ms {n:>6} {barra}")
+    return lineas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("archivo", help="registro grabado (ARCHIVO_REGISTRO o canicas_cli.py --registro)")
+    parser.add_argument("--escala", type=float, default=1.0, help="escala del emulador si se grabo acelerado")
+    parser.add_argument("--histograma", action="store_true", help="mostrar el histograma de cada distribucion")
+    parser.add_argument("--json", metavar="ARCHIVO", help="guardar el resumen en JSON")
+    args = parser.parse_args()
+
+    try:
+        anotaciones = leer(args.archivo)
+    except OSError as e:
+        print(f"No se pudo leer el registro: {e}")
+        return 2
+    if not anotaciones:
+        print("El registro esta vacio")
+        return 2
+
+    duracion = (anotaciones[-1][0] - anotaciones[0][0]) / 1e9
+    tipos = {}
+    for _, tipo, _ in anotaciones:
+        tipos[tipo] = tipos.get(tipo, 0) + 1
+    print(f"{len(anotaciones)} anotaciones en {duracion:.1f} s: "
+          + ", ".join(f"{tipo} {n}" for tipo, n in sorted(tipos.items())))
+
+    distribuciones = latencias(anotaciones, args.escala)
+    resumenes = {nombre: resumen(valores) for nombre, valores in distribuciones.items()}
+    columnas = ("n", "min", "media") + tuple(f"p{p}" for p in PERCENTILES) + ("max",)
+    print(f"{'(ms)':<14}" + "".join(f"{c:>10}" for c in columnas))
+    for nombre, datos in resumenes.items():
+        if not datos["n"]:
+            print(f"{nombre:<14}{'sin datos':>10}")
+            continue
+        print(f"{nombre:<14}" + "".join(f"{datos[c]:>10}" for c in columnas))
+        if args.histograma:
+            print("\n".join(histograma(distribuciones[nombre])))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(resumenes, f, indent=2)
+        print(f"Resumen guardado en {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Benchmark del compilador de rutas: paso a paso, compilado y plan del cache.
+
+No necesita la placa. Arma una cola de `--rutas` rutas legales (con
+planificar_ruta, pasando por zonas al azar con `--semilla`) y la recorre
+`--pasadas` veces, como cuando la interfaz repinta la lista, recalcula el
+tiempo estimado, guarda la cola y la ejecuta. En cada pasada se pide, para
+cada ruta, los comandos y los segundos estimados:
+
+  por_paso   calcular_comando de las interfaces v5: coordenadas, diferencias y
+             el texto del comando en cada celda, y despues `cmd.split('-')`
+             para sacar los pasos y el tiempo
+  compilar   compilar_camino + tiempo_estimado de cada segmento, sin cache
+  plan       planificar (Plan del cache LRU de compilador_movimientos)
+
+    python3 benchmarks/bench_compilador.py
+    python3 benchmarks/bench_compilador.py --rutas 500 --pasadas 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compilador_movimientos import (  # noqa: E402
+    MAPA_COORDS, MAX_PLANES, _plan_camino, compilar_camino, planificar, tiempo_movimiento,
+)
+from config_canicas import STEPS_H, STEPS_V  # noqa: E402
+from planificador_rutas import planificar_ruta  # noqa: E402
+
+_INTERMEDIAS = [z for z in MAPA_COORDS if z not in ("S1", "S2", "S3", "Destino")]
+
+
+def cola_al_azar(n, semilla):
+    """Rutas legales de un origen al azar a Destino pasando por 0 a 2 zonas."""
+    azar = random.Random(semilla)
+    rutas = []
+    while len(rutas) < n:
+        origen = azar.choice(("S1", "S2", "S3"))
+        visitar = azar.sample(_INTERMEDIAS, azar.randint(0, 2))
+        camino = planificar_ruta(origen, "Destino", visitar)
+        if camino:
+            rutas.append({"origen": origen, "camino": camino})
+    return rutas
+
+
+def calcular_comando(origen, destino, columna_destino=1):
+    """Copia de calcular_comando de interfaz_canicas-v5_5.py."""
+    r1, c1 = MAPA_COORDS[origen]
+    if origen == "Destino":
+        r1 = 4
+        c1 = columna_destino
+    if destino == "Destino":
+        r2 = 4
+        if origen in [7, 8, 9]:
+            _, c2 = MAPA_COORDS[origen]
+        else:
+            c2 = 1
+    else:
+        r2, c2 = MAPA_COORDS[destino]
+
+    diff_r = r2 - r1
+    diff_c = c2 - c1
+    if diff_r == 1 and diff_c == 0: return f"V-{STEPS_V}"
+    if diff_r == -1 and diff_c == 0: return f"V{STEPS_V}"
+    if diff_c == 1 and diff_r == 0: return f"H{STEPS_H}"
+    if diff_c == -1 and diff_r == 0: return f"H-{STEPS_H}"
+    if diff_c == 0 and diff_r > 1:
+        return f"V-{diff_r * STEPS_V}"
+    return None
+
+
+def por_paso(ruta):
+    comandos, segundos = [], 0.0
+    actual = ruta['origen']
+    for destino in ruta['camino']:
+        cmd = calcular_comando(actual, destino)
+        # Como _proceso_mover: el eje y los pasos salen del texto del comando
+        pasos = -int(cmd.split('-')[1]) if "-" in cmd else int(cmd[1:])
+        segundos += tiempo_movimiento(cmd[0], pasos)
+        comandos.append(cmd)
+        actual = destino
+    return comandos, segundos
+
+
+def compilado(ruta):
+    segmentos = compilar_camino(ruta['origen'], ruta['camino'])
+    return [c for seg in segmentos for c in seg.comandos], sum(seg.tiempo_estimado() for seg in segmentos)
+
+
+def plan(ruta):
+    p = planificar(ruta['origen'], ruta['camino'])
+    return p.comandos, p.duracion
+
+
+def medir(fn, rutas, pasadas):
+    inicio = time.perf_counter()
+    for _ in range(pasadas):
+        for ruta in rutas:
+            fn(ruta)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rutas", type=int, default=200)
+    parser.add_argument("--pasadas", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    rutas = cola_al_azar(args.rutas, args.semilla)
+    distintas = len({(r['origen'], tuple(r['camino'])) for r in rutas})
+    pedidos = args.rutas * args.pasadas
+    print(f"{args.rutas} rutas ({distintas} distintas) x {args.pasadas} pasadas, cache de {MAX_PLANES} planes")
+    print(f"{'modo':<9} {'total':>9} {'us/ruta':>9} {'comandos':>9}")
+    base = None
+    for nombre, fn in (("por_paso", por_paso), ("compilar", compilado), ("plan", plan)):
+        _plan_camino.cache_clear()
+        total = medir(fn, rutas, args.pasadas)
+        comandos = sum(len(fn(r)[0]) for r in rutas)
+        base = base or total
+        print(f"{nombre:<9} {total * 1000:>6.1f} ms {total / pedidos * 1e6:>9.2f} {comandos:>9}"
+              f"  ({base / total:.1f}x)")
+    info = _plan_camino.cache_info()
+    print(f"cache: {info.hits} aciertos, {info.misses} compilaciones")
+
+
+if __name__ == "__main__":
+    main()
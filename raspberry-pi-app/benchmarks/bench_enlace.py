@@ -0,0 +1,142 @@
+"""Benchmark del enlace serie a cada velocidad negociada.
+
+Para cada velocidad: la negocia desde BAUD_RATE (EnlaceSerialAsync.negociar_baudios,
+con su patron de prueba), mide el eco de `--ecos` patrones `T` de ida y vuelta
+(texto) y despues, en binario, el tiempo hasta el ultimo ACK de `--tandas`
+tandas de `--rafaga` comandos S65 (no mueven nada: el servo ya esta cerrado).
+Al terminar vuelve a BAUD_RATE.
+
+Sin `--puerto` corre contra emulador_stm32 en el mismo loop con un
+RelojVirtual: solo cuenta el tiempo de los bytes en el cable, el resultado es
+siempre el mismo y sirve para ver cuanto gana cada velocidad en teoria. Con
+`--puerto` mide la placa de verdad (incluye el USB del ST-LINK y el while(1)).
+
+    python3 benchmarks/bench_enlace.py
+    python3 benchmarks/bench_enlace.py --puerto /dev/ttyACM0 --baudios 115200,460800,921600
+    python3 benchmarks/bench_enlace.py --baudios-max 460800   # emulador con enlace limitado
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config_canicas import BAUD_RATE, TIMEOUT_SONDA, VENTANA_BAUDIOS  # noqa: E402
+from emulador_stm32 import EmuladorSTM32  # noqa: E402
+from enlace_serial import (  # noqa: E402
+    COMANDO_PRUEBA, RESPUESTA_ID, RESPUESTA_PRUEBA, SONDA, buscar_placa,
+)
+from nucleo_async import EnlaceSerialAsync  # noqa: E402
+from reloj import RELOJ_REAL, RelojVirtual  # noqa: E402
+
+COMANDO_INOCUO = "S65"
+# Cada cuanto se mira si llegaron todos los ACK de una tanda
+PERIODO_ESPERA = 0.0005
+
+
+def percentil(ordenados, p):
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+async def medir_velocidad(ser, baudios, ecos, rafaga, tandas):
+    loop = asyncio.get_running_loop()
+    enlace = EnlaceSerialAsync(ser, lambda linea: None, BAUD_RATE, mostrar_tx=False)
+    await enlace.iniciar()
+    resultado = {"baudios": baudios, "ok": False}
+    try:
+        # `I` deja a la placa en texto (por si quedo en binario de la velocidad anterior)
+        if await enlace._pedir(SONDA, RESPUESTA_ID, TIMEOUT_SONDA) is None:
+            return resultado
+        if await enlace.negociar_baudios((baudios,), TIMEOUT_SONDA, VENTANA_BAUDIOS) != baudios:
+            return resultado
+        resultado["ok"] = True
+
+        tiempos = []
+        bytes_eco = 0
+        for i in range(ecos):
+            patron = f"UUUU{i:020X}"
+            inicio = loop.time()
+            if await enlace._pedir(f"{COMANDO_PRUEBA}{patron}", RESPUESTA_PRUEBA, TIMEOUT_SONDA) is None:
+                resultado["ecos_perdidos"] = resultado.get("ecos_perdidos", 0) + 1
+                continue
+            tiempos.append(loop.time() - inicio)
+            bytes_eco += len(RESPUESTA_PRUEBA) + len(patron) + 1  # la linea que vuelve
+        tiempos.sort()
+        if tiempos:
+            resultado["eco_p50_ms"] = percentil(tiempos, 50) * 1000
+            resultado["eco_p99_ms"] = percentil(tiempos, 99) * 1000
+            resultado["eco_bytes_s"] = bytes_eco / sum(tiempos)
+
+        if await enlace.negociar_binario(TIMEOUT_SONDA):
+            inicio = loop.time()
+            for _ in range(tandas):
+                for _ in range(rafaga):
+                    enlace.enviar(COMANDO_INOCUO)
+                while enlace.pendientes() or enlace._sin_ack:
+                    await asyncio.sleep(PERIODO_ESPERA)
+            resultado["comandos_s"] = rafaga * tandas / (loop.time() - inicio)
+            resultado["reenvios"] = enlace.reenvios
+            resultado["perdidos"] = enlace.perdidos_tx + enlace.perdidos_rx
+        await enlace.negociar_baudios((BAUD_RATE,), TIMEOUT_SONDA, VENTANA_BAUDIOS)
+    finally:
+        enlace.detener()
+    return resultado
+
+
+async def medir(velocidades, puerto, baudios_max, ecos, rafaga, tandas):
+    if puerto:
+        encontrado = buscar_placa(puerto, BAUD_RATE, TIMEOUT_SONDA, buscar=False, alternativas=velocidades)
+        if not encontrado:
+            raise SystemExit(f"{puerto} no contesto la sonda")
+        ser = encontrado[0]
+    else:
+        emulador = EmuladorSTM32(baudios_max=baudios_max)
+        ser = await emulador.conectar_loop(BAUD_RATE)
+    try:
+        return [await medir_velocidad(ser, b, ecos, rafaga, tandas) for b in velocidades]
+    finally:
+        ser.close()
+        if not puerto:
+            emulador.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baudios", default="115200,230400,460800,921600")
+    parser.add_argument("--puerto", help="placa real (sin esto: emulador con reloj virtual)")
+    parser.add_argument("--baudios-max", type=int, default=921600, help="con el emulador: velocidad mas alta que anda")
+    parser.add_argument("--ecos", type=int, default=200)
+    parser.add_argument("--rafaga", type=int, default=8, help="comandos por tanda (ACKS_COLA en main.c es 8)")
+    parser.add_argument("--tandas", type=int, default=50)
+    args = parser.parse_args()
+
+    velocidades = [int(b) for b in args.baudios.split(",")]
+    reloj = RELOJ_REAL if args.puerto else RelojVirtual()
+    loop = reloj.nuevo_loop()
+    t_real = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultados = loop.run_until_complete(
+                medir(velocidades, args.puerto, args.baudios_max, args.ecos, args.rafaga, args.tandas))
+    finally:
+        loop.close()
+    t_real = time.perf_counter() - t_real
+
+    origen = args.puerto or f"emulador, reloj virtual, enlace hasta {args.baudios_max}"
+    print(f"Enlace serie ({origen}): {args.ecos} ecos, {args.tandas} tandas de {args.rafaga} comandos")
+    print(f"{'baudios':>8} | {'eco p50':>9} {'p99':>9} {'B/s eco':>8} | {'cmd/s':>7} {'reenvios':>8}")
+    for r in resultados:
+        if not r["ok"]:
+            print(f"{r['baudios']:>8} | no paso la prueba de patron: se queda en {BAUD_RATE}")
+            continue
+        print(f"{r['baudios']:>8} | {r.get('eco_p50_ms', 0):>6.2f} ms {r.get('eco_p99_ms', 0):>6.2f} ms"
+              f" {r.get('eco_bytes_s', 0):>8.0f} | {r.get('comandos_s', 0):>7.0f} {r.get('reenvios', 0):>8}")
+    print(f"({t_real:.2f} s reales)")
+
+
+if __name__ == "__main__":
+    main()
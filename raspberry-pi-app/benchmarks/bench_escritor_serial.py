@@ -0,0 +1,231 @@
+"""Benchmark del escritor serial: escrituras sueltas (v6 original) vs EnlaceSerialAsync.
+
+No necesita la placa: el puerto es un cable simulado que transmite a ritmo
+de UART (10 bits por byte a 115200). Para las escrituras sueltas es un
+objeto con un buffer de salida de 4 KB, como el driver del kernel. El
+EnlaceSerialAsync escribe en un descriptor, asi que su cable es un pty cuyo
+otro extremo se vacia al mismo ritmo (un pty solo vaciaria todo al instante).
+
+    python3 benchmarks/bench_escritor_serial.py [--hilos 3] [--paradas 30]
+
+Varios hilos mandan comandos sin parar (como la GUI, los hilos de movimiento
+y el boton STOP a la vez) y cada tanto se pide un STOP. Mide cuanto tarda el
+S65 en terminar de salir por el cable desde que se pidio. Con el enlace
+async los hilos pasan por el loop, como los comandos de la interfaz.
+"""
+import argparse
+import asyncio
+import io
+import random
+import statistics
+import os
+import sys
+import threading
+import time
+import tty
+from contextlib import redirect_stdout
+
+import serial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from enlace_serial import TRAMAS_PARADA  # noqa: E402
+from nucleo_async import BucleAsync, EnlaceSerialAsync  # noqa: E402
+
+BAUDIOS = 115200
+BUFFER_KERNEL = 4096
+
+
+class CableUART:
+    """Puerto falso: write() bloquea si el buffer esta lleno, flush() espera el cable."""
+
+    def __init__(self, baudios=BAUDIOS, buffer=BUFFER_KERNEL):
+        self.seg_por_byte = 10 / baudios
+        self.buffer = buffer
+        self.is_open = True
+        self.llegadas_parada = []
+        self.bytes_enviados = 0
+        self._lock = threading.Lock()
+        self._libre = 0.0  # instante en que el cable termina lo ya escrito
+
+    def write(self, datos):
+        # El kernel no mezcla dos write(): el segundo espera al primero
+        with self._lock:
+            ahora = time.perf_counter()
+            en_buffer = max(0.0, self._libre - ahora) / self.seg_por_byte
+            exceso = en_buffer + len(datos) - self.buffer
+            if exceso > 0:
+                time.sleep(exceso * self.seg_por_byte)
+                ahora = time.perf_counter()
+            inicio = max(ahora, self._libre)
+            fin = datos.find(b"S65\n")
+            if fin >= 0:
+                self.llegadas_parada.append(inicio + (fin + 4) * self.seg_por_byte)
+            self._libre = inicio + len(datos) * self.seg_por_byte
+            self.bytes_enviados += len(datos)
+        return len(datos)
+
+    def flush(self):
+        espera = self._libre - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+
+
+class CablePty:
+    """Cable para un descriptor: un hilo vacia el pty a ritmo de UART."""
+
+    def __init__(self, baudios=BAUDIOS):
+        self.seg_por_byte = 10 / baudios
+        self.llegadas_parada = []
+        self.bytes_enviados = 0
+        self._libre = 0.0
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.ser = serial.Serial(os.ttyname(self._slave), baudios)
+        threading.Thread(target=self._vaciar, daemon=True).start()
+
+    def _vaciar(self):
+        previo = b""  # por si el S65 queda partido entre dos lecturas
+        while True:
+            try:
+                datos = os.read(self._master, 64)
+            except OSError:
+                return
+            inicio = max(time.perf_counter(), self._libre)
+            fin = (previo + datos).find(b"S65\n")
+            if fin >= 0:
+                self.llegadas_parada.append(inicio + (fin - len(previo) + 4) * self.seg_por_byte)
+            self._libre = inicio + len(datos) * self.seg_por_byte
+            self.bytes_enviados += len(datos)
+            previo = (previo + datos)[-3:]
+            # Mientras el cable esta ocupado lo demas espera en el buffer del pty
+            time.sleep(max(0.0, self._libre - time.perf_counter()))
+
+    def cerrar(self):
+        self.ser.close()
+        os.close(self._slave)
+        os.close(self._master)
+
+
+class EscritorDirecto:
+    """Copia del enviar_comando original: cada hilo escribe y hace print."""
+
+    def __init__(self, ser):
+        self.ser = ser
+
+    def iniciar(self):
+        pass
+
+    def detener(self):
+        pass
+
+    def enviar(self, cmd):
+        msg = f"{cmd}\n"
+        self.ser.write(msg.encode('utf-8'))
+        print(f"TX: {msg.strip()}")
+
+    def enviar_parada(self):
+        for cmd in TRAMAS_PARADA:
+            self.enviar(cmd)
+
+
+class EscritorAsync:
+    """EnlaceSerialAsync en su loop; los hilos encolan a traves del loop."""
+
+    def __init__(self, cable):
+        self.nucleo = BucleAsync()
+        self.enlace = EnlaceSerialAsync(cable.ser, lambda linea: None, mostrar_tx=False)
+
+    def iniciar(self):
+        self.nucleo.iniciar()
+        self.nucleo.correr(self.enlace.iniciar()).result()
+
+    def detener(self):
+        self.nucleo.llamar(self.enlace.detener)
+        self.nucleo.detener()
+
+    def enviar(self, cmd):
+        self.nucleo.correr(self._encolar(cmd)).result(timeout=1.0)
+
+    async def _encolar(self, cmd):
+        # Como el hilo escritor viejo: espera lugar en la cola en vez de fallar
+        while self.enlace.pendientes() >= self.enlace.capacidad:
+            await asyncio.sleep(8 * self.enlace.seg_por_byte)
+        self.enlace.enviar(cmd)
+
+    def enviar_parada(self):
+        self.nucleo.llamar(self.enlace.enviar_parada)
+
+    def estadisticas(self):
+        return self.enlace.estadisticas()
+
+
+def medir(clase_escritor, clase_cable, n_hilos, n_paradas):
+    cable = clase_cable()
+    escritor = clase_escritor(cable)
+    escritor.iniciar()
+
+    activo = threading.Event()
+    activo.set()
+
+    def carga():
+        n = 0
+        while activo.is_set():
+            try:
+                escritor.enviar(f"{'HV'[n % 2]}{random.choice((1520, -1520, 1328, -1328))}")
+            except Exception:
+                pass  # cola llena: el hilo vuelve a intentar
+            n += 1
+
+    # Los print de los escritores van a un buffer para no medir la terminal
+    inicio = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        hilos = [threading.Thread(target=carga, daemon=True) for _ in range(n_hilos)]
+        for h in hilos:
+            h.start()
+
+        latencias = []
+        for _ in range(n_paradas):
+            time.sleep(random.uniform(0.02, 0.05))
+            pedido = time.perf_counter()
+            escritor.enviar_parada()
+            # Esperar a que ese S65 salga por el cable antes del siguiente
+            while len(cable.llegadas_parada) <= len(latencias):
+                time.sleep(0.0005)
+            llegada = cable.llegadas_parada[len(latencias)]
+            latencias.append(llegada - pedido)
+            time.sleep(max(0.0, llegada - time.perf_counter()))
+
+        activo.clear()
+        for h in hilos:
+            h.join(timeout=2.0)
+        escritor.detener()
+    if hasattr(cable, "cerrar"):
+        cable.cerrar()
+    ocupacion = cable.bytes_enviados * cable.seg_por_byte / (max(cable._libre, time.perf_counter()) - inicio)
+    return latencias, ocupacion, getattr(escritor, "estadisticas", dict)()
+
+
+def resumen(nombre, latencias, ocupacion):
+    ms = sorted(x * 1000 for x in latencias)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    print(f"{nombre:<8} STOP->cable media {statistics.mean(ms):7.2f} ms | p50 {statistics.median(ms):7.2f} ms"
+          f" | p95 {p95:7.2f} ms | max {ms[-1]:7.2f} ms | uso del cable {ocupacion * 100:5.1f} %")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hilos", type=int, default=3, help="hilos mandando comandos a la vez")
+    parser.add_argument("--paradas", type=int, default=30)
+    args = parser.parse_args()
+
+    random.seed(1)
+    for nombre, clase, cable in (("antes", EscritorDirecto, CableUART), ("async", EscritorAsync, CablePty)):
+        latencias, ocupacion, estadisticas = medir(clase, cable, args.hilos, args.paradas)
+        resumen(nombre, latencias, ocupacion)
+        for carril, e in estadisticas.items():
+            print(f"{'':<8} cola {carril:<6} encolado->cable p50 {e['p50']:7.2f} ms"
+                  f" | p95 {e['p95']:7.2f} ms | max {e['max']:7.2f} ms (n={e['n']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Benchmark del lector serial: sondeo de 50 ms (v6 original) vs EnlaceSerialAsync.
+
+Usa un pseudo-terminal como puerto, asi que no necesita la placa:
+
+    python3 benchmarks/bench_lector_serial.py [--tramas 200] [--reposo 3]
+
+Mide la latencia desde que se escribe una trama #IN hasta que llega al
+handler, y el CPU que consume el lector con el puerto en silencio. El
+actual es el del controlador: EnlaceSerialAsync con add_reader en el loop
+de BucleAsync (nucleo_async.py).
+
+La latencia se mide en dos regimenes:
+  espaciadas  una trama cada 50-80 ms: mas lento que el sondeo, mide su espera
+  rafaga      una trama cada 5-30 ms: el sondeo lee una linea cada 50 ms y se
+              atrasa, asi que su numero es el crecimiento de la cola, no la espera
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import tty
+
+import serial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nucleo_async import BucleAsync, EnlaceSerialAsync  # noqa: E402
+
+
+class LectorSondeo:
+    """Copia del _serial_listener original (in_waiting + readline + sleep)."""
+
+    def __init__(self, ser, al_recibir):
+        self.ser = ser
+        self.al_recibir = al_recibir
+        self._activo = False
+
+    def iniciar(self):
+        self._activo = True
+        threading.Thread(target=self._bucle, daemon=True).start()
+
+    def detener(self):
+        self._activo = False
+
+    def _bucle(self):
+        while self._activo:
+            if self.ser.in_waiting > 0:
+                line = self.ser.readline().decode('utf-8', errors='ignore').strip()
+                if line.startswith('#'):
+                    self.al_recibir(line)
+            time.sleep(0.05)
+
+
+class LectorAsync:
+    """EnlaceSerialAsync en su loop, con la interfaz de LectorSondeo."""
+
+    def __init__(self, ser, al_recibir):
+        self.nucleo = BucleAsync()
+        self.enlace = EnlaceSerialAsync(ser, al_recibir, mostrar_tx=False)
+
+    def iniciar(self):
+        self.nucleo.iniciar()
+        self.nucleo.correr(self.enlace.iniciar()).result()
+
+    def detener(self):
+        self.nucleo.llamar(self.enlace.detener)
+        self.nucleo.detener()
+
+
+# Segundos entre tramas de cada regimen (el sondeo original duerme 50 ms)
+REGIMENES = {
+    "espaciadas": (0.05, 0.08),
+    "rafaga": (0.005, 0.03),
+}
+
+
+def medir(clase_lector, n_tramas, segundos_reposo, intervalo):
+    """(latencias, CPU en reposo o None, completa). Sin reposo no se mide el CPU."""
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    ser = serial.Serial(os.ttyname(slave), 115200, timeout=0.1)
+
+    enviados = {}
+    latencias = []
+    listo = threading.Event()
+
+    def al_recibir(linea):
+        n = int(linea.split(',')[1])
+        latencias.append(time.perf_counter() - enviados[n])
+        if len(latencias) == n_tramas:
+            listo.set()
+
+    lector = clase_lector(ser, al_recibir)
+    lector.iniciar()
+
+    # 1. CPU en reposo (el hilo principal duerme: todo el CPU es del lector)
+    cpu_reposo = None
+    if segundos_reposo:
+        cpu0 = time.process_time()
+        time.sleep(segundos_reposo)
+        cpu_reposo = (time.process_time() - cpu0) / segundos_reposo * 100
+
+    # 2. Latencia trama -> handler, con llegadas a intervalos irregulares
+    for n in range(n_tramas):
+        time.sleep(random.uniform(*intervalo))
+        enviados[n] = time.perf_counter()
+        os.write(master, f"#IN,{n},0,{n}\n".encode())
+    # En rafaga el sondeo todavia tiene que vaciar lo atrasado (una linea cada 50 ms)
+    completa = listo.wait(timeout=max(5.0, n_tramas * 0.06))
+
+    lector.detener()
+    ser.close()
+    os.close(master)
+    os.close(slave)
+    return list(latencias), cpu_reposo, completa
+
+
+def resumen(nombre, regimen, latencias, cpu_reposo, n_tramas, completa):
+    cpu = f" | CPU reposo {cpu_reposo:5.2f} %" if cpu_reposo is not None else ""
+    if not completa:
+        # Con una muestra parcial faltan justo las tramas mas atrasadas
+        print(f"{nombre:<6} {regimen:<11} incompleta: llegaron {len(latencias)} de {n_tramas} tramas{cpu}")
+        return
+    ms = sorted(x * 1000 for x in latencias)
+    p95 = ms[int(len(ms) * 0.95) - 1]
+    print(f"{nombre:<6} {regimen:<11} media {statistics.mean(ms):7.2f} ms | p50 {statistics.median(ms):7.2f} ms"
+          f" | p95 {p95:7.2f} ms | max {ms[-1]:7.2f} ms{cpu}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tramas", type=int, default=200)
+    parser.add_argument("--reposo", type=float, default=3.0, help="segundos midiendo CPU en reposo")
+    args = parser.parse_args()
+
+    for nombre, clase in (("antes", LectorSondeo), ("async", LectorAsync)):
+        for i, (regimen, intervalo) in enumerate(REGIMENES.items()):
+            random.seed(1)
+            # El CPU en reposo no depende del regimen: se mide una vez por lector
+            reposo = args.reposo if i == 0 else 0
+            latencias, cpu, completa = medir(clase, args.tramas, reposo, intervalo)
+            resumen(nombre, regimen, latencias, cpu, args.tramas, completa)
+
+
+if __name__ == "__main__":
+    main()
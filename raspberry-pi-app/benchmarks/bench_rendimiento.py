@@ -0,0 +1,213 @@
+"""Benchmark de rendimiento: canicas por hora de una cola de rutas.
+
+Corre ControladorCanicas.secuencia (el mismo codigo que usan la interfaz y
+canicas_cli.py) con su EnlaceSerialAsync contra emulador_stm32 conectado en
+el mismo loop, con un reloj.RelojVirtual: las esperas no consumen tiempo
+real, asi que una hora de produccion se simula en milisegundos y el
+resultado es siempre el mismo para el mismo codigo y las mismas constantes.
+
+Cada carga se corre con cada protocolo:
+  texto      comandos de linea, cada segmento espera su #FIN
+  binario    tramas con seq y CRC, sin programas en la placa
+  programas  binario, cada ruta va en una trama PROGRAMA (PROGRAMAS_EN_PLACA)
+
+Los resultados se guardan en benchmarks/resultados/<version>.json (o en
+--salida) para compararlos despues con --comparar.
+
+    python3 benchmarks/bench_rendimiento.py
+    python3 benchmarks/bench_rendimiento.py --espera-operador 5 --optimizar --modos programas
+    python3 benchmarks/bench_rendimiento.py --comparar benchmarks/resultados/abc1234.json
+
+El tiempo de cada ciclo se reparte en:
+  recorrido  bajada del origen a Destino (incluye el asentamiento de 0.5 s)
+  descarga   abrir el servo, esperar la caida y cerrar
+  retorno    de Destino al origen de la ruta siguiente (y a S1 al final)
+  operador   espera a que se cargue la canica (--espera-operador)
+Con programas la descarga va dentro del programa y cuenta como recorrido.
+"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config_canicas import BAUD_RATE, STEPS_H, STEPS_V, TIME_SERVO, RETORNO_COMBINADO  # noqa: E402
+from controlador_canicas import ControladorCanicas  # noqa: E402
+from emulador_stm32 import EmuladorSTM32  # noqa: E402
+from modelo_tiempos import PERIODO_PASO  # noqa: E402
+from nucleo_async import EnlaceSerialAsync  # noqa: E402
+import protocolo_binario as pb  # noqa: E402
+from reloj import RelojVirtual  # noqa: E402
+
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+
+# --- CARGAS DE TRABAJO ---
+MODOS = ("texto", "binario", "programas")
+_COLUMNA = {"origen": "S1", "camino": [1, 4, 7, "Destino"]}
+_ZIGZAG = [
+    {"origen": "S1", "camino": [1, 2, 5, 4, 7, 8, "Destino"]},
+    {"origen": "S3", "camino": [3, 2, 5, 6, 9, 8, "Destino"]},
+]
+_TRES_ORIGENES = [
+    {"origen": "S1", "camino": [1, 4, 7, "Destino"]},
+    {"origen": "S2", "camino": [2, 5, 8, "Destino"]},
+    {"origen": "S3", "camino": [3, 6, 9, "Destino"]},
+]
+
+
+def cargas(repeticiones):
+    return {
+        "columna": [_COLUMNA] * (2 * repeticiones),
+        "zigzag": _ZIGZAG * repeticiones,
+        "tres_origenes": _TRES_ORIGENES * repeticiones,
+    }
+
+
+# --- CORRIDA ---
+def correr_carga(rutas, espera_operador, optimizar=False, modo="texto"):
+    """Corre una cola completa en reloj virtual con el protocolo `modo`. Devuelve el resumen."""
+    if optimizar:
+        from planificador_rutas import optimizar_orden
+        rutas, _ = optimizar_orden(rutas)
+
+    control = ControladorCanicas(reloj=RelojVirtual())
+    # Se usa el loop del controlador desde este hilo, sin arrancar su hilo
+    loop = control.nucleo.loop
+    fases = collections.Counter()
+    emulador = EmuladorSTM32()
+    # El modelo de tiempos queda en su valor nominal y no se escribe a disco
+    control.ajustar_modelo = lambda seg: None
+
+    def cronometrar(nombre, corrutina):
+        async def envuelta(*args):
+            inicio = loop.time()
+            try:
+                return await corrutina(*args)
+            finally:
+                fases[nombre] += loop.time() - inicio
+        return envuelta
+
+    async def cargar_canica(origen):
+        await asyncio.sleep(espera_operador)
+
+    control.retornar = cronometrar("retorno", control.retornar)
+    control.descargar = cronometrar("descarga", control.descargar)
+    control.confirmar_carga = cronometrar("operador", cargar_canica)
+
+    async def correr():
+        ser = await emulador.conectar_loop(BAUD_RATE)
+        control.enlace = EnlaceSerialAsync(ser, control._al_recibir_linea, BAUD_RATE, mostrar_tx=False)
+        await control.enlace.iniciar()
+        if modo != "texto":
+            if not await control.enlace.negociar_binario(1.0):
+                raise RuntimeError("el emulador no acepto el protocolo binario")
+            if modo == "binario":
+                # Paso a paso aunque la placa ofrezca programas
+                control.enlace.capacidades &= ~pb.CAPACIDAD_PROGRAMAS
+            elif not control.programas_en_placa:
+                raise RuntimeError("programas desactivados (PROGRAMAS_EN_PLACA)")
+        inicio = loop.time()
+        await control.secuencia(rutas)
+        control.enlace.detener()
+        emulador.detener()
+        ser.close()
+        return loop.time() - inicio
+
+    t_real = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            total = loop.run_until_complete(correr())
+    finally:
+        loop.close()
+    t_real = time.perf_counter() - t_real
+
+    fases["recorrido"] = total - sum(fases.values())
+    n = len(rutas)
+    return {
+        "rutas": n,
+        "total_s": round(total, 3),
+        "ciclo_s": round(total / n, 3),
+        "canicas_hora": round(n * 3600 / total, 1),
+        "fases_s": {f: round(fases[f] / n, 3) for f in ("recorrido", "descarga", "retorno", "operador")},
+        "canicas_contadas": control.contadores.canicas,
+        "tramas": control.enlace.tramas_tx,
+        "programas": control.metricas._valores.get(("canicas_programas_total", ()), 0),
+        "reenvios": control.enlace.reenvios,
+        "tiempo_real_s": round(t_real, 4),
+    }
+
+
+def version_codigo():
+    try:
+        salida = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return salida.stdout.strip() or "desconocida"
+    except (OSError, subprocess.SubprocessError):
+        return "desconocida"
+
+
+def imprimir(resultados, anterior=None):
+    print(f"{'carga':<14} {'modo':<10} {'rutas':>5} {'ciclo':>8} {'canicas/h':>10} {'tramas':>7}"
+          f"   recorrido  descarga  retorno  operador")
+    for nombre, modos in resultados["cargas"].items():
+        for modo, r in modos.items():
+            f = r["fases_s"]
+            linea = (f"{nombre:<14} {modo:<10} {r['rutas']:>5} {r['ciclo_s']:>7.2f}s {r['canicas_hora']:>10.1f}"
+                     f" {r['tramas']:>7}"
+                     f"   {f['recorrido']:>8.2f}s {f['descarga']:>8.2f}s {f['retorno']:>7.2f}s {f['operador']:>8.2f}s")
+            # Los resultados viejos (sin modos) no se comparan
+            previo = anterior and anterior.get("cargas", {}).get(nombre, {}).get(modo)
+            if previo:
+                cambio = (r["canicas_hora"] / previo["canicas_hora"] - 1) * 100
+                linea += f"   ({cambio:+.1f}% vs {anterior.get('version', '?')})"
+            print(linea)
+            if r["canicas_contadas"] != r["rutas"]:
+                print(f"  AVISO: el sensor de entrada conto {r['canicas_contadas']} de {r['rutas']} descargas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--espera-operador", type=float, default=3.0, help="segundos para cargar cada canica")
+    parser.add_argument("--repeticiones", type=int, default=3, help="veces que se repite cada carga")
+    parser.add_argument("--optimizar", action="store_true", help="reordenar cada cola con optimizar_orden")
+    parser.add_argument("--modos", nargs="+", choices=MODOS, default=list(MODOS), help="protocolos a medir")
+    parser.add_argument("--salida", metavar="JSON", help="archivo de resultados (por defecto resultados/<version>.json)")
+    parser.add_argument("--comparar", metavar="JSON", help="resultados anteriores para comparar")
+    args = parser.parse_args()
+
+    resultados = {
+        "version": version_codigo(),
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "constantes": {
+            "TIME_SERVO": TIME_SERVO, "PERIODO_PASO": PERIODO_PASO, "STEPS_H": STEPS_H, "STEPS_V": STEPS_V,
+            "RETORNO_COMBINADO": RETORNO_COMBINADO, "espera_operador": args.espera_operador,
+            "optimizar": args.optimizar,
+        },
+        "cargas": {nombre: {modo: correr_carga(rutas, args.espera_operador, args.optimizar, modo)
+                            for modo in args.modos}
+                   for nombre, rutas in cargas(args.repeticiones).items()},
+    }
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            anterior = json.load(f)
+    imprimir(resultados, anterior)
+
+    salida = args.salida
+    if not salida:
+        os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+        salida = os.path.join(DIRECTORIO_RESULTADOS, f"{resultados['version']}.json")
+    with open(salida, "w") as f:
+        json.dump(resultados, f, indent=2)
+    print(f"Resultados guardados en {salida}")
+
+
+if __name__ == "__main__":
+    main()
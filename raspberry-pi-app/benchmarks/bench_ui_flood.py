@@ -0,0 +1,204 @@
+"""Benchmark del puente a Tk bajo una rafaga de tramas: atraso de la interfaz.
+
+No necesita la placa. Sin pantalla usa un interprete Tcl sin ventanas y
+atiende los eventos con dooneevent (el modo `after` necesita el mainloop de
+Tk y se saltea). Un hilo hace de controlador y manda
+`--tramas` avisos a `--ritmo` por segundo, alternando contador (#IN) y
+posicion; cada actualizacion de la interfaz cuesta `--costo-us` (lo que
+tarda reconfigurar un Label en la Pi).
+
+    python3 benchmarks/bench_ui_flood.py
+    python3 benchmarks/bench_ui_flood.py --tramas 20000 --ritmo 0 --costo-us 300
+
+Modos:
+  after      root.after(0, ...) por trama desde el hilo lector (interfaces v5)
+  puente     PuenteTk anterior: un byte al pipe y una llamada por aviso
+  agrupado   PuenteTk actual: llamar_ultimo, a lo sumo un cuadro cada 1/FPS
+
+Mide el atraso de cada trama: desde que se manda hasta que Tk queda libre
+para redibujar (after_idle) con ese valor o uno posterior en pantalla;
+mientras el loop esta ocupado con la cola no se repinta nada. Tambien cuanto se atrasa un timer de Tk de 10 ms
+(si la interfaz sigue respondiendo) y cuantas llamadas y CPU se gastaron.
+"""
+import argparse
+import collections
+import math
+import os
+import sys
+import threading
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config_canicas import FPS_INTERFAZ  # noqa: E402
+from puente_tk import PuenteTk  # noqa: E402
+
+PERIODO_SONDA = 0.010
+
+
+class PuenteSinAgrupar:
+    """Copia del PuenteTk anterior: un byte al pipe y una llamada por aviso."""
+
+    def __init__(self, root):
+        self._pendientes = collections.deque()
+        self._lectura, self._escritura = os.pipe()
+        os.set_blocking(self._lectura, False)
+        os.set_blocking(self._escritura, False)
+        root.tk.createfilehandler(self._lectura, tk.READABLE, self._drenar)
+
+    def llamar(self, fn, *args):
+        self._pendientes.append((fn, args))
+        try:
+            os.write(self._escritura, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _drenar(self, fd, mascara):
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self._pendientes:
+            fn, args = self._pendientes.popleft()
+            fn(*args)
+
+
+def crear_root():
+    """Devuelve (root, con_ventanas)."""
+    try:
+        root = tk.Tk()
+        root.withdraw()
+        return root, True
+    except tk.TclError:
+        return tk.Tcl(), False
+
+
+def ocupar(segundos):
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        pass
+
+
+def percentil(ordenados, p):
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def medir(modo, n_tramas, ritmo, costo):
+    root, con_ventanas = crear_root()
+    salir = threading.Event()
+    # Estado del "controlador": ultimo numero de trama de cada tipo
+    estado = {"contador": -1, "posicion": -1}
+    envios = [0.0] * n_tramas
+    en_pantalla = {"contador": -1, "posicion": -1}
+    pintados = []    # (t, contador, posicion) cada vez que Tk pudo redibujar
+    pintar_pendiente = [False]
+    sonda = []       # atraso del timer de 10 ms
+    llamadas = [0]
+    terminado = threading.Event()
+
+    def pintar():
+        pintar_pendiente[0] = False
+        pintados.append((time.perf_counter(), en_pantalla["contador"], en_pantalla["posicion"]))
+
+    def mostrar(tipo, trama=None):
+        ocupar(costo)
+        llamadas[0] += 1
+        en_pantalla[tipo] = estado[tipo] if trama is None else trama
+        if not pintar_pendiente[0]:
+            pintar_pendiente[0] = True
+            root.after_idle(pintar)
+
+    if modo == "after":
+        def avisar(tipo, trama):
+            root.after(0, lambda t=trama: mostrar(tipo, t))
+    elif modo == "puente":
+        puente = PuenteSinAgrupar(root)
+
+        def avisar(tipo, trama):
+            puente.llamar(mostrar, tipo)
+    else:
+        puente = PuenteTk(root)
+
+        def avisar(tipo, trama):
+            puente.llamar_ultimo(mostrar, tipo, clave=tipo)
+
+    def controlador():
+        inicio = time.perf_counter()
+        for i in range(n_tramas):
+            if ritmo:
+                espera = inicio + i / ritmo - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+            tipo = "contador" if i % 2 == 0 else "posicion"
+            envios[i] = time.perf_counter()
+            estado[tipo] = i
+            avisar(tipo, i)
+        terminado.set()
+
+    def vigilar(previsto):
+        sonda.append(time.perf_counter() - previsto)
+        listo = (terminado.is_set() and pintados
+                 and pintados[-1][1] >= n_tramas - 2 and pintados[-1][2] >= n_tramas - 1)
+        if listo and (modo == "agrupado" or llamadas[0] >= n_tramas):
+            salir.set()
+            root.quit()
+            return
+        siguiente = time.perf_counter() + PERIODO_SONDA
+        root.after(round(PERIODO_SONDA * 1000), vigilar, siguiente)
+
+    cpu = time.process_time()
+    hilo = threading.Thread(target=controlador, daemon=True)
+    root.after(round(PERIODO_SONDA * 1000), vigilar, time.perf_counter() + PERIODO_SONDA)
+    # root.after desde otro hilo exige que el mainloop ya este corriendo
+    root.after(0, hilo.start)
+    if con_ventanas:
+        root.mainloop()
+    else:
+        # Sin ventanas el mainloop de Tk vuelve enseguida: se atiende a mano
+        while not salir.is_set():
+            root.tk.dooneevent(0)
+    hilo.join()
+    cpu = time.process_time() - cpu
+    try:
+        root.destroy()
+    except tk.TclError:
+        pass  # interprete Tcl sin ventanas
+
+    # Atraso de cada trama: hasta que se muestra ella o una posterior del mismo tipo
+    atrasos = []
+    for columna, primera in ((1, 0), (2, 1)):
+        j = 0
+        for i in range(primera, n_tramas, 2):
+            while j < len(pintados) and pintados[j][columna] < i:
+                j += 1
+            if j < len(pintados):
+                atrasos.append(pintados[j][0] - envios[i])
+    return sorted(atrasos), sorted(sonda), llamadas[0], cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tramas", type=int, default=10000)
+    parser.add_argument("--ritmo", type=float, default=5000, help="tramas por segundo (0 = sin pausa)")
+    parser.add_argument("--costo-us", type=float, default=200, help="costo de cada actualizacion de la interfaz")
+    parser.add_argument("--modos", default="after,puente,agrupado")
+    args = parser.parse_args()
+
+    print(f"{args.tramas} tramas a {args.ritmo or 'maximo'} /s, {args.costo_us:.0f} us por actualizacion, "
+          f"FPS_INTERFAZ = {FPS_INTERFAZ}")
+    print(f"{'modo':<9} {'atraso p50':>11} {'p99':>9} {'max':>9} | {'timer p99':>9} {'max':>9}"
+          f" | {'llamadas':>8} {'CPU':>7}")
+    con_ventanas = crear_root()[1]
+    for modo in args.modos.split(","):
+        if modo == "after" and not con_ventanas:
+            print(f"{modo:<9} (necesita pantalla para el mainloop de Tk)")
+            continue
+        atrasos, sonda, llamadas, cpu = medir(modo, args.tramas, args.ritmo, args.costo_us / 1e6)
+        ms = lambda lista, p: percentil(lista, p) * 1000  # noqa: E731
+        print(f"{modo:<9} {ms(atrasos, 50):>8.2f} ms {ms(atrasos, 99):>6.1f} ms {atrasos[-1] * 1000:>6.1f} ms"
+              f" | {ms(sonda, 99):>6.1f} ms {sonda[-1] * 1000:>6.1f} ms | {llamadas:>8} {cpu:>6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Ejecuta una cola de rutas guardada, sin interfaz grafica.
+
+No importa tkinter, asi que corre sin pantalla (por SSH o al arrancar la Pi):
+
+    python3 canicas_cli.py cola.json                 # placa en PORT_NAME
+    python3 canicas_cli.py cola.json --emulador      # sin hardware
+    python3 canicas_cli.py cola.json --emulador --escala 100 --sin-confirmar
+    python3 canicas_cli.py cola.json --emulador --reloj-virtual --sin-confirmar
+    python3 canicas_cli.py cola.json --optimizar --sin-confirmar
+
+La cola se guarda desde la interfaz (GUARDAR COLA) o a mano con el formato
+{"rutas": [{"origen": "S1", "camino": [1, 4, 7, "Destino"]}, ...]}.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from config_canicas import PORT_NAME
+from controlador_canicas import ControladorCanicas, ProgramaAbortado, cargar_cola
+from planificador_rutas import duracion_secuencia
+from registro_serial import RegistroSerial
+from reloj import RELOJ_REAL, RelojVirtual
+
+
+async def confirmar_por_consola(origen):
+    """Espera Enter del operador sin bloquear el loop."""
+    await asyncio.get_running_loop().run_in_executor(
+        None, input, f"Coloque canica en {origen} y presione Enter... ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cola", help="archivo JSON con la cola de rutas")
+    parser.add_argument("--puerto", default=PORT_NAME)
+    parser.add_argument("--emulador", action="store_true", help="usar emulador_stm32 en lugar de la placa")
+    parser.add_argument("--escala", type=float, default=1.0, help="con --emulador, veces mas rapido que el tiempo real")
+    parser.add_argument("--reloj-virtual", action="store_true", help="con --emulador, simular sin esperas reales")
+    parser.add_argument("--sin-confirmar", action="store_true", help="no esperar Enter antes de cada ruta")
+    parser.add_argument("--registro", metavar="ARCHIVO", help="grabar las tramas con su tiempo (ver analizar_registro.py)")
+    parser.add_argument("--metricas", type=int, metavar="PUERTO", help="publicar /metrics en ese puerto")
+    parser.add_argument("--optimizar", action="store_true", help="reordenar la cola antes de correrla")
+    parser.add_argument("--verbose", action="store_true", help="imprimir cada comando escrito en el puerto")
+    args = parser.parse_args()
+
+    t0 = time.monotonic()
+    try:
+        rutas = cargar_cola(args.cola)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"No se pudo cargar la cola: {e}")
+        return 2
+    if not rutas:
+        print("La cola esta vacia")
+        return 2
+
+    if args.optimizar:
+        from planificador_rutas import optimizar_orden
+        rutas, ahorro = optimizar_orden(rutas)
+        print(f"Orden optimizado (ahorro estimado {ahorro:.1f} s)")
+    print(f"Tiempo estimado: {duracion_secuencia(rutas):.1f} s (sin la carga de canicas)")
+
+    if args.reloj_virtual and not args.emulador:
+        print("--reloj-virtual solo tiene sentido con --emulador")
+        return 2
+    reloj = RelojVirtual() if args.reloj_virtual else RELOJ_REAL
+    registro = RegistroSerial(args.registro) if args.registro else None
+    control = ControladorCanicas(confirmar_carga=None if args.sin_confirmar else confirmar_por_consola,
+                                 reloj=reloj, registro=registro, mostrar_tx=args.verbose)
+    control.posicion.al_cambiar = lambda zona: print(f"  posicion: {zona}")
+    if args.metricas is not None:
+        control.servir_metricas(args.metricas)
+    control.iniciar(args.puerto, args.emulador, args.escala)
+    print(f"Listo en {time.monotonic() - t0:.2f} s")
+
+    inicio = time.monotonic()
+    inicio_simulado = reloj.ahora()
+    futuro = control.ejecutar(control.secuencia, rutas)
+    try:
+        futuro.result()
+    except KeyboardInterrupt:
+        control.parar()
+        print("Secuencia cancelada")
+        return 1
+    except ProgramaAbortado as e:
+        print(f"Secuencia detenida desde la placa: {e}")
+        return 1
+    except Exception as e:
+        print(f"Secuencia interrumpida: {e!r}")
+        return 1
+    finally:
+        control.cerrar()
+
+    print(f"Secuencia terminada: {len(rutas)} rutas en {time.monotonic() - inicio:.2f} s,"
+          f" canicas: {control.contadores.canicas}")
+    if reloj.virtual:
+        print(f"Tiempo simulado: {reloj.ahora() - inicio_simulado:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""Compilador de movimientos: convierte rutas de celdas en comandos de motor.
+
+Una ruta como S1 -> 1 -> 4 -> 7 -> Destino son cuatro bajadas seguidas en la
+misma columna. En lugar de mandar cuatro V-1328 (cada uno con su arranque,
+frenado y espera) se fusionan en un solo V-5312. Cada segmento recuerda las
+celdas por las que pasa para que la interfaz pueda ir marcando la posicion
+mientras el carro avanza.
+
+El TIM2 del STM32 mueve el motor horizontal y los verticales en el mismo
+tick, asi que en el corredor de retorno (Destino -> S1) los dos ejes se
+ordenan juntos y la espera es la del eje mas largo.
+
+`planificar` y `planificar_retorno` devuelven un Plan (segmentos, duracion
+y zonas) guardado en un cache LRU: la ejecucion, la lista de la cola, el
+tiempo estimado y el guardado de la cola comparten el mismo plan en lugar
+de recompilar la ruta cada vez. El cache solo guarda la geometria; los
+tiempos se piden al modelo al usarlos, asi que un #FIN no lo invalida.
+"""
+from functools import lru_cache
+
+from config_canicas import STEPS_H, STEPS_V, RETORNO_COMBINADO
+from modelo_tiempos import MODELO
+
+# Mapa Logico de Coordenadas (Fila, Columna)
+MAPA_COORDS = {
+    "S1": (0,0), "S2": (0,1), "S3": (0,2),
+    1: (1,0), 2: (1,1), 3: (1,2),
+    4: (2,0), 5: (2,1), 6: (2,2),
+    7: (3,0), 8: (3,1), 9: (3,2),
+    "Destino": (4,1) # Virtual, puede ser (4,0), (4,1) o (4,2)
+}
+FILA_DESTINO = 4
+# Planes distintos que se recuerdan (rutas de la cola, retornos y pasos manuales)
+MAX_PLANES = 256
+
+_ZONA_EN = {rc: z for z, rc in MAPA_COORDS.items() if z != "Destino"}
+
+
+def coordenadas(zona, columna_destino=1):
+    """(fila, columna) de una zona. Destino usa la columna por la que se bajo."""
+    if zona == "Destino":
+        return (FILA_DESTINO, columna_destino)
+    return MAPA_COORDS[zona]
+
+
+def zona_en(fila, columna):
+    if fila == FILA_DESTINO:
+        return "Destino"
+    return _ZONA_EN[(fila, columna)]
+
+
+def validar_movimiento(origen, destino):
+    if destino == "Destino":
+        if origen in [7, 8, 9]: return True, "OK"
+        return False, "A Destino solo se baja desde 7, 8 o 9"
+
+    r1, c1 = MAPA_COORDS[origen]
+    r2, c2 = MAPA_COORDS[destino]
+
+    if abs(r1-r2) + abs(c1-c2) != 1:
+        return False, "Movimiento no adyacente"
+
+    if r2 < r1:
+        return False, "No se puede subir en ruta"
+
+    return True, "OK"
+
+
+def tiempo_movimiento(eje, pasos):
+    """Tiempo estimado de un comando segun el modelo cinematico (envio -> #FIN)."""
+    return MODELO.duracion(eje, pasos)
+
+
+class Segmento:
+    """Un comando de motor que cubre una o varias celdas seguidas.
+
+    `recorrido` es la lista de (zona, (fila, columna)) por la que pasa el
+    carro, en orden; el ultimo elemento es la llegada.
+    """
+
+    def __init__(self, eje, signo, recorrido):
+        self.eje = eje
+        self.signo = signo
+        self.recorrido = recorrido
+
+    @property
+    def pasos(self):
+        por_celda = STEPS_H if self.eje == "H" else STEPS_V
+        return self.signo * por_celda * len(self.recorrido)
+
+    @property
+    def comando(self):
+        return f"{self.eje}{self.pasos}"
+
+    @property
+    def comandos(self):
+        return [self.comando]
+
+    @property
+    def partes(self):
+        return [self]
+
+    @property
+    def destino(self):
+        return self.recorrido[-1][0]
+
+    def tiempo_estimado(self):
+        return tiempo_movimiento(self.eje, self.pasos)
+
+    def hitos(self):
+        """(segundos desde el envio, (zona, coords)) de cada celda intermedia."""
+        por_celda = self.tiempo_estimado() / len(self.recorrido)
+        return [(por_celda * (i + 1), celda) for i, celda in enumerate(self.recorrido[:-1])]
+
+    def __repr__(self):
+        return f"Segmento({self.comando} -> {self.destino})"
+
+
+class SegmentoCombinado:
+    """Un tramo horizontal y uno vertical que se ejecutan a la vez.
+
+    El carro avanza en diagonal: `recorrido` ordena los cruces de celda de
+    ambos ejes segun el tiempo estimado de cada uno. Los hitos se guardan
+    como fraccion del segmento y se escalan con el modelo del momento.
+    """
+
+    def __init__(self, desde, horizontal, vertical):
+        self.partes = [horizontal, vertical]
+        eventos = []
+        for parte in self.partes:
+            por_celda = parte.tiempo_estimado() / len(parte.recorrido)
+            for k in range(1, len(parte.recorrido) + 1):
+                eventos.append((por_celda * k, parte.eje, parte.signo * k))
+
+        fila, col = desde
+        total = max(t for t, _, _ in eventos)
+        self._fracciones = []
+        self.recorrido = []
+        for t, eje, avance in sorted(eventos):
+            if eje == "H":
+                col = desde[1] + avance
+            else:
+                fila = desde[0] - avance  # V positivo = subir = fila menor
+            self._fracciones.append(t / total if total else 1.0)
+            self.recorrido.append((zona_en(fila, col), (fila, col)))
+
+    @property
+    def comandos(self):
+        return [p.comando for p in self.partes]
+
+    @property
+    def destino(self):
+        return self.recorrido[-1][0]
+
+    def tiempo_estimado(self):
+        return max(p.tiempo_estimado() for p in self.partes)
+
+    def hitos(self):
+        total = self.tiempo_estimado()
+        return [(f * total, celda) for f, celda in zip(self._fracciones[:-1], self.recorrido[:-1])]
+
+    def __repr__(self):
+        return f"SegmentoCombinado({' + '.join(self.comandos)} -> {self.destino})"
+
+
+def _paso_unitario(desde, hasta):
+    """Eje y signo del comando para pasar a una celda vecina."""
+    diff_r = hasta[0] - desde[0]
+    diff_c = hasta[1] - desde[1]
+    if diff_r == 1 and diff_c == 0: return "V", -1   # bajar
+    if diff_r == -1 and diff_c == 0: return "V", 1   # subir
+    if diff_c == 1 and diff_r == 0: return "H", 1    # derecha
+    if diff_c == -1 and diff_r == 0: return "H", -1  # izquierda
+    return None
+
+
+def _fusionar(celdas):
+    """Agrupa pasos unitarios (eje, signo, zona, coords) de igual sentido."""
+    segmentos = []
+    for eje, signo, zona, rc in celdas:
+        ultimo = segmentos[-1] if segmentos else None
+        if ultimo and ultimo.eje == eje and ultimo.signo == signo:
+            ultimo.recorrido.append((zona, rc))
+        else:
+            segmentos.append(Segmento(eje, signo, [(zona, rc)]))
+    return segmentos
+
+
+def compilar_camino(origen, camino, columna_destino=1):
+    """Segmentos para recorrer `camino` (formato de rutas_programadas) desde `origen`.
+
+    A Destino siempre se baja por la columna actual. Bajar varias filas de
+    golpe tambien se acepta (se desarma en celdas para seguir la posicion).
+    """
+    pos = coordenadas(origen, columna_destino)
+    celdas = []
+    for zona in camino:
+        hasta = (FILA_DESTINO, pos[1]) if zona == "Destino" else MAPA_COORDS[zona]
+        if hasta[1] == pos[1] and hasta[0] > pos[0] + 1:
+            # Bajada de varias filas: una celda a la vez
+            for fila in range(pos[0] + 1, hasta[0] + 1):
+                celdas.append(("V", -1, zona_en(fila, pos[1]), (fila, pos[1])))
+        else:
+            paso = _paso_unitario(pos, hasta)
+            if paso is None:
+                raise ValueError(f"Movimiento no soportado: {zona_en(*pos)} -> {zona}")
+            celdas.append((paso[0], paso[1], zona, hasta))
+        pos = hasta
+    return _fusionar(celdas)
+
+
+def compilar_retorno(actual, destino_final, columna_destino=1, combinado=RETORNO_COMBINADO):
+    """Segmentos del retorno seguro: por la izquierda y subiendo hasta S1.
+
+    Desde Destino se va a la columna 0 por abajo y se sube a S1; despues se
+    avanza por la fila de arranque hasta la columna de `destino_final`. Con
+    `combinado`, la ida a la izquierda y la subida se ordenan juntas.
+    """
+    if actual == destino_final:
+        return []
+
+    celdas = []
+    segmentos = []
+    if actual == "Destino":
+        col = min(max(columna_destino, 0), 2)
+        for c in range(col - 1, -1, -1):
+            celdas.append(("H", -1, "Destino", (FILA_DESTINO, c)))
+        for fila in range(FILA_DESTINO - 1, -1, -1):
+            celdas.append(("V", 1, zona_en(fila, 0), (fila, 0)))
+        if combinado and col > 0:
+            horizontal, vertical = _fusionar(celdas)
+            segmentos.append(SegmentoCombinado((FILA_DESTINO, col), horizontal, vertical))
+            celdas = []
+        c_curr = 0
+    else:
+        c_curr = MAPA_COORDS[actual][1]
+
+    c_dest = MAPA_COORDS[destino_final][1]
+    while c_curr != c_dest:
+        direction = 1 if c_dest > c_curr else -1
+        c_curr += direction
+        celdas.append(("H", direction, zona_en(0, c_curr), (0, c_curr)))
+    return segmentos + _fusionar(celdas)
+
+
+# --- PLANES (compilados una vez y compartidos) ---
+class Plan:
+    """Ruta compilada: sus segmentos en orden, la duracion estimada y las zonas que pisa.
+
+    Sale del cache y lo comparten todos los que piden la misma ruta, asi que
+    ni el plan ni sus segmentos se modifican. La duracion se recalcula con el
+    modelo de tiempos vigente la primera vez que se pide despues de un ajuste.
+    """
+
+    def __init__(self, origen, segmentos, columna_destino=1):
+        self.origen = origen
+        self.segmentos = tuple(segmentos)
+        self._duracion = (None, 0.0)  # (MODELO.ajustes, segundos)
+        self.zonas = tuple(zona for seg in self.segmentos for zona, _ in seg.recorrido)
+        self.comandos = tuple(cmd for seg in self.segmentos for cmd in seg.comandos)
+        if self.segmentos:
+            self.destino = self.segmentos[-1].destino
+            self.columna_final = self.segmentos[-1].recorrido[-1][1][1]
+        else:
+            self.destino = origen
+            self.columna_final = coordenadas(origen, columna_destino)[1]
+
+    @property
+    def duracion(self):
+        ajustes, segundos = self._duracion
+        if ajustes != MODELO.ajustes:
+            segundos = sum(seg.tiempo_estimado() for seg in self.segmentos)
+            self._duracion = (MODELO.ajustes, segundos)
+        return segundos
+
+    def __iter__(self):
+        return iter(self.segmentos)
+
+    def __len__(self):
+        return len(self.segmentos)
+
+    def __repr__(self):
+        return f"Plan({self.origen} -> {self.destino}: {' '.join(self.comandos)}, {self.duracion:.2f} s)"
+
+
+def planificar(origen, camino, columna_destino=1):
+    """Plan de compilar_camino, desde el cache. Lanza lo mismo que compilar_camino."""
+    # Destino es la unica zona que depende de la columna; el resto la comparte
+    columna = columna_destino if origen == "Destino" else 1
+    return _plan_camino(origen, tuple(camino), columna)
+
+
+def planificar_retorno(actual, destino_final, columna_destino=1, combinado=RETORNO_COMBINADO):
+    """Plan de compilar_retorno, desde el cache."""
+    columna = columna_destino if actual == "Destino" else 1
+    return _plan_retorno(actual, destino_final, columna, combinado)
+
+
+@lru_cache(maxsize=MAX_PLANES)
+def _plan_camino(origen, camino, columna_destino):
+    return Plan(origen, compilar_camino(origen, camino, columna_destino), columna_destino)
+
+
+@lru_cache(maxsize=MAX_PLANES)
+def _plan_retorno(actual, destino_final, columna_destino, combinado):
+    return Plan(actual, compilar_retorno(actual, destino_final, columna_destino, combinado), columna_destino)
@@ -0,0 +1,74 @@
+"""Configuracion compartida por la interfaz y los modulos de movimiento."""
+import os
+
+# --- CONFIGURACION SERIAL ---
+# Ajustar puerto segun corresponda (/dev/ttyACM0 en Pi, COMx en Windows)
+PORT_NAME = '/dev/ttyACM0' 
+BAUD_RATE = 115200
+# True: usar emulador_stm32.py en lugar de la placa (pruebas sin hardware)
+USAR_EMULADOR = False
+# Con el emulador, cuantas veces mas rapido corre el tiempo (1.0 = real)
+ESCALA_EMULADOR = 1.0
+# Si PORT_NAME no contesta, probar los demas /dev/ttyACM* y /dev/ttyUSB*
+BUSCAR_PUERTO = True
+# Tope para que la placa conteste la sonda de identificacion
+TIMEOUT_SONDA = 1.0
+# "auto": tramas binarias (protocolo_binario.py) si la placa las ofrece;
+# "texto": siempre el protocolo de lineas; "binario": pedirlas aunque no las ofrezca
+PROTOCOLO = "auto"
+# En binario, mandar cada ruta entera como un programa que la placa ejecuta
+# sola (programa_placa.py) si la placa lo ofrece. False: paso a paso desde la Pi
+PROGRAMAS_EN_PLACA = True
+# Velocidades a probar al conectar, de la mas rapida a la mas lenta; la placa
+# siempre arranca en BAUD_RATE y vuelve a ella si la prueba falla. () = no subir
+BAUDIOS_RAPIDOS = (921600, 460800)
+# Cuanto espera la placa la confirmacion antes de volver a BAUD_RATE
+# (VENTANA_BAUDIOS_MS en main.c)
+VENTANA_BAUDIOS = 1.0
+
+# --- CONFIGURACION FISICA ---
+STEPS_H = 1520
+STEPS_V = 1328
+
+# Ajuste fino (1/8 de celda)
+CALIB_FINE_H = int(STEPS_H / 8)
+CALIB_FINE_V = int(STEPS_V / 8)
+
+# --- TIEMPOS DE ESPERA (Segundos) ---
+# Los movimientos no tienen tiempos fijos: los calcula modelo_tiempos.py a
+# partir de los pasos y del periodo de TIM2. El servo no avisa cuando llega,
+# asi que el volcado sigue usando una espera fija.
+TIME_SERVO  = 2.0
+
+# Ajuste automatico del modelo de tiempos (se actualiza con cada #FIN)
+ARCHIVO_MODELO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modelo_tiempos.json")
+
+# Retorno Destino -> S1 moviendo H y V a la vez (el TIM2 avanza ambos ejes
+# en el mismo tick). False: primero a la izquierda y despues subir.
+RETORNO_COMBINADO = True
+
+# --- AVISOS DE FIN (#FIN,H / #FIN,V) ---
+# Tolerancia extra antes de dar por perdido un aviso de fin
+MARGEN_FIN = 2.0
+
+# --- REGISTRO DE TRAMAS (registro_serial.py / analizar_registro.py) ---
+# Archivo donde se graban TX/RX con marca de tiempo (None = no grabar)
+ARCHIVO_REGISTRO = None
+
+# --- METRICAS (metricas.py) ---
+# Puerto HTTP para /metrics en formato Prometheus (None = desactivado)
+PUERTO_METRICAS = None
+
+# --- COLA DE RUTAS (modo programado) ---
+# True: una sola ruta por origen (S1, S2, S3) y agregar otra la sobreescribe
+UNA_RUTA_POR_ORIGEN = False
+# Tope de rutas en la cola
+MAX_RUTAS_COLA = 500
+
+# --- ANIMACION DEL CARRO (rejilla_canvas.py) ---
+# Cuadros por segundo maximos mientras el carro se mueve
+FPS_ANIMACION = 30
+
+# --- PUENTE A TK (puente_tk.py) ---
+# Veces por segundo, como maximo, que la interfaz atiende los avisos del controlador
+FPS_INTERFAZ = 30
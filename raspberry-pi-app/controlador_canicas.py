@@ -0,0 +1,681 @@
+"""Controlador de la maquina de canicas, sin tkinter.
+
+Reune el motor que antes vivia dentro de la interfaz: seguimiento de la
+posicion, ejecucion de rutas, enlace serie y contadores. Todo corre en el
+loop de nucleo_async; la GUI (o canicas_cli.py) solo llama a los metodos
+publicos y se suscribe a los avisos.
+
+Los avisos (`al_cambiar`, `al_parada_placa`, `al_evento`) se llaman desde
+el hilo del loop: una GUI tiene que pasarlos a su propio hilo.
+"""
+import asyncio
+import json
+import queue
+import time
+
+import serial
+
+from compilador_movimientos import (
+    coordenadas, planificar, planificar_retorno, validar_movimiento,
+)
+from config_canicas import (
+    PORT_NAME, BAUD_RATE, USAR_EMULADOR, ESCALA_EMULADOR, BUSCAR_PUERTO, TIMEOUT_SONDA,
+    TIME_SERVO, MARGEN_FIN, ARCHIVO_MODELO, ARCHIVO_REGISTRO, PUERTO_METRICAS, PROTOCOLO,
+    BAUDIOS_RAPIDOS, VENTANA_BAUDIOS, PROGRAMAS_EN_PLACA,
+)
+from enlace_serial import TRAMAS_PARADA, buscar_placa
+from metricas import LIMITES_DURACION, Metricas, ServidorMetricas
+from modelo_tiempos import MODELO
+from nucleo_async import BucleAsync, EnlaceSerialAsync, esperar_evento
+import programa_placa
+import protocolo_binario as pb
+from registro_serial import RegistroSerial
+from reloj import RELOJ_REAL
+
+SERVO_ABIERTO = 25
+SERVO_CERRADO = 65
+
+
+class ProgramaAbortado(Exception):
+    """La placa aborto el programa en curso (boton azul o parada)."""
+
+    def __init__(self, numero, paso):
+        super().__init__(f"la placa aborto el programa {numero} en el paso {paso}")
+        self.numero = numero
+        self.paso = paso
+
+
+class RastreadorPosicion:
+    """Zona en la que esta el carro y columna por la que bajo a Destino.
+
+    Durante un movimiento guarda tambien el `trayecto` en curso para que la
+    interfaz pueda dibujar el carro entre celdas (`estimar`). `al_trayecto`
+    avisa cuando empieza uno.
+    """
+
+    def __init__(self, zona="S1", columna_destino=1):
+        self.zona = zona
+        self.columna_destino = columna_destino
+        self.al_cambiar = None
+        self.al_trayecto = None
+        # (inicio, (fila, columna) de salida, {eje: [celdas con signo, segundos, llego #FIN]})
+        self.trayecto = None
+        # Reloj con el que se mide el trayecto (el controlador pone el de su loop)
+        self.ahora = time.monotonic
+
+    def marcar(self, zona, coords=None):
+        if zona == "Destino" and coords:
+            self.columna_destino = coords[1]
+        self.zona = zona
+        if self.al_cambiar:
+            self.al_cambiar(zona)
+
+    def coordenadas(self):
+        return coordenadas(self.zona, self.columna_destino)
+
+    # --- TRAYECTO EN CURSO ---
+    def iniciar_trayecto(self, seg, escala=1.0):
+        """Empieza el trayecto de `seg` desde la posicion actual."""
+        ejes = {}
+        for parte in seg.partes:
+            ejes[parte.eje] = [parte.signo * len(parte.recorrido), parte.tiempo_estimado() / escala, False]
+        self.trayecto = (self.ahora(), self.coordenadas(), ejes)
+        if self.al_trayecto:
+            self.al_trayecto()
+
+    def fin_eje(self, eje):
+        """La placa aviso #FIN de `eje`: ese eje ya llego, aunque el modelo diga otra cosa."""
+        trayecto = self.trayecto
+        if trayecto and eje in trayecto[2]:
+            trayecto[2][eje][2] = True
+
+    def terminar_trayecto(self):
+        self.trayecto = None
+
+    def estimar(self):
+        """(fila, columna) con decimales donde va el carro segun el trayecto.
+
+        Los pasos de TIM2 son a ritmo fijo, asi que cada eje avanza en linea
+        recta con el tiempo estimado; un #FIN lo lleva directo al final.
+        Se puede llamar desde cualquier hilo.
+        """
+        trayecto = self.trayecto
+        if trayecto is None:
+            return self.coordenadas()
+        inicio, (fila, columna), ejes = trayecto
+        transcurrido = self.ahora() - inicio
+        for eje, (celdas, duracion, llego) in list(ejes.items()):
+            avance = 1.0 if llego or duracion <= 0 else min(1.0, transcurrido / duracion)
+            if eje == "H":
+                columna += celdas * avance
+            else:
+                fila -= celdas * avance  # V positivo = subir = fila menor
+        return fila, columna
+
+
+class Contadores:
+    """Canicas en el estanon y los contadores que informa el STM32 (#IN / #OUT)."""
+
+    def __init__(self):
+        self.canicas = 0
+        self.entradas = 0
+        self.salidas = 0
+        self.al_cambiar = None
+
+    def sumar_descarga(self):
+        self.canicas += 1
+        self._avisar()
+
+    def procesar_evento(self, linea):
+        """Actualiza con una trama #TIPO,ent,sal,act. Devuelve False si no lo era."""
+        partes = linea.split(',')
+        if len(partes) < 4:
+            return False
+        try:
+            self.entradas = int(partes[1])
+            self.salidas = int(partes[2])
+            self.canicas = int(partes[3])
+        except ValueError:
+            print(f"Error parseando trama: {linea}")
+            return False
+        self._avisar()
+        return True
+
+    def _avisar(self):
+        if self.al_cambiar:
+            self.al_cambiar(self)
+
+
+class ControladorCanicas:
+    """Motor completo: conexion, movimientos, descargas, rutas y STOP.
+
+    `confirmar_carga(origen)` es una corrutina opcional que se espera antes
+    de cada ruta (la GUI muestra un aviso; sin ella no se espera).
+    Con un `reloj` virtual (reloj.py) y el emulador, todo corre en tiempo
+    simulado. `registro` (registro_serial.py) anota las tramas con su tiempo;
+    si no se pasa, se crea uno cuando ARCHIVO_REGISTRO esta configurado.
+    Con `mostrar_tx` tambien se imprime cada comando escrito.
+    """
+
+    def __init__(self, confirmar_carga=None, reloj=RELOJ_REAL, registro=None, mostrar_tx=False):
+        self.posicion = RastreadorPosicion()
+        self.contadores = Contadores()
+        self.reloj = reloj
+        self.registro = registro
+        self.mostrar_tx = mostrar_tx
+        self.nucleo = BucleAsync(reloj)
+        self.posicion.ahora = self.nucleo.loop.time
+        self.metricas = self._definir_metricas()
+        self.servidor_metricas = None
+        self.confirmar_carga = confirmar_carga
+        self.al_parada_placa = None
+        self.al_evento = None
+        # Programa que esta ejecutando la placa: (numero, Programa, cola de avisos #PRG)
+        self._programa = None
+        self._numero_programa = 0
+        # Hay mediciones que todavia no se guardaron en ARCHIVO_MODELO
+        self._modelo_sin_guardar = False
+
+        self.ser = None
+        self.puerto = None
+        self.emulador = None
+        self.enlace = None
+        # Segundos que tardo la placa en contestar la sonda al conectar
+        self.t_conexion = None
+        # Lo que sigue a "#ID,CANICAS," en la respuesta a la sonda (None si no contesto)
+        self.version_placa = None
+        # Con STOP activo solo pasan las tramas de frenado
+        self.detenido = False
+        # Tiempo acelerado del emulador: divide las esperas fijas
+        self.escala = 1.0
+
+    # --- CONEXION ---
+    def iniciar(self, puerto=PORT_NAME, emulador=USAR_EMULADOR, escala=ESCALA_EMULADOR):
+        if MODELO.cargar(ARCHIVO_MODELO): print(f"Modelo de tiempos: {MODELO}")
+        if self.registro is None and ARCHIVO_REGISTRO:
+            self.registro = RegistroSerial(ARCHIVO_REGISTRO)
+        if PUERTO_METRICAS is not None:
+            self.servir_metricas(PUERTO_METRICAS)
+        self.nucleo.iniciar()
+        if self.conectar(puerto, emulador, escala):
+            # La sonda pudo encontrar la placa en una velocidad que dejo otro host
+            baudios = getattr(self.ser, "baudrate", BAUD_RATE)
+            self.enlace = EnlaceSerialAsync(self.ser, self._al_recibir_linea, baudios,
+                                            mostrar_tx=self.mostrar_tx, registro=self.registro)
+            self.nucleo.correr(self.enlace.iniciar()).result()
+            self.negociar_baudios()
+            self.negociar_protocolo()
+
+    def negociar_baudios(self, candidatos=BAUDIOS_RAPIDOS):
+        """Sube la velocidad del puerto si la placa lo ofrece; si no, queda en la actual."""
+        if not candidatos:
+            return
+        if self.version_placa is not None and "BAUD" not in self.version_placa.split(","):
+            return
+        anterior = self.enlace.baudios
+        baudios = self.nucleo.correr(
+            self.enlace.negociar_baudios(candidatos, TIMEOUT_SONDA, VENTANA_BAUDIOS / self.escala)).result()
+        if baudios != anterior:
+            print(f"Puerto a {baudios} baudios")
+
+    def negociar_protocolo(self):
+        """Pasa a las tramas binarias si la placa las ofrece (ver PROTOCOLO)."""
+        if PROTOCOLO == "texto":
+            return
+        # Firmware que contesto la sonda sin "BIN": ni se pregunta
+        if PROTOCOLO == "auto" and self.version_placa is not None and "BIN" not in self.version_placa.split(","):
+            return
+        if self.nucleo.correr(self.enlace.negociar_binario(TIMEOUT_SONDA)).result():
+            print("Protocolo binario (tramas con seq y CRC-16)")
+        else:
+            print("La placa no acepto el protocolo binario: se sigue en texto")
+
+    def conectar(self, puerto=PORT_NAME, emulador=USAR_EMULADOR, escala=ESCALA_EMULADOR):
+        """Abre el puerto de la placa en cuanto contesta la sonda `I`."""
+        inicio = time.monotonic()
+        if emulador and self.reloj.virtual:
+            # El reloj virtual no corre para un pty: la placa va en el mismo loop
+            from emulador_stm32 import EmuladorSTM32
+            self.emulador = EmuladorSTM32()
+            self.ser = self.nucleo.correr(self.emulador.conectar_loop(BAUD_RATE)).result()
+            self.puerto = "emulador (reloj virtual)"
+            print(f"PLACA LISTA en {self.puerto}")
+            return True
+        if emulador:
+            from emulador_stm32 import EmuladorSTM32
+            self.escala = escala
+            self.emulador = EmuladorSTM32(escala=escala)
+            encontrado = buscar_placa(self.emulador.iniciar(), BAUD_RATE, TIMEOUT_SONDA, buscar=False)
+        else:
+            encontrado = buscar_placa(puerto, BAUD_RATE, TIMEOUT_SONDA, buscar=BUSCAR_PUERTO,
+                                      alternativas=BAUDIOS_RAPIDOS)
+
+        if encontrado:
+            self.ser, self.puerto, version = encontrado
+            self.version_placa = version
+            self.t_conexion = time.monotonic() - inicio
+            print(f"PLACA LISTA en {self.puerto} (protocolo {version}) en {self.t_conexion * 1000:.0f} ms")
+            return True
+
+        # Firmware sin el comando I: usar el puerto configurado sin confirmar
+        if not emulador:
+            try:
+                self.ser = serial.Serial(puerto, BAUD_RATE, timeout=0.1)
+                self.puerto = puerto
+                print(f"AVISO: {puerto} no contesto la sonda, se usa sin confirmar")
+                return True
+            except (OSError, ValueError):
+                pass
+        print("MODO SIMULACION (Sin Serial)")
+        return False
+
+    def servir_metricas(self, puerto):
+        """Publica /metrics en `puerto` (0 = uno libre)."""
+        try:
+            self.servidor_metricas = ServidorMetricas(self.metricas, puerto).iniciar()
+        except OSError as e:
+            print(f"No se pudo abrir el puerto de metricas {puerto}: {e}")
+
+    def _definir_metricas(self):
+        m = Metricas()
+        m.lectura("canicas_contador", "Canicas en el estanon (contador_canicas)", lambda: self.contadores.canicas)
+        m.lectura("canicas_stm32_entradas", "Entradas contadas por el sensor del STM32 (#IN)",
+                  lambda: self.contadores.entradas)
+        m.lectura("canicas_stm32_salidas", "Salidas contadas por el sensor del STM32 (#OUT)",
+                  lambda: self.contadores.salidas)
+        m.contador("canicas_movimientos_total", "Comandos de movimiento enviados por eje")
+        m.contador("canicas_programas_total", "Programas enviados a la placa")
+        m.contador("canicas_paradas_total", "Paradas de emergencia por origen")
+        m.contador("canicas_fin_perdidos_total", "Movimientos sin #FIN dentro del margen")
+        m.contador("canicas_cola_llena_total", "Comandos descartados con la cola de TX llena")
+        m.contador("canicas_comandos_invalidos_total", "Comandos descartados sin trama binaria equivalente")
+        m.lectura("canicas_tramas_tx_total", "Comandos escritos en el puerto",
+                  lambda: self.enlace.tramas_tx if self.enlace else 0, tipo="counter")
+        m.lectura("canicas_errores_serial_total", "Errores de lectura/escritura del puerto",
+                  lambda: self.enlace.errores if self.enlace else 0, tipo="counter")
+        m.lectura("canicas_tramas_invalidas_total", "Tramas binarias descartadas por CRC o largo",
+                  lambda: self.enlace.errores_crc if self.enlace else 0, tipo="counter")
+        m.lectura("canicas_reenvios_total", "Comandos binarios reenviados por falta de ACK",
+                  lambda: self.enlace.reenvios if self.enlace else 0, tipo="counter")
+        m.lectura("canicas_tramas_perdidas_total", "Comandos sin ACK y avisos de la placa que no llegaron",
+                  lambda: self.enlace.perdidos_tx + self.enlace.perdidos_rx if self.enlace else 0, tipo="counter")
+        m.lectura("canicas_cola_tx", "Comandos esperando salir por el puerto",
+                  lambda: self.enlace.pendientes() if self.enlace else 0)
+        m.lectura("canicas_trabajos", "Trabajos de movimiento en curso o esperando turno",
+                  lambda: self.nucleo.trabajos)
+        m.lectura("canicas_detenido", "1 si hay un STOP activo", lambda: int(self.detenido))
+        m.histograma("canicas_duracion_movimiento_segundos", "Envio -> #FIN por eje", LIMITES_DURACION)
+        return m
+
+    def cerrar(self):
+        if self.servidor_metricas:
+            self.servidor_metricas.detener()
+        if self.enlace and self.enlace.baudios != BAUD_RATE:
+            # Dejar la placa como la encuentra un host nuevo (interfaces viejas, prueba_serial)
+            self.negociar_baudios((BAUD_RATE,))
+        if self.enlace:
+            self.nucleo.llamar(self.enlace.detener)
+        self.nucleo.detener()
+        if self.ser:
+            self.ser.close()
+        if self.emulador:
+            self.emulador.detener()
+        if self.registro:
+            self.registro.cerrar()
+        if self._modelo_sin_guardar:
+            self._guardar_modelo()
+
+    @property
+    def con_placa(self):
+        return self.enlace is not None
+
+    @property
+    def ocupado(self):
+        return self.nucleo.ocupado
+
+    # --- COMANDOS ---
+    def enviar_comando(self, cmd):
+        """Envia un comando desde cualquier hilo (calibracion, pruebas, etc.)."""
+        self.nucleo.llamar(self._enviar, cmd)
+
+    def _enviar(self, cmd, movimiento=False):
+        # Solo en el loop: es el unico que toca el puerto
+        # SEGURIDAD: Si hay STOP, bloquear todo menos el frenado
+        if self.detenido and cmd not in TRAMAS_PARADA:
+            print(f"CMD BLOQUEADO POR STOP: {cmd}")
+            return
+
+        if self.enlace:
+            try:
+                if movimiento: self.enlace.enviar_movimiento(cmd)
+                else: self.enlace.enviar(cmd)
+            except queue.Full as e:
+                self.metricas.sumar("canicas_cola_llena_total")
+                print(f"Error Serial: {e}")
+            except pb.ErrorProtocolo as e:
+                # En binario: un comando escrito a mano (calibracion) sin trama
+                self.metricas.sumar("canicas_comandos_invalidos_total")
+                print(f"Error Serial: {e}")
+        else:
+            print(f"SIM: {cmd}")
+
+    def parar(self):
+        """STOP: frena los motores y cancela el trabajo en curso y los encolados."""
+        self.detenido = True
+        self.metricas.sumar("canicas_paradas_total", origen="operador")
+        if self.registro:
+            self.registro.anotar("PARADA")
+        print("!!! STOP ACTIVADO !!!")
+        if self.enlace:
+            self.nucleo.llamar(self.enlace.enviar_parada)
+        else:
+            print(f"SIM: {' '.join(TRAMAS_PARADA)}")
+        self.nucleo.cancelar()
+
+    def rearmar(self):
+        self.detenido = False
+
+    def ejecutar(self, trabajo, *args):
+        """Encola la corrutina `trabajo(*args)`. Devuelve un concurrent Future."""
+        return self.nucleo.ejecutar(trabajo(*args))
+
+    def _al_recibir_linea(self, linea):
+        # Los #FIN ya los resuelve el enlace; aca solo cierran el eje del trayecto
+        if linea.startswith('#FIN,'):
+            self.posicion.fin_eje(linea[5:])
+            return
+        if linea.startswith('#PRG,'):
+            self._al_progreso(linea)
+            return
+        if linea == '#STOP':
+            self._parada_placa()
+        elif linea.startswith('#'):
+            if self.contadores.procesar_evento(linea):
+                print(f"Evento STM32 procesado: {linea}")
+            if self.al_evento: self.al_evento(linea)
+
+    def _parada_placa(self):
+        # Parada desde el boton azul de la placa: ya freno, solo cancelar
+        self.detenido = True
+        self.metricas.sumar("canicas_paradas_total", origen="placa")
+        self.nucleo.cancelar()
+        print("!!! STOP DESDE LA PLACA !!!")
+        if self.al_parada_placa: self.al_parada_placa()
+
+    # --- CORRUTINAS DE MOVIMIENTO ---
+    async def esperar_movimiento(self, comandos, wait_time, hitos=()):
+        """Espera el #FIN de todos los ejes de `comandos`.
+
+        Sin placa (modo simulacion) no llegan avisos, asi que se espera el
+        tiempo del modelo. Con placa, wait_time solo sirve de tope. Mientras
+        tanto se marcan las celdas de `hitos` (segundos, (zona, coords)) al
+        ritmo estimado del carro. Un STOP la interrumpe con CancelledError.
+        Los tiempos salen del reloj del loop, asi corre igual en uno simulado.
+        """
+        reloj = asyncio.get_running_loop().time
+        inicio = reloj()
+        wait_time /= self.escala
+        eventos = [self.enlace.fin[cmd[0]] for cmd in comandos] if self.enlace else []
+
+        for t, celda in hitos:
+            restante = inicio + t / self.escala - reloj()
+            pendientes = [evt for evt in eventos if not evt.is_set()]
+            if self.enlace and not pendientes: break
+            if self.enlace: await esperar_evento(pendientes[0], restante)
+            else: await asyncio.sleep(max(0.0, restante))
+            self.posicion.marcar(*celda)
+
+        if not self.enlace:
+            await asyncio.sleep(max(0.0, inicio + wait_time - reloj()))
+            return
+        limite = inicio + wait_time + MARGEN_FIN
+        for evt in eventos:
+            if not await esperar_evento(evt, limite - reloj()):
+                self.metricas.sumar("canicas_fin_perdidos_total")
+                print(f"AVISO: sin #FIN para {' + '.join(comandos)}, se continua")
+                break
+
+    async def ejecutar_segmento(self, seg):
+        """Envia un segmento compilado y sigue al carro celda por celda.
+
+        Un segmento combinado manda H y V juntos y espera al eje mas lento.
+        """
+        for cmd in seg.comandos:
+            self._enviar(cmd, movimiento=True)
+        await self.seguir_segmento(seg)
+
+    async def seguir_segmento(self, seg):
+        """Sigue un segmento ya ordenado hasta sus #FIN y deja el carro en la llegada."""
+        for cmd in seg.comandos:
+            self.metricas.sumar("canicas_movimientos_total", eje=cmd[0])
+        self.posicion.iniciar_trayecto(seg, self.escala)
+        try:
+            await self.esperar_movimiento(seg.comandos, seg.tiempo_estimado(), seg.hitos())
+        finally:
+            self.posicion.terminar_trayecto()
+        self.posicion.marcar(*seg.recorrido[-1])
+        self.ajustar_modelo(seg)
+
+    def ajustar_modelo(self, seg):
+        """Alimenta el modelo de tiempos con lo que tardo cada eje en avisar #FIN (se guarda despues)."""
+        if not self.enlace: return
+        # Con tiempo acelerado o simulado las mediciones no sirven para la placa real
+        real = self.escala == 1.0 and not self.reloj.virtual
+        for parte in seg.partes:
+            if self.enlace.fin[parte.eje].is_set():
+                duracion = self.enlace.t_fin[parte.eje] - self.enlace.t_envio[parte.eje]
+                self.metricas.observar("canicas_duracion_movimiento_segundos", duracion, eje=parte.eje)
+                if real:
+                    MODELO.registrar(parte.eje, parte.pasos, duracion)
+                    self._modelo_sin_guardar = True
+
+    async def guardar_modelo(self):
+        """Guarda el modelo si cambio, fuera del loop (al terminar una ruta o un movimiento)."""
+        if not self._modelo_sin_guardar: return
+        self._modelo_sin_guardar = False
+        await asyncio.get_running_loop().run_in_executor(None, self._guardar_modelo)
+
+    def _guardar_modelo(self):
+        try:
+            MODELO.guardar(ARCHIVO_MODELO)
+        except OSError as e:
+            print(f"No se pudo guardar el modelo de tiempos: {e}")
+
+    # --- PROGRAMAS EN LA PLACA ---
+    @property
+    def programas_en_placa(self):
+        """True si las rutas van como programa (placa en binario que los ofrece)."""
+        return (PROGRAMAS_EN_PLACA and self.enlace is not None and self.enlace.binario
+                and bool(self.enlace.capacidades & pb.CAPACIDAD_PROGRAMAS))
+
+    async def ejecutar_programa(self, programa):
+        """Manda `programa` en una sola trama y sigue a la placa mientras lo ejecuta.
+
+        La placa encadena los pasos sin esperar al host; aca solo se siguen los
+        #PRG (empieza cada paso, termino, se aborto) y los #FIN de cada
+        movimiento para mover el carro en la interfaz y ajustar el modelo.
+        Si se pierden avisos se sigue con el siguiente que llegue; si la placa
+        aborta (boton azul) lanza ProgramaAbortado.
+        """
+        self._numero_programa = (self._numero_programa + 1) & 0xFF
+        numero = self._numero_programa
+        carga = programa.codificar(numero)
+        avisos = asyncio.Queue()
+        self._programa = (numero, programa, avisos)
+        try:
+            self.enlace.enviar_programa(carga, f"PRG{numero}")
+            self.metricas.sumar("canicas_programas_total")
+            siguiente = 0
+            while True:
+                # Tope: lo que le falta al programa entero, por si se pierden avisos
+                restante = sum(p.duracion for p in programa.pasos[max(0, siguiente - 1):])
+                try:
+                    paso, estado = await asyncio.wait_for(avisos.get(), restante / self.escala + MARGEN_FIN)
+                except asyncio.TimeoutError:
+                    self.metricas.sumar("canicas_fin_perdidos_total")
+                    print(f"AVISO: sin aviso de fin del programa {numero}, se continua")
+                    paso, estado = len(programa), programa_placa.TERMINADO
+                if estado == programa_placa.ABORTADO:
+                    if not self.detenido:
+                        # Se perdio el #STOP que la placa manda antes del aborto
+                        self._parada_placa()
+                    raise ProgramaAbortado(numero, paso)
+                # Un aviso perdido: los pasos salteados ya se hicieron
+                for omitido in programa.pasos[siguiente:paso]:
+                    if omitido.segmento:
+                        self.posicion.marcar(*omitido.segmento.recorrido[-1])
+                if estado == programa_placa.TERMINADO:
+                    return
+                siguiente = paso + 1
+                if programa.pasos[paso].segmento:
+                    await self.seguir_segmento(programa.pasos[paso].segmento)
+        finally:
+            self._programa = None
+
+    def _al_progreso(self, linea):
+        try:
+            numero, paso, estado = (int(v) for v in linea[5:].split(','))
+        except ValueError:
+            print(f"Error parseando trama: {linea}")
+            return
+        if self._programa is None or self._programa[0] != numero:
+            return  # de un programa anterior (cancelado por STOP)
+        _, programa, avisos = self._programa
+        if estado == programa_placa.PASO and paso < len(programa):
+            seg = programa.pasos[paso].segmento
+            # Antes de que llegue su #FIN: los avisos se atienden en orden
+            for cmd in seg.comandos if seg else ():
+                self.enlace.preparar_fin(cmd[0])
+        avisos.put_nowait((paso, estado))
+
+    def programa_ruta(self, segmentos, descarga):
+        """Programa con los `segmentos` y, si `descarga`, el asentamiento y la descarga."""
+        programa = programa_placa.Programa()
+        for seg in segmentos:
+            programa.mover(seg)
+        if descarga:
+            programa.pausa(0.5)
+            programa.servo(SERVO_ABIERTO)
+            programa.pausa(TIME_SERVO)
+            programa.servo(SERVO_CERRADO)
+            programa.pausa(1.0)
+        return programa
+
+    async def descargar(self):
+        """Abre el servo, espera la caida de la canica y vuelve a cerrar."""
+        print("Descargando...")
+        self._enviar(f"S{SERVO_ABIERTO}")
+        await asyncio.sleep(TIME_SERVO / self.escala)
+        self._enviar(f"S{SERVO_CERRADO}")
+        await asyncio.sleep(1.0 / self.escala)
+        # Con placa el conteo llega con el #IN del sensor de entrada
+        if not self.enlace:
+            self.contadores.sumar_descarga()
+
+    async def retornar(self, destino_final):
+        """Retorno seguro: desde Destino por la izquierda hasta S1 y luego por la fila de arranque."""
+        if self.posicion.zona == destino_final: return
+        segmentos = planificar_retorno(self.posicion.zona, destino_final, self.posicion.columna_destino)
+        if not (self.programas_en_placa and await self._intentar_programa(segmentos, descarga=False)):
+            for seg in segmentos:
+                await self.ejecutar_segmento(seg)
+        self.posicion.marcar(destino_final)
+
+    async def _intentar_programa(self, segmentos, descarga):
+        """Ejecuta los segmentos como programa. False si no entra en una trama."""
+        try:
+            programa = self.programa_ruta(segmentos, descarga)
+            programa.codificar(0)
+        except pb.ErrorProtocolo as e:
+            print(f"AVISO: {e}; se sigue paso a paso")
+            return False
+        await self.ejecutar_programa(programa)
+        return True
+
+    async def mover(self, destino):
+        """Movimiento manual a una zona vecina. En Destino descarga y vuelve a S1."""
+        valido, msg = validar_movimiento(self.posicion.zona, destino)
+        if not valido:
+            raise ValueError(msg)
+        for seg in planificar(self.posicion.zona, [destino], self.posicion.columna_destino):
+            await self.ejecutar_segmento(seg)
+
+        if self.posicion.zona == "Destino":
+            await self.descargar()
+            await self.retornar("S1")
+        await self.guardar_modelo()
+
+    async def ejecutar_ruta(self, ruta):
+        """Va al origen, espera la carga, recorre el camino y descarga."""
+        origen = ruta['origen']
+        await self.retornar(origen)
+        if self.confirmar_carga:
+            await self.confirmar_carga(origen)
+
+        # Celdas seguidas en un mismo sentido van en un solo comando
+        segmentos = planificar(self.posicion.zona, ruta['camino'], self.posicion.columna_destino)
+        # Con programas la placa encadena bajadas y descarga sin esperar a la Pi
+        if self.programas_en_placa and await self._intentar_programa(segmentos, descarga=True):
+            return
+        for seg in segmentos:
+            await self.ejecutar_segmento(seg)
+
+        await asyncio.sleep(0.5 / self.escala)
+        await self.descargar()
+
+    async def secuencia(self, rutas):
+        """Ejecuta la cola completa y vuelve a S1."""
+        for i, ruta in enumerate(rutas):
+            print(f"Ruta {i + 1}/{len(rutas)}: {ruta['origen']} -> {'->'.join(map(str, ruta['camino']))}")
+            await self.ejecutar_ruta(ruta)
+            await self.guardar_modelo()
+        await self.retornar("S1")
+        await self.guardar_modelo()
+
+
+# --- COLA DE RUTAS EN DISCO ---
+def guardar_cola(rutas, archivo):
+    """Guarda la cola con los comandos y el tiempo estimado de cada ruta (solo informativos)."""
+    datos = []
+    for ruta in rutas:
+        plan = planificar(ruta['origen'], ruta['camino'])
+        datos.append({'origen': ruta['origen'], 'camino': list(ruta['camino']),
+                      'comandos': list(plan.comandos), 'segundos': round(plan.duracion, 2)})
+    with open(archivo, "w") as f:
+        json.dump({"rutas": datos}, f, indent=2)
+
+
+def cargar_cola(archivo):
+    """Lee una cola guardada con guardar_cola. Lanza ValueError si una ruta no es valida.
+
+    Cada paso se revisa con validar_movimiento, como al armar la ruta en la
+    interfaz: un archivo editado a mano no puede hacer subir el carro.
+    """
+    with open(archivo) as f:
+        datos = json.load(f)
+    if not isinstance(datos, dict) or not isinstance(datos.get("rutas", []), list):
+        raise ValueError("El archivo no tiene una cola de rutas")
+    rutas = []
+    for i, ruta in enumerate(datos.get("rutas", [])):
+        try:
+            rutas.append(_ruta_valida(ruta))
+        except KeyError as e:
+            raise ValueError(f"Ruta #{i + 1}: falta o no existe {e}")
+        except TypeError as e:
+            raise ValueError(f"Ruta #{i + 1}: formato invalido ({e})")
+        except ValueError as e:
+            raise ValueError(f"Ruta #{i + 1}: {e}")
+    return rutas
+
+
+def _ruta_valida(ruta):
+    origen, camino = ruta['origen'], list(ruta['camino'])
+    if origen not in ("S1", "S2", "S3"):
+        raise ValueError(f"origen {origen!r} invalido (S1, S2 o S3)")
+    if not camino or camino[-1] != "Destino":
+        raise ValueError("debe terminar en 'Destino'")
+    for desde, hasta in zip([origen] + camino, camino):
+        valido, msg = validar_movimiento(desde, hasta)
+        if not valido:
+            raise ValueError(f"{desde} -> {hasta}: {msg}")
+    return {'origen': origen, 'camino': camino}
@@ -0,0 +1,762 @@
+"""Emulador del STM32 (Nucleo-F446RE) sobre un pseudo-terminal.
+
+Habla el mismo protocolo de lineas que HAL_UART_RxCpltCallback en main.c
+(H/V/L/R/S/C/I + numero) y, despues del comando `B`, las tramas de
+protocolo_binario.py con sus ACK, los programas de programa_placa.py y la
+negociacion de velocidad (U/T). Reproduce lo que hace la placa con el tiempo:
+
+  * TIM2: un medio paso por tick de 2 ms en los tres motores; el while(1)
+    avisa #FIN,H / #FIN,V (despues de la medicion de ultrasonidos si el fin
+    cae en medio de ella).
+  * TIM4: el PWM del servo cambia en el siguiente periodo de 20 ms y el
+    servo gira a velocidad finita. Si baja de ANGULO_CAIDA con una canica
+    en el carro, la canica cae frente al sensor de entrada.
+  * Ultrasonidos: muestreo cada 100 ms con la espera de 500 ms entre
+    detecciones, y los avisos #IN / #OUT con los tres contadores.
+  * Boton azul: `presionar_boton()` frena todo y avisa #STOP.
+  * Programas: un paso detras del otro como EjecutarPrograma; los
+    movimientos siguen con el #FIN de su eje y un STOP los aborta.
+  * UART: `U<baudios>` cambia de velocidad despues de contestar y vuelve a
+    115200 si no llega `U0` en VENTANA_BAUDIOS. Por encima de `baudios_max`
+    el enlace no anda (lo que sale llega roto y lo que entra se pierde).
+
+Todo se calcula en "tiempo de placa" a partir de los comandos, sin azar, asi
+que una misma secuencia da siempre las mismas tramas en los mismos
+instantes. Con `escala` el tiempo de placa corre N veces mas rapido que el
+real (una secuencia completa en milisegundos); el host tiene que usar la
+misma escala para sus esperas fijas (ver ControladorCanicas).
+
+Con `conectar_loop` el emulador corre dentro de un loop de asyncio, sin hilo
+ni pty, y su tiempo de placa es el del loop: con un reloj.RelojVirtual la
+placa y el host comparten el tiempo simulado.
+
+    python3 emulador_stm32.py                 # imprime el puerto a usar
+    python3 emulador_stm32.py --escala 50 -v  # 50x, mostrando el trafico
+"""
+import argparse
+import asyncio
+import heapq
+import math
+import os
+import select
+import socket
+import sys
+import threading
+import time
+import tty
+
+# TIM2: 84 MHz / Prescaler 84 / Period 2000 -> un medio paso cada 2 ms
+from modelo_tiempos import PERIODO_PASO
+import programa_placa as pp
+import protocolo_binario as pb
+from enlace_serial import TRAMAS_PARADA
+
+# Lo que responde el firmware al comando I (version y capacidades)
+VERSION_PROTOCOLO = 4
+CAPACIDADES = "BIN,BAUD,PRG"
+
+# --- UART (huart2) ---
+BAUDIOS_BASE = 115200
+VELOCIDADES = (115200, 230400, 460800, 921600)
+# Sin U0 dentro de esta ventana la placa vuelve a BAUDIOS_BASE (VENTANA_BAUDIOS_MS)
+VENTANA_BAUDIOS = 1.0
+# Respuestas que el firmware siempre manda en texto, tambien en binario
+_SOLO_TEXTO = ("#BAUD,", "#T,")
+
+# --- SERVO (TIM4: 84 MHz / 84 / 20000 -> 1 us por cuenta, periodo 20 ms) ---
+SERVO_ANGULO_CERRADO = 65
+PERIODO_PWM = 0.020
+SERVO_MIN_PULSE = 500     # us
+SERVO_RANGO_PULSE = 2000  # us para 270 grados
+# Servo de 270 grados: ~0.16 s cada 60 grados
+VELOCIDAD_SERVO = 60 / 0.16
+# Por debajo de este angulo la compuerta deja caer la canica
+ANGULO_CAIDA = 45
+# Desde que la compuerta abre hasta que la canica pasa frente al sensor
+TIEMPO_CAIDA = 0.15
+
+# --- ULTRASONIDOS (while(1) en main.c) ---
+INTERVALO_MUESTREO_MS = 100
+ESPERA_DETECCION_MS = 500
+# Cada medicion: HAL_Delay(2) + pulso de 10 us + eco de ida y vuelta a 20 cm
+MEDICION_SENSOR = 0.002 + 0.00001 + 2 * 0.20 / 343
+# Tiempo que la canica queda frente a un sensor
+PRESENCIA_SENSOR = 0.15
+
+# Orden de las tramas que caen en el mismo instante (la pasada del while(1)
+# mide y avisa #IN/#OUT antes de volver a EnviarAvisosMovimiento)
+_PRIORIDAD_SENSOR = 0
+_PRIORIDAD_FIN = 1
+
+# --- RECEPCION (HAL_UART_RxCpltCallback) ---
+RX_BUFFER_SIZE = 32
+
+
+class ReceptorUART:
+    """Bytes -> comandos, byte a byte como HAL_UART_RxCpltCallback en main.c.
+
+    A diferencia de protocolo_binario.DecodificadorTramas (el del host), no
+    busca el proximo sync despues de una trama rota: sigue con el byte
+    siguiente como hace el firmware. Los bytes que no son ASCII imprimible
+    no entran en una linea y, en binario, lo que sigue a una trama rota se
+    descarta hasta el proximo '\n' (texto_descartar).
+
+    `agregar` devuelve lineas de texto y tuplas (seq, tipo, valores); valores
+    es None si el tipo o el largo no se conocen (EjecutarTrama devuelve 0).
+    """
+
+    def __init__(self):
+        self.binario = False
+        self.errores = 0
+        self._trama = bytearray()
+        self._linea = bytearray()
+        self._descartar = False
+
+    def reiniciar(self):
+        """Como CambiarBaudios: se pierde lo que estaba a medio llegar."""
+        self._trama.clear()
+        self._linea.clear()
+        self._descartar = False
+
+    def agregar(self, datos):
+        salida = []
+        for byte in datos:
+            if self._trama or byte == pb.SYNC:
+                self._linea.clear()
+                entrada = self._byte_trama(byte)
+                if entrada:
+                    salida.append(entrada)
+            elif byte == 0x0A:
+                linea = self._linea.decode("ascii")
+                self._linea.clear()
+                if self._descartar:
+                    self._descartar = False  # era el resto de una trama rota
+                elif linea:
+                    salida.append(linea)
+            elif len(self._linea) >= RX_BUFFER_SIZE - 1:
+                self._linea.clear()
+            elif 0x20 <= byte <= 0x7E:
+                self._linea.append(byte)
+        return salida
+
+    def _rota(self):
+        self.errores += 1
+        self._trama.clear()
+        self._linea.clear()
+        if self.binario:
+            self._descartar = True
+
+    def _byte_trama(self, byte):
+        trama = self._trama
+        trama.append(byte)
+        if len(trama) == 2 and byte > pb.CARGA_MAXIMA:
+            self._rota()
+            return None
+        if len(trama) < pb.CABECERA or len(trama) < pb.CABECERA + trama[1] + pb.LARGO_CRC:
+            return None
+        largo, seq, tipo = trama[1], trama[2], trama[3]
+        datos = bytes(trama)
+        trama.clear()
+        crc = int.from_bytes(datos[pb.CABECERA + largo:], "little")
+        if pb.crc16(datos[1:pb.CABECERA + largo]) != crc:
+            self._rota()
+            return None
+        carga = datos[pb.CABECERA:pb.CABECERA + largo]
+        if tipo in pb.LARGO_VARIABLE:
+            return seq, tipo, (carga,)
+        formato = pb.FORMATOS.get(tipo)
+        if formato is None or formato.size != largo:
+            return seq, tipo, None
+        return seq, tipo, formato.unpack(carga)
+
+
+class EmuladorSTM32:
+    def __init__(self, periodo_paso=PERIODO_PASO, escala=1.0, baudios_max=921600):
+        self.periodo_paso = periodo_paso
+        self.escala = escala
+        # Velocidad actual de la UART y la maxima que aguanta el enlace
+        self.baudios = BAUDIOS_BASE
+        self.baudios_max = baudios_max
+        self._baudios_pedidos = None
+
+        # Motores: H (horizontal), L y R (verticales). Cada uno guarda los
+        # pasos ordenados y el tick de TIM2 en que se ordenaron.
+        self.motores = {m: {"pasos": 0, "tick": 0} for m in ("H", "L", "R")}
+        # Servo: angulo ordenado y el giro en curso (desde, hasta, t_inicio)
+        self.angulo_servo = SERVO_ANGULO_CERRADO
+        self._giro = (SERVO_ANGULO_CERRADO, SERVO_ANGULO_CERRADO, 0.0)
+        # Cada descarga suelta una canica; se recarga al cerrar la compuerta
+        self.cargado = True
+        self.recargar = True
+
+        self.canicas = [0, 0, 0]  # entradas, salidas, actuales
+        self._presencias = {1: [], 2: []}  # (desde, hasta) frente a cada sensor
+        self._detectada = {1: False, 2: False}
+        # tiempoUltimaDeteccion arranca en 0: nada se cuenta en los primeros 500 ms
+        self._ultima_deteccion = {1: 0, 2: 0}
+        self._ultima_muestra = {1: None, 2: None}
+
+        # Eventos futuros: (t, prioridad, orden, tipo, dato, generacion)
+        self._eventos = []
+        self._orden = 0
+        self._generacion = {"H": 0, "V": 0, "servo": 0, "baudios": 0, "programa": 0, "carga": 0}
+        self._t_revisado = 0.0
+
+        self.puerto = None
+        self.mostrar = False
+        self._t0 = None
+        self._master = None
+        self._slave = None
+        self._despertador = None  # pipe para avisar al hilo de eventos nuevos
+        self._entrada = ReceptorUART()
+        # Protocolo binario: activo despues de `B` (ver la propiedad), seq de los avisos y ultimo comando
+        self._seq_tx = 0
+        self._vistos = pb.VentanaSeq()
+        # Programa en ejecucion: numero, operaciones, paso actual y que espera
+        # ("H", "V", "pausa") para seguir
+        self._programa = None
+        # Recibido y todavia no arrancado (programa_rx en main.c)
+        self._programa_recibido = None
+        self._activo = False
+        self._hilo = None
+        self._lock = threading.Lock()
+        # Modo conectar_loop
+        self._loop = None
+        self._placa = None
+        self._timer = None
+        self._seg_por_byte = 0.0
+        self._rx_libre = 0.0
+
+    # --- CICLO DE VIDA ---
+    def iniciar(self):
+        """Abre el pty y arranca el hilo del emulador. Devuelve el puerto."""
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.puerto = os.ttyname(self._slave)
+        self._despertador = os.pipe()
+        self._t0 = time.monotonic()
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+        return self.puerto
+
+    async def conectar_loop(self, baudios=115200):
+        """Conecta el emulador al loop en curso por un socketpair, sin hilo ni pty.
+
+        Devuelve el extremo del host, que sirve de `ser` para EnlaceSerialAsync.
+        Las respuestas tardan en llegar lo que duran en el cable a `baudios`.
+        """
+        self._loop = asyncio.get_running_loop()
+        host, self._placa = socket.socketpair()
+        self._placa.setblocking(False)
+        self.baudios = baudios
+        self._seg_por_byte = 10 / baudios
+        self._loop.add_reader(self._placa.fileno(), self._al_leer_loop)
+        return host
+
+    def detener(self):
+        if self._loop:
+            if self._timer:
+                self._timer.cancel()
+            if not self._loop.is_closed():
+                self._loop.remove_reader(self._placa.fileno())
+            self._placa.close()
+            self._loop = self._placa = None
+        self._activo = False
+        if self._hilo:
+            self._hilo.join(timeout=1.0)
+        for fd in (self._master, self._slave, *(self._despertador or ())):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = self._despertador = None
+
+    @property
+    def binario(self):
+        """modo_binario en main.c (lo mira tambien la recepcion)."""
+        return self._entrada.binario
+
+    @binario.setter
+    def binario(self, valor):
+        self._entrada.binario = valor
+
+    def ahora(self):
+        """Tiempo de placa en segundos (0 al iniciar, escalado)."""
+        if self._loop:
+            return self._loop.time()
+        if self._t0 is None:
+            return self._t_revisado
+        return (time.monotonic() - self._t0) * self.escala
+
+    # --- MODELO DE MOTORES (TIM2) ---
+    def _tick(self, t):
+        return math.floor(t / self.periodo_paso + 1e-9)
+
+    def pasos_restantes(self, motor, ahora=None):
+        """Pasos que le quedan al motor, como pasos_restantes_* en main.c."""
+        m = self.motores[motor]
+        if m["pasos"] == 0:
+            return 0
+        ahora = self.ahora() if ahora is None else ahora
+        hechos = self._tick(ahora) - m["tick"]
+        if hechos >= abs(m["pasos"]):
+            return 0
+        return m["pasos"] - hechos if m["pasos"] > 0 else m["pasos"] + hechos
+
+    def _fin_motor(self, motor):
+        """Instante del tick de TIM2 que deja al motor en cero."""
+        m = self.motores[motor]
+        return (m["tick"] + abs(m["pasos"])) * self.periodo_paso
+
+    def _ordenar(self, motor, pasos, ahora):
+        self.motores[motor] = {"pasos": pasos, "tick": self._tick(ahora)}
+
+    def _aviso_desde_bucle(self, t):
+        """Cuando el while(1) manda un aviso levantado por un ISR en `t`.
+
+        Si la bandera se levanta mientras se miden los ultrasonidos, el aviso
+        sale al terminar la medicion.
+        """
+        inicio = math.floor(t * 1000 / INTERVALO_MUESTREO_MS + 1e-9) * INTERVALO_MUESTREO_MS / 1000
+        return max(t, inicio + 2 * MEDICION_SENSOR)
+
+    def _agendar(self, t, prioridad, tipo, dato=None, clave=None):
+        generacion = self._generacion[clave] if clave else 0
+        heapq.heappush(self._eventos, (t, prioridad, self._orden, tipo, dato, clave, generacion))
+        self._orden += 1
+
+    def _agendar_fin_h(self, ahora):
+        self._generacion["H"] += 1
+        if self.pasos_restantes("H", ahora) != 0:
+            fin = self._fin_motor("H")
+            self._agendar(self._aviso_desde_bucle(fin), _PRIORIDAD_FIN, "fin", "H", "H")
+
+    def _agendar_fin_v(self, ahora):
+        # #FIN,V cuando el ultimo vertical en movimiento llega a cero
+        self._generacion["V"] += 1
+        fines = [self._fin_motor(m) for m in ("L", "R") if self.pasos_restantes(m, ahora) != 0]
+        if fines:
+            self._agendar(self._aviso_desde_bucle(max(fines)), _PRIORIDAD_FIN, "fin", "V", "V")
+
+    # --- MODELO DEL SERVO (TIM4) ---
+    @property
+    def pulso_servo(self):
+        """CCR1 de TIM4 en microsegundos, como Mover_Servo."""
+        return SERVO_MIN_PULSE + self.angulo_servo * SERVO_RANGO_PULSE // 270
+
+    def angulo_real(self, ahora=None):
+        """Angulo del eje del servo, que gira a VELOCIDAD_SERVO hacia el ordenado."""
+        ahora = self.ahora() if ahora is None else ahora
+        desde, hasta, inicio = self._giro
+        if ahora <= inicio:
+            return desde
+        avance = (ahora - inicio) * VELOCIDAD_SERVO
+        if avance >= abs(hasta - desde):
+            return hasta
+        return desde + avance if hasta > desde else desde - avance
+
+    def _mover_servo(self, valor, ahora):
+        # Mover_Servo recibe un uint16_t: los negativos dan la vuelta
+        angulo = valor & 0xFFFF
+        self.angulo_servo = min(angulo, 270)
+        # El nuevo CCR1 se aplica en el proximo update de TIM4
+        efectivo = math.ceil(ahora / PERIODO_PWM - 1e-9) * PERIODO_PWM
+        desde = self.angulo_real(efectivo)
+        self._giro = (desde, self.angulo_servo, efectivo)
+
+        self._generacion["servo"] += 1
+        if self.angulo_servo >= ANGULO_CAIDA:
+            if self.recargar:
+                self.cargado = True
+        elif self.cargado and desde >= ANGULO_CAIDA:
+            cruce = efectivo + (desde - ANGULO_CAIDA) / VELOCIDAD_SERVO
+            self._agendar(cruce, _PRIORIDAD_SENSOR, "caida", clave="servo")
+
+    # --- ULTRASONIDOS ---
+    def _poner_frente(self, sensor, t):
+        """Una canica queda frente al sensor desde `t` durante PRESENCIA_SENSOR."""
+        self._presencias[sensor].append((t, t + PRESENCIA_SENSOR))
+        primera = math.ceil(t * 1000 / INTERVALO_MUESTREO_MS - 1e-9)
+        ultima = math.floor((t + PRESENCIA_SENSOR) * 1000 / INTERVALO_MUESTREO_MS + 1e-9)
+        for k in range(primera, ultima + 1):
+            desfase = sensor * MEDICION_SENSOR
+            self._agendar(k * INTERVALO_MUESTREO_MS / 1000 + desfase, _PRIORIDAD_SENSOR, "muestra", (sensor, k))
+
+    def retirar_canica(self):
+        """Una canica sale del estanon frente al sensor de salida."""
+        with self._lock:
+            self._poner_frente(2, self.ahora())
+        self._despertar()
+
+    def cargar_canica(self):
+        """El operador pone una canica en el carro."""
+        with self._lock:
+            self.cargado = True
+
+    def _muestrear(self, sensor, k):
+        # Una muestra sin canica entre medio vuelve a habilitar la deteccion
+        if self._ultima_muestra[sensor] != k - 1:
+            self._detectada[sensor] = False
+        self._ultima_muestra[sensor] = k
+        t = k * INTERVALO_MUESTREO_MS / 1000
+        presente = any(desde <= t <= hasta for desde, hasta in self._presencias[sensor])
+        self._presencias[sensor] = [p for p in self._presencias[sensor] if p[1] >= t]
+        if not presente:
+            self._detectada[sensor] = False
+            return []
+
+        ms = k * INTERVALO_MUESTREO_MS
+        if self._detectada[sensor] or ms - self._ultima_deteccion[sensor] <= ESPERA_DETECCION_MS:
+            return []
+        self._detectada[sensor] = True
+        self._ultima_deteccion[sensor] = ms
+        if sensor == 1:
+            self.canicas[0] += 1
+            self.canicas[2] += 1
+            tipo = "IN"
+        else:
+            self.canicas[1] += 1
+            self.canicas[2] = max(0, self.canicas[2] - 1)
+            tipo = "OUT"
+        return [f"#{tipo},{self.canicas[0]},{self.canicas[1]},{self.canicas[2]}"]
+
+    # --- AVANCE DEL TIEMPO ---
+    def avanzar(self, hasta):
+        """Procesa los eventos hasta `hasta` y devuelve las tramas que salen, en orden."""
+        salida = []
+        while self._eventos and self._eventos[0][0] <= hasta:
+            t, _, _, tipo, dato, clave, generacion = heapq.heappop(self._eventos)
+            if clave and generacion != self._generacion[clave]:
+                continue  # lo anulo un comando posterior
+            if tipo == "fin":
+                salida.append(f"#FIN,{dato}")
+                if dato == "H":
+                    self.motores["H"]["pasos"] = 0
+                else:
+                    self.motores["L"]["pasos"] = self.motores["R"]["pasos"] = 0
+            elif tipo == "parada":
+                # EnviarAvisosMovimiento manda el #STOP antes que EjecutarPrograma
+                salida.append("#STOP")
+                salida += self._abortar_programa()
+            elif tipo == "caida":
+                self.cargado = False
+                self._poner_frente(1, t + TIEMPO_CAIDA)
+            elif tipo == "muestra":
+                salida += self._muestrear(*dato)
+            elif tipo == "baudios":
+                self._cambiar_baudios(BAUDIOS_BASE)  # no llego la confirmacion
+            elif tipo == "programa":
+                self._programa["espera"].discard("pausa")
+            elif tipo == "arranque":
+                # El while(1) copia el recibido: reemplaza al que estuviera corriendo
+                self._programa, self._programa_recibido = self._programa_recibido, None
+                self._generacion["programa"] += 1
+                salida += self._seguir_programa(t)
+            if tipo in ("fin", "programa") and self._programa:
+                if tipo == "fin":
+                    self._programa["espera"].discard(dato)
+                salida += self._seguir_programa(t)
+        self._t_revisado = max(self._t_revisado, hasta)
+        return salida
+
+    def proximo_evento(self):
+        """Tiempo de placa del proximo evento agendado (o None)."""
+        # Los anulados por un comando posterior no cuentan (el reloj virtual saltaria hasta ellos)
+        while self._eventos and self._eventos[0][5] and self._eventos[0][6] != self._generacion[self._eventos[0][5]]:
+            heapq.heappop(self._eventos)
+        return self._eventos[0][0] if self._eventos else None
+
+    # --- PARSEO (igual que HAL_UART_RxCpltCallback) ---
+    def procesar_linea(self, linea, ahora=None):
+        """Ejecuta un comando y devuelve las lineas de respuesta inmediatas."""
+        ahora = self.ahora() if ahora is None else ahora
+        linea = linea.replace("\r", "")
+        if not linea:
+            return []
+
+        cmd = linea[0].upper()
+        valor = _atoi(linea[1:])
+
+        if cmd == "H":
+            self._ordenar("H", valor, ahora)
+            self._agendar_fin_h(ahora)
+        elif cmd == "V":
+            self._ordenar("L", valor, ahora)
+            self._ordenar("R", valor, ahora)
+            self._agendar_fin_v(ahora)
+        elif cmd == "L":
+            self._ordenar("L", valor, ahora)
+            self._agendar_fin_v(ahora)
+        elif cmd == "R":
+            self._ordenar("R", valor, ahora)
+            self._agendar_fin_v(ahora)
+        elif cmd == "S":
+            self._mover_servo(valor, ahora)
+        elif cmd == "C":
+            self.canicas = [0, 0, 0]
+            self._detectada = {1: False, 2: False}
+            return ["#RST"]
+        elif cmd == "I":
+            # Una sonda de texto es un host nuevo: se vuelve al protocolo de lineas
+            self.binario = False
+            return [f"#ID,CANICAS,{VERSION_PROTOCOLO},{CAPACIDADES}"]
+        elif cmd == "U":
+            if valor == 0:
+                self._generacion["baudios"] += 1  # confirmada: se apaga el watchdog
+                return ["#BAUD,OK"]
+            if valor in VELOCIDADES:
+                # Cambia despues de mandar la respuesta (ver _codificar)
+                self._baudios_pedidos = valor
+                return [f"#BAUD,{valor}"]
+        elif cmd == "T":
+            return [f"#T,{linea[1:]}"]
+        elif cmd == "B":
+            self.binario = True
+            self._seq_tx = 0
+            self._vistos = pb.VentanaSeq()
+            return [f"#ID,CANICAS,{VERSION_PROTOCOLO},{CAPACIDADES}"]
+        return []
+
+    def procesar_trama(self, seq, tipo, valores, ahora=None):
+        """Ejecuta una trama binaria: ACK primero, despues las respuestas del comando."""
+        estado = self._vistos.registrar(seq)
+        if estado != pb.ACK_OK:
+            return [(pb.ACK, seq, estado)]
+        if valores is None:
+            return [(pb.ACK, seq, pb.ACK_DESCONOCIDO)]  # tipo o largo desconocido
+        if tipo == pb.PROGRAMA:
+            try:
+                numero, operaciones = pp.decodificar(valores[0])
+            except pb.ErrorProtocolo:
+                return [(pb.ACK, seq, pb.ACK_DESCONOCIDO)]
+            # El ISR solo lo copia; arranca en la proxima vuelta del while(1)
+            self._programa_recibido = {"numero": numero, "ops": operaciones, "paso": 0, "espera": set()}
+            self._generacion["carga"] += 1
+            self._agendar(self._aviso_desde_bucle(ahora), _PRIORIDAD_FIN, "arranque", clave="carga")
+            return [(pb.ACK, seq, pb.ACK_OK)]
+        if tipo == pb.PARADA:
+            self._descartar_recibido()
+            respuestas = self._abortar_programa()
+            for cmd in TRAMAS_PARADA:
+                respuestas += self.procesar_linea(cmd, ahora)
+        else:
+            linea = pb.comando_como_linea(tipo, valores)
+            if linea is None:
+                return [(pb.ACK, seq, pb.ACK_DESCONOCIDO)]
+            respuestas = self.procesar_linea(linea, ahora)
+        return [(pb.ACK, seq, pb.ACK_OK)] + respuestas
+
+    # --- PROGRAMAS (EjecutarPrograma en main.c) ---
+    def _seguir_programa(self, ahora):
+        """Ejecuta pasos del programa hasta uno que tenga que esperar; devuelve los avisos."""
+        ahora = self.ahora() if ahora is None else ahora
+        prg = self._programa
+        salida = []
+        while not prg["espera"]:
+            if prg["paso"] >= len(prg["ops"]):
+                salida.append(f"#PRG,{prg['numero']},{prg['paso']},{pp.TERMINADO}")
+                self._programa = None
+                break
+            op, valores = prg["ops"][prg["paso"]]
+            salida.append(f"#PRG,{prg['numero']},{prg['paso']},{pp.PASO}")
+            prg["paso"] += 1
+            if op in (pp.OP_MOVER_H, pp.OP_COMBINADO) and valores[0]:
+                salida += self.procesar_linea(f"H{valores[0]}", ahora)
+                prg["espera"].add("H")
+            vertical = valores[-1] if op in (pp.OP_MOVER_V, pp.OP_COMBINADO) else 0
+            if vertical:
+                salida += self.procesar_linea(f"V{vertical}", ahora)
+                prg["espera"].add("V")
+            if op == pp.OP_SERVO:
+                self._mover_servo(valores[0], ahora)
+            elif op == pp.OP_PAUSA and valores[0]:
+                prg["espera"].add("pausa")
+                self._agendar(ahora + valores[0] / 1000, _PRIORIDAD_FIN, "programa", clave="programa")
+        return salida
+
+    def _descartar_recibido(self):
+        """Un STOP tambien anula el programa recibido que todavia no arranco."""
+        self._programa_recibido = None
+        self._generacion["carga"] += 1
+
+    def _abortar_programa(self):
+        """STOP con un programa corriendo: lo descarta y avisa en que paso quedo."""
+        if self._programa is None:
+            return []
+        prg, self._programa = self._programa, None
+        self._generacion["programa"] += 1
+        return [f"#PRG,{prg['numero']},{max(0, prg['paso'] - 1)},{pp.ABORTADO}"]
+
+    def _procesar_entrada(self, datos, ahora):
+        """Bytes recibidos -> respuestas (lineas o tuplas (tipo, *valores) binarias)."""
+        if self.baudios > self.baudios_max:
+            return self.avanzar(ahora)  # errores de framing: no se arma ningun comando
+        respuestas = []
+        for entrada in self._entrada.agregar(datos):
+            respuestas += self.avanzar(ahora)
+            if self.mostrar:
+                print(f"[{ahora:9.3f}] RX {entrada}")
+            if isinstance(entrada, str):
+                respuestas += self.procesar_linea(entrada, ahora)
+            else:
+                respuestas += self.procesar_trama(*entrada, ahora)
+        return respuestas
+
+    def _codificar(self, respuesta):
+        """Bytes de una respuesta: linea de texto, o trama numerada en binario."""
+        if isinstance(respuesta, tuple):
+            datos = pb.codificar(respuesta[0], self._seq_tx, *respuesta[1:])
+            self._seq_tx = (self._seq_tx + 1) & 0xFF
+        elif self.binario and not respuesta.startswith(_SOLO_TEXTO):
+            datos = pb.codificar_aviso(respuesta, self._seq_tx)
+            self._seq_tx = (self._seq_tx + 1) & 0xFF
+        else:
+            datos = (respuesta + "\n").encode("utf-8")
+        if self.baudios > self.baudios_max:
+            datos = bytes(b ^ 0x5A for b in datos)
+        if self._baudios_pedidos and respuesta == f"#BAUD,{self._baudios_pedidos}":
+            # El #BAUD sale a la velocidad vieja; despues cambia y arranca el watchdog
+            self._cambiar_baudios(self._baudios_pedidos)
+            self._baudios_pedidos = None
+            self._generacion["baudios"] += 1
+            self._agendar(self.ahora() + VENTANA_BAUDIOS, _PRIORIDAD_FIN, "baudios", clave="baudios")
+        return datos
+
+    def _cambiar_baudios(self, baudios):
+        self.baudios = baudios
+        self._entrada.reiniciar()
+        if self._loop:
+            self._seg_por_byte = 10 / baudios
+
+    def presionar_boton(self):
+        """Boton azul (HAL_GPIO_EXTI_Callback): frena, cierra el servo y avisa #STOP."""
+        with self._lock:
+            ahora = self.ahora()
+            for motor in self.motores:
+                self.motores[motor]["pasos"] = 0
+            self._generacion["H"] += 1
+            self._generacion["V"] += 1
+            # El programa queda frenado; el aviso de abortado sale despues del #STOP
+            self._generacion["programa"] += 1
+            self._descartar_recibido()
+            self._mover_servo(SERVO_ANGULO_CERRADO, ahora)
+            self._agendar(self._aviso_desde_bucle(ahora), _PRIORIDAD_FIN, "parada")
+        self._despertar()
+
+    def _despertar(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._al_vencer)
+        elif self._despertador:
+            os.write(self._despertador[1], b"x")
+
+    # --- TRANSPORTE EN EL LOOP ---
+    def _al_leer_loop(self):
+        try:
+            datos = self._placa.recv(4096)
+        except BlockingIOError:
+            return
+        if not datos:
+            self._loop.remove_reader(self._placa.fileno())
+            return
+        with self._lock:
+            self._responder_loop(self._procesar_entrada(datos, self.ahora()))
+
+    def _al_vencer(self):
+        self._timer = None
+        with self._lock:
+            self._responder_loop(self.avanzar(self.ahora()))
+
+    def _responder_loop(self, respuestas):
+        ahora = self.ahora()
+        for respuesta in respuestas:
+            seg_por_byte = self._seg_por_byte  # el #BAUD sale a la velocidad de antes del cambio
+            datos = self._codificar(respuesta)
+            self._rx_libre = max(ahora, self._rx_libre) + len(datos) * seg_por_byte
+            self._loop.call_at(self._rx_libre, self._placa.send, datos)
+        # Despertar para el proximo evento de la placa (fin de motor, sensor...)
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        proximo = self.proximo_evento()
+        if proximo is not None:
+            self._timer = self._loop.call_at(proximo, self._al_vencer)
+
+    def _bucle(self):
+        while self._activo:
+            with self._lock:
+                proximo = self.proximo_evento()
+                ahora = self.ahora()
+            espera = 0.05 if proximo is None else max(0.0, (proximo - ahora) / self.escala)
+            listos, _, _ = select.select([self._master, self._despertador[0]], [], [], min(espera, 0.05))
+            if self._despertador[0] in listos:
+                os.read(self._despertador[0], 64)
+
+            datos = b""
+            if self._master in listos:
+                try:
+                    datos = os.read(self._master, 1024)
+                except OSError:
+                    break
+
+            with self._lock:
+                respuestas = self._procesar_entrada(datos, self.ahora()) if datos else []
+                respuestas += self.avanzar(self.ahora())
+                salida = [self._codificar(r) for r in respuestas]
+
+            for r, datos in zip(respuestas, salida):
+                if self.mostrar:
+                    print(f"[{self.ahora():9.3f}] TX {r}")
+                os.write(self._master, datos)
+
+
+def _atoi(texto):
+    """atoi de C: lee el entero inicial y devuelve 0 si no hay ninguno."""
+    texto = texto.strip()
+    fin = 1 if texto[:1] in ("+", "-") else 0
+    while fin < len(texto) and texto[fin].isdigit():
+        fin += 1
+    try:
+        return int(texto[:fin])
+    except ValueError:
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escala", type=float, default=1.0, help="veces mas rapido que el tiempo real")
+    parser.add_argument("--enlace", metavar="RUTA", help="crear un symlink estable al pty (ej. /tmp/ttyCANICAS)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="mostrar el trafico con tiempo de placa")
+    parser.add_argument("--baudios-max", type=int, default=921600, help="velocidad mas alta que aguanta el enlace")
+    args = parser.parse_args()
+
+    emu = EmuladorSTM32(escala=args.escala, baudios_max=args.baudios_max)
+    emu.mostrar = args.verbose
+    puerto = emu.iniciar()
+    if args.enlace:
+        if os.path.islink(args.enlace):
+            os.unlink(args.enlace)
+        os.symlink(puerto, args.enlace)
+        puerto = args.enlace
+    print(f"Emulador STM32 escuchando en: {puerto} (escala {args.escala:g}x)")
+    print("Usar ese puerto como PORT_NAME. Comandos: 'b' boton azul, 'o' retirar canica, 'q' salir")
+    try:
+        for linea in sys.stdin:
+            orden = linea.strip().lower()
+            if orden == "q":
+                break
+            if orden == "b":
+                emu.presionar_boton()
+            elif orden == "o":
+                emu.retirar_canica()
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emu.detener()
+        if args.enlace and os.path.islink(args.enlace):
+            os.unlink(args.enlace)
+
+
+if __name__ == "__main__":
+    main()
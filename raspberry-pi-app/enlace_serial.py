@@ -0,0 +1,140 @@
+"""Enlace serie con el STM32: lo comun a todos los que hablan con la placa.
+
+Las constantes del protocolo de lineas (parada, sonda, negociacion de
+velocidad), DivisorTramas para cortar las lineas que llegan y el
+descubrimiento de la placa. La lectura y la escritura del puerto las hace
+EnlaceSerialAsync (nucleo_async.py) dentro del loop de asyncio, sin hilos.
+
+buscar_placa() encuentra el puerto de la placa mandando la sonda `I` y
+esperando el #ID: la placa esta lista apenas contesta, sin pausa fija. Si
+no contesta a la velocidad de siempre prueba las `alternativas` (una placa
+que otro host dejo en una velocidad negociada).
+"""
+import glob
+import os
+import time
+
+import serial
+
+# Frenado de emergencia: motores en cero y servo cerrado
+TRAMAS_PARADA = ("H0", "V0", "S65")
+# Comandos que pueden esperar en la cola de EnlaceSerialAsync
+CAPACIDAD_COLA = 64
+# Cuantas latencias (encolado -> cable) se guardan para las estadisticas
+MUESTRAS_LATENCIA = 1000
+
+# --- DESCUBRIMIENTO DE LA PLACA ---
+PATRONES_PUERTO = ("/dev/ttyACM*", "/dev/ttyUSB*")
+SONDA = "I"
+RESPUESTA_ID = "#ID,CANICAS,"
+# Cada cuanto se repite la sonda (la primera puede caer sobre basura en el buffer)
+INTERVALO_SONDA = 0.1
+
+# --- NEGOCIACION DE VELOCIDAD (ver EnlaceSerialAsync.negociar_baudios) ---
+# U<baudios> propone, la placa contesta #BAUD,<baudios> y cambia; U0 confirma
+COMANDO_BAUDIOS = "U"
+RESPUESTA_BAUDIOS = "#BAUD,"
+CONFIRMAR_BAUDIOS = "U0"
+CONFIRMACION_BAUDIOS = "#BAUD,OK"
+# T<patron> vuelve como #T,<patron> (el patron entra en RX_BUFFER_SIZE de main.c)
+COMANDO_PRUEBA = "T"
+RESPUESTA_PRUEBA = "#T,"
+PRUEBAS_BAUDIOS = 4
+# Margen para que la placa termine de reconfigurar la UART
+PAUSA_CAMBIO_BAUDIOS = 0.01
+
+
+def resumen_latencias(latencias):
+    """Percentiles de latencia encolado -> cable en ms, por carril."""
+    resumen = {}
+    for carril, muestras in latencias.items():
+        ms = sorted(x * 1000 for x in list(muestras))
+        if ms:
+            resumen[carril] = {
+                "n": len(ms),
+                "p50": ms[len(ms) // 2],
+                "p95": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+                "max": ms[-1],
+            }
+    return resumen
+
+
+class DivisorTramas:
+    """Junta los bytes que van llegando y devuelve las lineas completas."""
+
+    def __init__(self):
+        self._resto = b""
+
+    def agregar(self, datos):
+        *lineas, self._resto = (self._resto + datos).split(b"\n")
+        tramas = []
+        for linea in lineas:
+            texto = linea.decode("utf-8", errors="ignore").strip()
+            if texto:
+                tramas.append(texto)
+        return tramas
+
+
+def puertos_candidatos(preferido=None):
+    """Puertos a sondear: el preferido primero y despues los ACM/USB que existan."""
+    puertos = [preferido] if preferido else []
+    for patron in PATRONES_PUERTO:
+        for puerto in sorted(glob.glob(patron)):
+            if puerto not in puertos:
+                puertos.append(puerto)
+    return puertos
+
+
+def sondear_puerto(puerto, baudios, timeout, alternativas=()):
+    """Abre `puerto` y manda la sonda hasta que la placa conteste.
+
+    Si no contesta a `baudios` prueba cada velocidad de `alternativas`
+    (con una sola vuelta de sonda). Devuelve (ser, version) con el puerto
+    abierto a la velocidad que contesto, o None.
+    """
+    try:
+        ser = serial.Serial(puerto, baudios, timeout=INTERVALO_SONDA)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        for velocidad, tope in ((baudios, timeout), *((b, 2 * INTERVALO_SONDA) for b in alternativas)):
+            ser.baudrate = velocidad
+            version = _sondear(ser, tope)
+            if version is not None:
+                return ser, version
+    except (OSError, ValueError):
+        pass
+    ser.close()
+    return None
+
+
+def _sondear(ser, timeout):
+    divisor = DivisorTramas()
+    limite = time.monotonic() + timeout
+    ser.reset_input_buffer()
+    while time.monotonic() < limite:
+        ser.write(f"{SONDA}\n".encode("utf-8"))
+        fin_intento = min(limite, time.monotonic() + INTERVALO_SONDA)
+        while time.monotonic() < fin_intento:
+            datos = ser.read(max(1, ser.in_waiting))
+            for linea in divisor.agregar(datos):
+                if linea.startswith(RESPUESTA_ID):
+                    return linea[len(RESPUESTA_ID):]
+    return None
+
+
+def buscar_placa(preferido, baudios, timeout=1.0, buscar=True, alternativas=()):
+    """Encuentra la placa. Devuelve (ser, puerto, version) o None.
+
+    Con `buscar` en False solo se prueba el puerto preferido.
+    """
+    candidatos = puertos_candidatos(preferido) if buscar else [preferido]
+    for puerto in candidatos:
+        if not os.path.exists(puerto) and puerto.startswith("/dev/"):
+            continue
+        encontrado = sondear_puerto(puerto, baudios, timeout, alternativas)
+        if encontrado:
+            ser, version = encontrado
+            return ser, puerto, version
+    return None
@@ -1,27 +1,14 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import serial
-import time
-import threading
-
-# --- CONFIGURACION SERIAL ---
-# Ajustar puerto segun corresponda (/dev/ttyACM0 en Pi, COMx en Windows)
-PORT_NAME = '/dev/ttyACM0' 
-BAUD_RATE = 115200
-
-# --- CONFIGURACION FISICA ---
-STEPS_H = 1520
-STEPS_V = 1328
-
-# Ajuste fino (1/8 de celda)
-CALIB_FINE_H = int(STEPS_H / 8)
-CALIB_FINE_V = int(STEPS_V / 8)
-
-# --- TIEMPOS DE ESPERA (Segundos) ---
-# Ajustados para motor lento (periodo 2000 en STM32)
-TIME_MOVE_H = 3.0  
-TIME_MOVE_V = 3.0
-TIME_SERVO  = 2.0
+from tkinter import ttk, messagebox, filedialog
+import asyncio
+
+from puente_tk import PuenteTk
+from controlador_canicas import ControladorCanicas, ProgramaAbortado, cargar_cola, guardar_cola
+from config_canicas import STEPS_H, STEPS_V, CALIB_FINE_H, CALIB_FINE_V, UNA_RUTA_POR_ORIGEN, MAX_RUTAS_COLA
+from compilador_movimientos import MAPA_COORDS, validar_movimiento
+from planificador_rutas import duracion_secuencia, optimizar_orden, planificar_ruta
+from vista_cola import VistaCola
+from rejilla_canvas import RejillaCanvas
 
 class MarbleInterfaceFinal:
     def __init__(self, root):
@@ -30,227 +17,105 @@ class MarbleInterfaceFinal:
         self.root.geometry("1024x600")
         self.root.configure(bg="#1e293b") 
 
-        # --- ESTADO DEL SISTEMA ---
-        self.ser = None
-        self.connect_serial()
-
-        # Hilo de escucha serial (eventos de canicas)
-        self.thread_serial = None
-        
-        self.posicion_actual = "S1"
-        self.columna_virtual_destino = 1 
+        # --- MOTOR (controlador_canicas, sin tkinter) ---
+        # La GUI solo le pide trabajos y muestra lo que avisa. Los avisos
+        # llegan desde el loop del controlador y pasan a Tk por el puente.
+        self.puente = PuenteTk(self.root)
+        self.control = ControladorCanicas(confirmar_carga=self.confirmar_carga)
+        # Posicion y contador muestran el ultimo estado: en una rafaga basta un aviso por cuadro
+        self.control.posicion.al_cambiar = lambda zona: self.puente.llamar_ultimo(self.actualizar_grid_visual)
+        self.control.posicion.al_trayecto = lambda: self.puente.llamar_ultimo(self.animar_carro)
+        self.control.contadores.al_cambiar = lambda c: self.puente.llamar_ultimo(self.actualizar_contador)
+        self.control.al_parada_placa = lambda: self.puente.llamar(self._parada_desde_placa)
+        self.control.iniciar()
         
         # LISTA DE RUTAS (Cola de prioridad)
         # Formato: [{'origen': 'S1', 'camino': [1, 4, 'Destino']}, ...]
         self.rutas_programadas = [] 
         
-        self.contador_canicas = 0 
-        
         # Banderas de Control
-        self.stop_emergencia = False
         self.ocupado = False 
+        self.rejilla = None
         
-        # Mapa Logico de Coordenadas (Fila, Columna)
-        self.mapa_coords = {
-            "S1": (0,0), "S2": (0,1), "S3": (0,2),
-            1: (1,0), 2: (1,1), 3: (1,2),
-            4: (2,0), 5: (2,1), 6: (2,2),
-            7: (3,0), 8: (3,1), 9: (3,2),
-            "Destino": (4,1) # Virtual, puede ser (4,0), (4,1) o (4,2)
-        }
-
         self.setup_ui()
 
-        # Iniciar listener solo si hay puerto serie real
-        if self.ser and self.ser.is_open:
-            self.thread_serial = threading.Thread(
-                target=self._serial_listener,
-                daemon=True
-            )
-            self.thread_serial.start()
+    # --- ESTADO (vive en el controlador) ---
+    @property
+    def posicion_actual(self): return self.control.posicion.zona
+    @posicion_actual.setter
+    def posicion_actual(self, zona): self.control.posicion.zona = zona
 
-    def connect_serial(self):
-        try:
-            self.ser = serial.Serial(PORT_NAME, BAUD_RATE, timeout=0.1)
-            time.sleep(2) 
-            print("CONEXION SERIAL OK")
-        except Exception:
-            print("MODO SIMULACION (Sin Serial)")
+    @property
+    def columna_virtual_destino(self): return self.control.posicion.columna_destino
+    @columna_virtual_destino.setter
+    def columna_virtual_destino(self, col): self.control.posicion.columna_destino = col
 
-    
-    def _serial_listener(self):
-        """Hilo que corre en segundo plano escuchando mensajes del STM32."""
-        while True:
-            # Este loop es infinito mientras viva el programa
-            if self.ser and self.ser.is_open:
-                try:
-                    # Si hay datos esperando...
-                    if self.ser.in_waiting > 0:
-                        line = self.ser.readline().decode('utf-8', errors='ignore').strip()
-                        
-                        # Si es un mensaje de evento (#IN, #OUT, etc.)
-                        if line.startswith('#'):
-                            # IMPORTANTE: No actualizar GUI desde este hilo.
-                            # Usamos root.after para agendar la actualización en el hilo principal.
-                            self.root.after(0, lambda: self._procesar_datos_serial(line))
-                            
-                except Exception as e:
-                    print(f"Error en listener serial: {e}")
-            
-            # Pequeña pausa para no saturar el CPU
-            time.sleep(0.05)
+    @property
+    def stop_emergencia(self): return self.control.detenido
+    @stop_emergencia.setter
+    def stop_emergencia(self, valor): self.control.detenido = valor
 
-    def _procesar_datos_serial(self, line):
-        """Recibe la línea cruda (#TIPO,ent,sal,act), parsea y actualiza la UI."""
-        try:
-            # Formato esperado: #IN,5,2,3  (Tipo, Entradas, Salidas, Actuales)
-            parts = line.split(',')
-            if len(parts) >= 4:
-                # tipo = parts[0]
-                entradas = int(parts[1])
-                salidas = int(parts[2])
-                actuales = int(parts[3])
-
-                # Actualizar variables internas
-                self.contador_canicas = actuales
-                self.canicas_entrada_stm32 = entradas
-                self.canicas_salida_stm32 = salidas
-
-                # Actualizar etiqueta en pantalla (si existe)
-                if hasattr(self, 'lbl_canicas'):
-                    self.lbl_canicas.config(text=f"Canicas en Estañón: {self.contador_canicas}")
-                    
-                print(f"Evento STM32 procesado: {line}")
-                
-        except ValueError:
-            print(f"Error parseando trama: {line}")
+    @property
+    def contador_canicas(self): return self.control.contadores.canicas
 
-    def enviar_comando(self, cmd):
-        # SEGURIDAD: Si hay STOP, bloquear todo menos el frenado
-        if self.stop_emergencia and cmd not in ["H0", "V0", "S65"]:
-            print(f"CMD BLOQUEADO POR STOP: {cmd}")
-            return
+    def actualizar_contador(self):
+        if hasattr(self, 'lbl_canicas'):
+            self.lbl_canicas.config(text=f"Canicas: {self.contador_canicas}")
+            if self.control.registro: self.control.registro.anotar("UI", "contador")
 
-        try:
-            if self.ser and self.ser.is_open:
-                msg = f"{cmd}\n"
-                self.ser.write(msg.encode('utf-8'))
-                print(f"TX: {msg.strip()}")
-            else:
-                print(f"SIM: {cmd}")
-        except Exception as e:
-            print(f"Error Serial: {e}")
+    def enviar_comando(self, cmd):
+        self.control.enviar_comando(cmd)
 
     # --- LOGICA STOP EMERGENCIA ---
     def activar_stop(self):
-        self.stop_emergencia = True
         self.ocupado = False # Liberar ocupado para permitir reset manual posterior
-        print("!!! STOP ACTIVADO !!!")
-        
-        # Enviar frenado inmediato
-        self.enviar_comando("H0")
-        self.enviar_comando("V0") 
-        self.enviar_comando("S65") 
-        
+        self.control.parar()
         messagebox.showwarning("STOP", "PARADA DE EMERGENCIA ACTIVADA.\nMotores detenidos y secuencia cancelada.")
 
-    # --- LOGICA DE MOVIMIENTO ---
-    def calcular_comando(self, origen, destino):
-        r1, c1 = self.mapa_coords[origen]
-        
-        if origen == "Destino":
-            r1 = 4
-            c1 = self.columna_virtual_destino
-        
-        if destino == "Destino":
-            r2 = 4
-            if origen in [7, 8, 9]:
-                _, c_temp = self.mapa_coords[origen]
-                c2 = c_temp
-            else:
-                c2 = 1 
-        else:
-            r2, c2 = self.mapa_coords[destino]
+    def _parada_desde_placa(self):
+        """El STM32 ya freno por su boton y el controlador cancelo la secuencia."""
+        self.ocupado = False
+        messagebox.showwarning("STOP", "PARADA DE EMERGENCIA DESDE LA PLACA.\nSecuencia cancelada.")
 
-        diff_r = r2 - r1
-        diff_c = c2 - c1
-        
-        if diff_r == 1 and diff_c == 0: return f"V-{STEPS_V}"
-        if diff_r == -1 and diff_c == 0: return f"V{STEPS_V}"
-        if diff_c == 1 and diff_r == 0: return f"H{STEPS_H}"
-        if diff_c == -1 and diff_r == 0: return f"H-{STEPS_H}"
-        
-        if diff_c == 0 and diff_r > 1:
-            pasos_total = diff_r * STEPS_V
-            return f"V-{pasos_total}" 
+    async def confirmar_carga(self, origen):
+        """Corre en el loop: muestra el aviso en Tk y espera a que el operador lo cierre."""
+        cerrado = asyncio.get_running_loop().create_future()
 
-        return None 
+        def mostrar():
+            if not self.stop_emergencia: messagebox.showinfo("Carga", f"Coloque canica en {origen}")
+            self.control.nucleo.llamar(lambda: cerrado.done() or cerrado.set_result(None))
 
-    def validar_movimiento(self, origen, destino):
-        if destino == "Destino":
-            if origen in [7, 8, 9]: return True, "OK"
-            return False, "A Destino solo se baja desde 7, 8 o 9"
+        self.puente.llamar(mostrar)
+        await cerrado
 
-        r1, c1 = self.mapa_coords[origen]
-        r2, c2 = self.mapa_coords[destino]
-        
-        if abs(r1-r2) + abs(c1-c2) != 1:
-            return False, "Movimiento no adyacente"
-        
-        if r2 < r1:
-            return False, "No se puede subir en ruta"
-            
-        return True, "OK"
-
-    # --- THREADING GENERAL ---
-    def ejecutar_movimiento_thread(self, destino, callback=None):
-        if self.stop_emergencia: return
+    # --- EJECUCION DE TRABAJOS ---
+    def lanzar_trabajo(self, trabajo, *args, al_terminar=None):
+        """Encola la corrutina `trabajo(*args)` y bloquea los controles hasta que termine."""
+        if self.stop_emergencia: return None
         if self.ocupado: 
             print("SISTEMA OCUPADO")
-            return
+            return None
 
         self.ocupado = True
         self.deshabilitar_controles()
-        threading.Thread(target=self._proceso_mover, args=(destino, callback)).start()
-
-    def _proceso_mover(self, destino, callback):
-        if self.stop_emergencia: 
-            self.liberar_sistema()
-            return
-        
-        cmd = self.calcular_comando(self.posicion_actual, destino)
-        if cmd:
-            self.enviar_comando(cmd)
-            
-            # Determinar tiempo de espera
-            wait_time = TIME_MOVE_V if "V" in cmd else TIME_MOVE_H
-            # Si baja varios pisos de golpe (reset), dar mas tiempo
-            if "V-" in cmd and int(cmd.split('-')[1]) > STEPS_V: 
-                 wait_time = wait_time * 2.5 
-
-            if destino == "Destino":
-                _, c_origen = self.mapa_coords[self.posicion_actual]
-                self.columna_virtual_destino = c_origen
-            
-            self.posicion_actual = destino
-            self.root.after(0, self.actualizar_grid_visual)
-            
-            # Espera activa chequeando STOP
-            steps_wait = int(wait_time * 10)
-            for _ in range(steps_wait): 
-                if self.stop_emergencia: 
-                    self.liberar_sistema()
-                    return
-                time.sleep(0.1)
-            
-            if callback and not self.stop_emergencia:
-                self.root.after(0, callback)
-            else:
-                self.liberar_sistema()
+        futuro = self.control.ejecutar(trabajo, *args)
+        futuro.add_done_callback(lambda f: self.puente.llamar(self._trabajo_terminado, f, al_terminar))
+        return futuro
+
+    def _trabajo_terminado(self, futuro, al_terminar=None):
+        if futuro.cancelled() or isinstance(futuro.exception(), ProgramaAbortado):
+            pass  # STOP: de la parada ya se encarga _parada_desde_placa
+        elif futuro.exception():
+            error = futuro.exception()
+            print(f"Error en movimiento: {error!r}")
+            messagebox.showerror("Error", f"Movimiento interrumpido: {error}")
+        elif al_terminar:
+            al_terminar()
+        self.liberar_sistema()
 
     def liberar_sistema(self):
         self.ocupado = False
-        self.root.after(0, self.habilitar_controles)
+        self.habilitar_controles()
 
     def deshabilitar_controles(self):
         # Deshabilita botones del panel izquierdo para evitar clicks dobles
@@ -285,8 +150,9 @@ class MarbleInterfaceFinal:
         self.mostrar_menu_principal()
 
     def mostrar_menu_principal(self):
-        self.stop_emergencia = False 
+        self.control.rearmar()
         self.ocupado = False
+        self.rejilla = None
         for w in self.main_frame.winfo_children(): w.destroy()
         
         tk.Label(self.main_frame, text="MENU PRINCIPAL", font=("Arial", 18), 
@@ -299,7 +165,7 @@ class MarbleInterfaceFinal:
         tk.Button(self.main_frame, text="3. CALIBRACION Y NIVELACION", command=self.iniciar_modo_calibracion, **btn_opts).pack(pady=10)
 
     def construir_pantalla_base(self, titulo, mostrar_grid=True):
-        self.stop_emergencia = False 
+        self.control.rearmar()
         self.ocupado = False
         
         for w in self.main_frame.winfo_children(): w.destroy()
@@ -312,6 +178,7 @@ class MarbleInterfaceFinal:
         self.panel_izq = tk.Frame(self.main_frame, bg="#1e293b", width=550)
         self.panel_izq.pack(side="left", fill="y", padx=10)
         
+        self.rejilla = None
         if mostrar_grid:
             self.panel_der = tk.Frame(self.main_frame, bg="#0f172a")
             self.panel_der.pack(side="right", fill="both", expand=True, padx=10)
@@ -401,12 +268,12 @@ class MarbleInterfaceFinal:
         frame_ir = tk.Frame(self.panel_izq, bg="#1e293b")
         frame_ir.pack()
         for z in ["S1", "S2", "S3"]:
-            tk.Button(frame_ir, text=z, command=lambda dest=z: self.iniciar_retorno_thread(dest),
+            tk.Button(frame_ir, text=z, command=lambda dest=z: self.lanzar_trabajo(self.control.retornar, dest),
                       bg="#0ea5e9", fg="white", width=5).pack(side="left", padx=2)
 
     def accion_manual_click(self, direccion):
         if self.stop_emergencia or self.ocupado: return
-        r, c = self.mapa_coords[self.posicion_actual]
+        r, c = MAPA_COORDS[self.posicion_actual]
         if self.posicion_actual == "Destino":
             r = 4
             c = self.columna_virtual_destino
@@ -424,48 +291,21 @@ class MarbleInterfaceFinal:
         target_coords = targets.get(direccion)
         
         destino = None
-        for k, v in self.mapa_coords.items():
+        for k, v in MAPA_COORDS.items():
             if v == target_coords: destino = k; break
         
         if direccion == "down" and self.posicion_actual in [7, 8, 9]: destino = "Destino"
 
         if destino:
-            valido, msg = self.validar_movimiento(self.posicion_actual, destino)
+            valido, msg = validar_movimiento(self.posicion_actual, destino)
             if valido:
-                self.ejecutar_movimiento_thread(destino, callback=self.check_fin_recorrido_manual)
+                self.lanzar_trabajo(self.control.mover, destino)
             else:
                 # Este else maneja movimientos no adyacentes o subir en ruta
                 messagebox.showwarning("Movimiento Invalido", msg)
         else:
             messagebox.showwarning("Error", "No existe zona en esa direccion")
 
-    def check_fin_recorrido_manual(self):
-        if self.posicion_actual == "Destino" and not self.stop_emergencia:
-            self.rutina_volcado_y_retorno()
-        else:
-            self.liberar_sistema()
-
-    def rutina_volcado_y_retorno(self):
-        if self.stop_emergencia: 
-            self.liberar_sistema()
-            return
-        
-        print("Descargando...")
-        self.enviar_comando("S25")
-        time.sleep(TIME_SERVO)
-        self.enviar_comando("S65")
-        time.sleep(1.0)             
-
-        if not self.stop_emergencia:
-            self.contador_canicas += 1
-            self.lbl_canicas.config(text=f"Canicas: {self.contador_canicas}")
-            # Volver por defecto a S1 tras descargar en modo manual
-            # Truco: liberar ocupado solo un instante para que el thread de retorno pueda tomarlo
-            self.ocupado = False 
-            self.iniciar_retorno_thread("S1")
-        else:
-            self.liberar_sistema()
-
     # --- MODO 2: PROGRAMADO ---
     def iniciar_modo_programado(self):
         self.ruta_temp = []
@@ -475,11 +315,20 @@ class MarbleInterfaceFinal:
         self.frame_lista_rutas = tk.Frame(self.panel_der, bg="#1e293b")
         self.frame_lista_rutas.pack(side="right", fill="both", expand=True, padx=5)
         
-        tk.Label(self.frame_lista_rutas, text="COLA DE EJECUCIÓN", 
-                 bg="#1e293b", fg="#fbbf24", font=("Arial",10,"bold")).pack(pady=5)
+        self.lbl_cola = tk.Label(self.frame_lista_rutas, text="COLA DE EJECUCIÓN",
+                                 bg="#1e293b", fg="#fbbf24", font=("Arial",10,"bold"))
+        self.lbl_cola.pack(pady=5)
         
-        self.container_rutas = tk.Frame(self.frame_lista_rutas, bg="#334155")
-        self.container_rutas.pack(fill="both", expand=True)
+        tk.Button(self.frame_lista_rutas, text="OPTIMIZAR ORDEN", command=self.optimizar_cola,
+                  bg="#0ea5e9", fg="white").pack(side="bottom", fill="x", pady=5)
+        f_cola = tk.Frame(self.frame_lista_rutas, bg="#1e293b"); f_cola.pack(side="bottom", fill="x")
+        tk.Button(f_cola, text="GUARDAR COLA", command=self.guardar_cola_archivo,
+                  bg="#475569", fg="white").pack(side="left", fill="x", expand=True, padx=(0,2))
+        tk.Button(f_cola, text="CARGAR COLA", command=self.cargar_cola_archivo,
+                  bg="#475569", fg="white").pack(side="right", fill="x", expand=True, padx=(2,0))
+        
+        self.vista_cola = VistaCola(self.frame_lista_rutas, self.mover_prioridad, self.borrar_ruta)
+        self.vista_cola.pack(fill="both", expand=True)
 
         self.crear_ui_programacion()
         self.refrescar_lista_rutas()
@@ -501,6 +350,12 @@ class MarbleInterfaceFinal:
         self.lbl_ruta = tk.Label(self.panel_izq, text="...", bg="#334155", fg="white", wraplength=300, height=2)
         self.lbl_ruta.pack(fill="x", padx=10)
         
+        # Con la planificacion automatica, un click en una zona lejana completa
+        # el camino legal mas rapido hasta ella
+        self.var_auto_ruta = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.panel_izq, text="Planificación automática", variable=self.var_auto_ruta,
+                       bg="#1e293b", fg="white", selectcolor="#0f172a").pack(pady=(5,0))
+        
         f_n = tk.Frame(self.panel_izq, bg="#1e293b"); f_n.pack(pady=10)
         for i in range(1, 10):
             tk.Button(f_n, text=str(i), width=5, height=2, bg="#475569", fg="white",
@@ -513,7 +368,7 @@ class MarbleInterfaceFinal:
         tk.Button(f_act, text="BORRAR ÚLTIMO", command=self.undo_paso, bg="#64748b", fg="white").pack(side="left", fill="x", expand=True, padx=2)
         tk.Button(f_act, text="AGREGAR A COLA", command=self.guardar_ruta, bg="#0ea5e9", fg="white").pack(side="right", fill="x", expand=True, padx=2)
         
-        tk.Button(self.panel_izq, text="▶ INICIAR SECUENCIA", command=self.iniciar_secuencia_thread, 
+        tk.Button(self.panel_izq, text="▶ INICIAR SECUENCIA", command=self.iniciar_secuencia, 
                   bg="#d946ef", fg="white", font=("Arial", 12, "bold")).pack(fill="x", padx=20, pady=20)
 
     # --- GESTION DE LISTA DE RUTAS ---
@@ -529,30 +384,31 @@ class MarbleInterfaceFinal:
         
         origen_nuevo = nueva_ruta['origen']
         
-        # --- Lógica de Sobreescritura / Límite de 3 Rutas ---
+        # --- Lógica de Sobreescritura / Límite de Rutas ---
         indice_existente = -1
-        for i, ruta in enumerate(self.rutas_programadas):
-            if ruta['origen'] == origen_nuevo:
-                indice_existente = i
-                break
+        if UNA_RUTA_POR_ORIGEN:
+            for i, ruta in enumerate(self.rutas_programadas):
+                if ruta['origen'] == origen_nuevo:
+                    indice_existente = i
+                    break
         
         if indice_existente != -1:
             # Sobreescribir
             self.rutas_programadas[indice_existente] = nueva_ruta
             messagebox.showinfo("Ruta Actualizada", f"Ruta {origen_nuevo} sobreescrita con éxito.")
         else:
-            # Verificar si ya existen 3 rutas distintas (S1, S2, S3)
-            origenes_actuales = set(ruta['origen'] for ruta in self.rutas_programadas)
-            if len(origenes_actuales) >= 3 and origen_nuevo not in origenes_actuales:
-                messagebox.showerror("Límite de Rutas", "Solo se permiten 3 rutas, una por origen (S1, S2, S3).")
+            if len(self.rutas_programadas) >= MAX_RUTAS_COLA:
+                messagebox.showerror("Límite de Rutas", f"La cola admite hasta {MAX_RUTAS_COLA} rutas.")
                 return
             
             # Agregar
             self.rutas_programadas.append(nueva_ruta)
+            indice_existente = len(self.rutas_programadas) - 1
             messagebox.showinfo("Ruta Guardada", f"Ruta {origen_nuevo} agregada a la cola.")
         # -------------------------------------------------------
         
         self.refrescar_lista_rutas()
+        self.vista_cola.ver(indice_existente)
         self.reset_ruta_builder()
 
     def borrar_ruta(self, index):
@@ -566,56 +422,55 @@ class MarbleInterfaceFinal:
         if 0 <= new_index < len(self.rutas_programadas):
             self.rutas_programadas[index], self.rutas_programadas[new_index] = self.rutas_programadas[new_index], self.rutas_programadas[index]
             self.refrescar_lista_rutas()
+            self.vista_cola.ver(new_index)
 
-    def refrescar_lista_rutas(self):
-        # Limpiar lista visual
-        for w in self.container_rutas.winfo_children(): w.destroy()
-        
-        if not self.rutas_programadas:
-            tk.Label(self.container_rutas, text="Cola vacía", bg="#334155", fg="#94a3b8").pack(pady=10)
-            return
+    def optimizar_cola(self):
+        """Reordena la cola para minimizar traslados y retornos."""
+        if len(self.rutas_programadas) < 2: return
+        nuevas, ahorro = optimizar_orden(self.rutas_programadas, self.posicion_actual, self.columna_virtual_destino)
+        self.rutas_programadas = nuevas
+        self.refrescar_lista_rutas()
+        messagebox.showinfo("Orden Optimizado", f"Ahorro estimado frente al orden actual: {ahorro:.1f} s")
 
-        for idx, ruta in enumerate(self.rutas_programadas):
-            frame_row = tk.Frame(self.container_rutas, bg="#334155", pady=2)
-            frame_row.pack(fill="x", pady=1)
-            
-            # --- POSICIÓN Y BOTONES DE PRIORIDAD ---
-            
-            # 1. Flechas (Izquierda)
-            f_prio = tk.Frame(frame_row, bg="#334155"); f_prio.pack(side="left")
-            
-            if idx > 0:
-                tk.Button(f_prio, text="▲", font=("Arial", 6), height=1, bg="#475569", fg="white",
-                          command=lambda i=idx: self.mover_prioridad(i, -1)).pack(side="top", padx=1)
-            else:
-                tk.Label(f_prio, text=" ", font=("Arial", 6), height=1, bg="#334155").pack(side="top")
+    def guardar_cola_archivo(self):
+        """Guarda la cola en JSON para correrla despues (tambien con canicas_cli.py)."""
+        if not self.rutas_programadas: messagebox.showwarning("Vacio", "No hay rutas"); return
+        archivo = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Cola de rutas", "*.json")])
+        if not archivo: return
+        try:
+            guardar_cola(self.rutas_programadas, archivo)
+        except OSError as e:
+            messagebox.showerror("Error", f"No se pudo guardar: {e}")
 
-            if idx < len(self.rutas_programadas) - 1:
-                tk.Button(f_prio, text="▼", font=("Arial", 6), height=1, bg="#475569", fg="white",
-                          command=lambda i=idx: self.mover_prioridad(i, 1)).pack(side="bottom", padx=1)
-            else:
-                 tk.Label(f_prio, text=" ", font=("Arial", 6), height=1, bg="#334155").pack(side="bottom")
-            
-            # 2. Info de la Ruta (Centro)
-            origen = ruta['origen']
-            # Se genera una vista simple de los primeros 4 pasos
-            camino_str = "->".join(map(str, ruta['camino'][:4]))
-            if len(ruta['camino']) > 4:
-                camino_str += "..." 
-
-            txt = f"[{origen}] # {idx+1}: {camino_str}"
-            tk.Label(frame_row, text=txt, bg="#334155", fg="white", anchor="w", font=("Arial", 9)).pack(side="left", fill="x", expand=True, padx=5)
-            
-            # 3. Botón Borrar (Derecha)
-            tk.Button(frame_row, text="X", bg="#ef4444", fg="white", width=3,
-                      command=lambda i=idx: self.borrar_ruta(i)).pack(side="right", padx=2)
+    def cargar_cola_archivo(self):
+        archivo = filedialog.askopenfilename(filetypes=[("Cola de rutas", "*.json")])
+        if not archivo: return
+        try:
+            self.rutas_programadas = cargar_cola(archivo)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("Error", f"No se pudo cargar: {e}")
+            return
+        self.refrescar_lista_rutas()
+
+    def refrescar_lista_rutas(self):
+        # La vista reutiliza sus filas: solo cambia las que muestran otra cosa
+        self.vista_cola.mostrar(self.rutas_programadas)
+        texto = "COLA DE EJECUCIÓN"
+        if self.rutas_programadas:
+            eta = duracion_secuencia(self.rutas_programadas, self.posicion_actual, self.columna_virtual_destino)
+            texto += f" (~{eta / 60:.1f} min)"
+        self.lbl_cola.config(text=texto)
 
     # --- HELPERS DE CONSTRUCCION DE RUTA ---
     def reset_ruta_builder(self):
         self.ruta_temp = [self.var_inicio.get()]; self.actualizar_lbl_ruta()
     def agregar_paso(self, zona):
         if not hasattr(self, 'ruta_temp') or not self.ruta_temp: self.reset_ruta_builder()
-        valido, msg = self.validar_movimiento(self.ruta_temp[-1], zona)
+        valido, msg = validar_movimiento(self.ruta_temp[-1], zona)
+        if not valido and self.var_auto_ruta.get():
+            camino = planificar_ruta(self.ruta_temp[-1], zona)
+            if camino: self.ruta_temp.extend(camino); self.actualizar_lbl_ruta(); return
+            msg = "No hay camino legal hasta esa zona"
         if valido: self.ruta_temp.append(zona); self.actualizar_lbl_ruta()
         else: messagebox.showwarning("Invalido", msg)
     def undo_paso(self):
@@ -623,162 +478,33 @@ class MarbleInterfaceFinal:
     def actualizar_lbl_ruta(self): self.lbl_ruta.config(text="->".join(map(str, self.ruta_temp)))
 
     # --- EJECUCION DE SECUENCIA ---
-    def iniciar_secuencia_thread(self):
+    def iniciar_secuencia(self):
         if not self.rutas_programadas: messagebox.showwarning("Vacio", "No hay rutas"); return
-        if self.ocupado: return
-        self.ocupado = True
-        self.deshabilitar_controles()
-        self.stop_emergencia = False
-        threading.Thread(target=self._proceso_secuencia).start()
-
-    def _proceso_secuencia(self):
-        for ruta in self.rutas_programadas:
-            if self.stop_emergencia: break
-            
-            inicio = ruta['origen']
-            camino = ruta['camino']
-            
-            # 1. IR INICIO
-            self._logica_retorno_interna(inicio)
-            
-            if self.stop_emergencia: break
-            evt = threading.Event()
-            self.root.after(0, lambda: self._show_info_wait("Carga", f"Coloque canica en {inicio}", evt))
-            evt.wait()
-
-            # 2. EJECUTAR RUTA
-            for paso in camino:
-                if self.stop_emergencia: break
-                self._logica_mover_interna(paso)
-            
-            # 3. DESCARGA SILENCIOSA
-            if self.stop_emergencia: break
-            print("Iniciando descarga...")
-            time.sleep(0.5)
-            self.enviar_comando("S25")
-            time.sleep(TIME_SERVO)
-            self.enviar_comando("S65")
-            time.sleep(1.0)
-            
-            if not self.stop_emergencia:
-                self.contador_canicas += 1
-                self.root.after(0, lambda: self.lbl_canicas.config(text=f"Canicas: {self.contador_canicas}"))
-
-        if not self.stop_emergencia:
-            self._logica_retorno_interna("S1")
-            self.root.after(0, lambda: messagebox.showinfo("Fin", "Secuencia Terminada"))
-        
-        self.liberar_sistema()
-
-    def _show_info_wait(self, title, msg, event):
-        if not self.stop_emergencia: messagebox.showinfo(title, msg)
-        event.set()
-
-    # --- LOGICA DE RETORNO Y WRAPPERS ---
-    def iniciar_retorno_thread(self, destino):
-        if self.stop_emergencia or self.ocupado: return
-        self.ocupado = True
-        self.deshabilitar_controles()
-        threading.Thread(target=self._proceso_retorno_wrapper, args=(destino,)).start()
-
-    def _proceso_retorno_wrapper(self, destino):
-        self._logica_retorno_interna(destino)
-        self.liberar_sistema()
-
-    def _logica_retorno_interna(self, destino_final):
-        if self.stop_emergencia: return
-        actual = self.posicion_actual
-        if actual == destino_final: return
-
-        # 1. RETORNO SEGURO POR IZQUIERDA
-        if actual == "Destino":
-            col_virtual = self.columna_virtual_destino
-            
-            if col_virtual > 2: col_virtual = 2
-            if col_virtual < 0: col_virtual = 0
-
-            pasos_a_izq = col_virtual
-            
-            # Mover izquierda celda por celda
-            for _ in range(pasos_a_izq):
-                if self.stop_emergencia: return
-                self.enviar_comando(f"H-{STEPS_H}")
-                time.sleep(TIME_MOVE_H)
-            
-            # Subir a S1
-            for _ in range(4):
-                if self.stop_emergencia: return
-                self.enviar_comando(f"V{STEPS_V}")
-                time.sleep(TIME_MOVE_V)
-            
-            self.posicion_actual = "S1"
-            self.root.after(0, self.actualizar_grid_visual)
-
-        # 2. De S1 a destino_final
-        _, c_curr = self.mapa_coords[self.posicion_actual]
-        _, c_dest = self.mapa_coords[destino_final]
-        
-        while c_curr != c_dest:
-            if self.stop_emergencia: return
-            direction = 1 if c_dest > c_curr else -1
-            cmd = f"H{STEPS_H}" if direction == 1 else f"H-{STEPS_H}"
-            self.enviar_comando(cmd)
-            time.sleep(TIME_MOVE_H)
-            c_curr += direction
-            
-            k = "S1"
-            if c_curr == 1: k = "S2"
-            if c_curr == 2: k = "S3"
-            self.posicion_actual = k
-            self.root.after(0, self.actualizar_grid_visual)
-
-        self.posicion_actual = destino_final
-        self.root.after(0, self.actualizar_grid_visual)
-
-    def _logica_mover_interna(self, destino):
-        if self.stop_emergencia: return
-        cmd = self.calcular_comando(self.posicion_actual, destino)
-        if cmd:
-            self.enviar_comando(cmd)
-            wait_time = TIME_MOVE_V if "V" in cmd else TIME_MOVE_H
-            if "V-" in cmd and int(cmd.split('-')[1]) > STEPS_V: wait_time *= 2.5 
-
-            if destino == "Destino":
-                _, c_origen = self.mapa_coords[self.posicion_actual]
-                self.columna_virtual_destino = c_origen
-            
-            self.posicion_actual = destino
-            self.root.after(0, self.actualizar_grid_visual)
-            
-            steps = int(wait_time*10)
-            for _ in range(steps):
-                if self.stop_emergencia: return
-                time.sleep(0.1)
+        self.control.rearmar()
+        self.lanzar_trabajo(self.control.secuencia, list(self.rutas_programadas),
+                            al_terminar=lambda: messagebox.showinfo("Fin", "Secuencia Terminada"))
 
     # --- VISUALIZACION ---
     def construir_grid_visual(self):
-        self.cells = {}
         for w in self.panel_der.winfo_children(): 
             if w != self.frame_lista_rutas: w.destroy()
         
-        filas = [["S1", "S2", "S3"], [1, 2, 3], [4, 5, 6], [7, 8, 9], ["Destino"]]
-        for fila in filas:
-            f = tk.Frame(self.panel_der, bg="#0f172a")
-            f.pack(pady=10)
-            for z in fila:
-                w = 20 if z == "Destino" else 8
-                l = tk.Label(f, text=str(z), width=w, height=3, bg="#475569", fg="white", relief="ridge", font=("Arial", 12, "bold"))
-                l.pack(side="left", padx=10)
-                self.cells[z] = l
+        # Un solo Canvas: cada cambio recolorea dos zonas y el carro se anima entre celdas
+        self.rejilla = RejillaCanvas(self.panel_der, self.control.posicion)
+        self.rejilla.pack(pady=10)
         self.actualizar_grid_visual()
 
     def actualizar_grid_visual(self):
-        for z, l in self.cells.items():
-            color = "#3b82f6" if str(z).startswith("S") else "#10b981" if z=="Destino" else "#475569"
-            if z == self.posicion_actual: color = "#f59e0b"
-            l.config(bg=color)
+        if self.rejilla is None: return
+        self.rejilla.marcar(self.posicion_actual)
+        self.rejilla.animar()
+        if self.control.registro: self.control.registro.anotar("UI", "posicion")
+
+    def animar_carro(self):
+        if self.rejilla is not None: self.rejilla.animar()
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = MarbleInterfaceFinal(root)
     root.mainloop()
+    app.control.cerrar()
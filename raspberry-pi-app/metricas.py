@@ -0,0 +1,136 @@
+"""Metricas del controlador en formato Prometheus, solo con la biblioteca estandar.
+
+El controlador suma contadores y observa histogramas en el momento (un
+lock de unas pocas instrucciones); los valores que ya existen en otro lado
+(canicas, cola de TX...) se registran como funciones que se leen recien al
+consultar. El servidor HTTP corre en su propio hilo y nunca llama al loop
+ni a Tk, asi que un scrape no frena el puerto serie ni la interfaz:
+
+    curl http://raspberrypi:9108/metrics
+"""
+import http.server
+import threading
+
+# Limites (segundos) del histograma de duracion de movimientos
+LIMITES_DURACION = (0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0)
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(etiquetas)) + "}"
+
+
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tipos = {}        # nombre -> (tipo, ayuda)
+        self._valores = {}      # (nombre, etiquetas) -> valor
+        self._histogramas = {}  # (nombre, etiquetas) -> [conteos por limite, suma, total]
+        self._limites = {}      # nombre -> limites del histograma
+        self._lecturas = {}     # nombre -> funcion sin argumentos
+
+    # --- DEFINICION ---
+    def contador(self, nombre, ayuda):
+        self._tipos[nombre] = ("counter", ayuda)
+
+    def histograma(self, nombre, ayuda, limites):
+        self._tipos[nombre] = ("histogram", ayuda)
+        self._limites[nombre] = tuple(limites)
+
+    def lectura(self, nombre, ayuda, funcion, tipo="gauge"):
+        """Valor que se calcula al exportar (`funcion()` desde el hilo HTTP)."""
+        self._tipos[nombre] = (tipo, ayuda)
+        self._lecturas[nombre] = funcion
+
+    # --- ACTUALIZACION (cualquier hilo) ---
+    def sumar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, tuple(etiquetas.items()))
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        clave = (nombre, tuple(etiquetas.items()))
+        limites = self._limites[nombre]
+        with self._lock:
+            datos = self._histogramas.get(clave)
+            if datos is None:
+                datos = self._histogramas[clave] = [[0] * len(limites), 0.0, 0]
+            for i, limite in enumerate(limites):
+                if valor <= limite:
+                    datos[0][i] += 1
+            datos[1] += valor
+            datos[2] += 1
+
+    # --- EXPORTACION ---
+    def exportar(self):
+        """Texto en el formato de exposicion de Prometheus (0.0.4)."""
+        with self._lock:
+            valores = dict(self._valores)
+            histogramas = {k: (list(v[0]), v[1], v[2]) for k, v in self._histogramas.items()}
+
+        lineas = []
+        for nombre, (tipo, ayuda) in self._tipos.items():
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            if nombre in self._lecturas:
+                try:
+                    lineas.append(f"{nombre} {self._lecturas[nombre]()}")
+                except Exception as e:
+                    lineas.append(f"# error leyendo {nombre}: {e}")
+            elif tipo == "histogram":
+                limites = self._limites[nombre]
+                for (n, etiquetas), (conteos, suma, total) in histogramas.items():
+                    if n != nombre:
+                        continue
+                    for limite, conteo in zip(limites, conteos):
+                        lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', limite),))} {conteo}")
+                    lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', '+Inf'),))} {total}")
+                    lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {suma}")
+                    lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {total}")
+            else:
+                presentes = [(e, v) for (n, e), v in valores.items() if n == nombre]
+                for etiquetas, valor in presentes or [((), 0)]:
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+        return "\n".join(lineas) + "\n"
+
+
+class ServidorMetricas:
+    """Servidor HTTP minimo que responde GET /metrics en un hilo aparte."""
+
+    def __init__(self, metricas, puerto, direccion="0.0.0.0"):
+        self.metricas = metricas
+        self.direccion = direccion
+        self.puerto = puerto
+        self._servidor = None
+
+    def iniciar(self):
+        metricas = self.metricas
+
+        class Manejador(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                cuerpo = metricas.exportar().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, formato, *args):
+                pass  # sin una linea por scrape en la consola
+
+        self._servidor = http.server.ThreadingHTTPServer((self.direccion, self.puerto), Manejador)
+        self._servidor.daemon_threads = True
+        self.puerto = self._servidor.server_address[1]
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        print(f"Metricas en http://{self.direccion}:{self.puerto}/metrics")
+        return self
+
+    def detener(self):
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
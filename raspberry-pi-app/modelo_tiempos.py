@@ -0,0 +1,140 @@
+"""Modelo cinematico de tiempos de movimiento.
+
+El STM32 da un medio paso por cada interrupcion de TIM2, asi que un comando
+de N pasos dura N * periodo_paso, mas una sobrecarga fija (latencia USB, el
+while(1) que transmite el #FIN despues de medir los ultrasonidos, etc.):
+
+    duracion(eje, pasos) = |pasos| * periodo_paso + sobrecarga
+
+El periodo sale de la configuracion de TIM2 en main.c y la sobrecarga se
+mide. Cada #FIN recibido se registra con `registrar` y ambos parametros se
+reajustan por minimos cuadrados con olvido exponencial, por eje.
+"""
+import json
+import os
+import threading
+
+# --- TIM2 (MX_TIM2_Init en main.c) ---
+# SYSCLK 84 MHz, APB1 /2 -> reloj de timers x2 = 84 MHz
+F_TIMER_HZ = 84_000_000
+TIM2_PRESCALER = 84   # Prescaler = 84-1
+TIM2_PERIOD = 2000    # Period = 2000-1
+PERIODO_PASO = TIM2_PRESCALER * TIM2_PERIOD / F_TIMER_HZ  # 2 ms
+
+# Sobrecarga inicial hasta tener mediciones (envio + aviso #FIN)
+SOBRECARGA_INICIAL = 0.1
+
+# Peso de las mediciones viejas en el ajuste (1.0 = no olvidar nunca)
+OLVIDO = 0.95
+# El periodo real solo puede diferir del nominal por deriva del oscilador
+TOLERANCIA_PERIODO = 0.05
+# Cambios que invalidan los caminos guardados (version): fraccion del periodo
+# y segundos de sobrecarga respecto del ultimo cambio de version
+CAMBIO_PERIODO = 0.01
+CAMBIO_SOBRECARGA = 0.01
+
+
+class ModeloTiempos:
+    def __init__(self, periodo_paso=PERIODO_PASO, sobrecarga=SOBRECARGA_INICIAL):
+        self.nominal = periodo_paso
+        self.parametros = {eje: [periodo_paso, sobrecarga] for eje in ("H", "V")}
+        # Sumas ponderadas para el ajuste: n, sx, sy, sxx, sxy
+        self._sumas = {eje: [0.0] * 5 for eje in ("H", "V")}
+        # Cambia solo cuando algun eje se movio de verdad (ver _actualizar_version);
+        # sirve de clave para caches de caminos, no en cada #FIN
+        self.version = 0
+        # Cambia con cada ajuste: las duraciones calculadas antes quedan viejas
+        self.ajustes = 0
+        self._referencia = {eje: list(p) for eje, p in self.parametros.items()}
+        self._lock = threading.Lock()
+
+    def duracion(self, eje, pasos):
+        """Segundos desde el envio del comando hasta el #FIN esperado."""
+        if pasos == 0:
+            return 0.0
+        periodo, sobrecarga = self.parametros[eje]
+        return abs(pasos) * periodo + sobrecarga
+
+    def registrar(self, eje, pasos, observado):
+        """Incorpora una duracion medida (envio -> #FIN) y reajusta el eje."""
+        x = abs(pasos)
+        if x == 0 or observado <= 0:
+            return
+        with self._lock:
+            s = self._sumas[eje]
+            for i in range(5):
+                s[i] *= OLVIDO
+            s[0] += 1.0
+            s[1] += x
+            s[2] += observado
+            s[3] += x * x
+            s[4] += x * observado
+
+            n, sx, sy, sxx, sxy = s
+            varianza = n * sxx - sx * sx
+            periodo = self.parametros[eje][0]
+            # Solo se reajusta el periodo si hubo movimientos de largos distintos
+            if varianza > 1e-9 * n * sxx:
+                periodo = (n * sxy - sx * sy) / varianza
+                minimo = self.nominal * (1 - TOLERANCIA_PERIODO)
+                maximo = self.nominal * (1 + TOLERANCIA_PERIODO)
+                periodo = min(max(periodo, minimo), maximo)
+            sobrecarga = max(0.0, (sy - periodo * sx) / n)
+
+            self.parametros[eje] = [periodo, sobrecarga]
+            self.ajustes += 1
+            self._actualizar_version(eje)
+
+    def _actualizar_version(self, eje):
+        periodo, sobrecarga = self.parametros[eje]
+        ref_periodo, ref_sobrecarga = self._referencia[eje]
+        if (abs(periodo - ref_periodo) > CAMBIO_PERIODO * ref_periodo
+                or abs(sobrecarga - ref_sobrecarga) > CAMBIO_SOBRECARGA):
+            self._referencia[eje] = [periodo, sobrecarga]
+            self.version += 1
+
+    # --- PERSISTENCIA ---
+    def guardar(self, archivo):
+        with self._lock:
+            datos = {"parametros": self.parametros, "sumas": self._sumas}
+        tmp = archivo + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(datos, f, indent=2)
+        os.replace(tmp, archivo)
+
+    def cargar(self, archivo):
+        """Recupera un ajuste previo. Si no existe o esta danado, sigue con los nominales."""
+        try:
+            with open(archivo) as f:
+                datos = json.load(f)
+            # Todo se valida antes de tocar el modelo: un archivo a medias no lo cambia
+            guardados = datos["parametros"]
+            if not isinstance(guardados, dict):
+                raise ValueError("'parametros' no es un objeto")
+            leidos = {}
+            for eje in ("H", "V"):
+                if eje in guardados:
+                    parametros = [float(v) for v in guardados[eje]]
+                    sumas = [float(v) for v in datos["sumas"][eje]]
+                    if len(parametros) != 2 or len(sumas) != 5:
+                        raise ValueError(f"eje {eje} incompleto")
+                    leidos[eje] = (parametros, sumas)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"No se pudo leer el modelo de tiempos {archivo}: {e}")
+            return False
+        with self._lock:
+            for eje, (parametros, sumas) in leidos.items():
+                self.parametros[eje] = parametros
+                self._sumas[eje] = sumas
+                self._referencia[eje] = list(parametros)
+            self.ajustes += 1
+            self.version += 1
+        return True
+
+    def __repr__(self):
+        partes = [f"{eje}: {p * 1000:.4f} ms/paso + {s:.3f} s" for eje, (p, s) in self.parametros.items()]
+        return f"ModeloTiempos({', '.join(partes)})"
+
+
+# Modelo compartido por el compilador, el planificador y la interfaz
+MODELO = ModeloTiempos()
@@ -0,0 +1,501 @@
+"""Nucleo asyncio del controlador: un loop en su propio hilo.
+
+Todo lo que coordina la maquina corre en ese loop: la lectura del puerto
+(add_reader sobre el descriptor, sin hilo lector), la escritura con su
+carril de STOP, y los movimientos, descargas y secuencias como corrutinas.
+Los trabajos corren de a uno y un STOP los cancela con Task.cancel().
+
+La GUI habla con el loop con `ejecutar` / `llamar` (que despiertan al loop
+por su self-pipe) y recibe las novedades por un PuenteTk: ninguno de los
+dos loops sondea al otro.
+"""
+import asyncio
+import collections
+import os
+import queue
+import threading
+import time
+
+from enlace_serial import (
+    CAPACIDAD_COLA, COMANDO_BAUDIOS, COMANDO_PRUEBA, CONFIRMACION_BAUDIOS, CONFIRMAR_BAUDIOS,
+    MUESTRAS_LATENCIA, PAUSA_CAMBIO_BAUDIOS, PRUEBAS_BAUDIOS, RESPUESTA_BAUDIOS, RESPUESTA_ID,
+    RESPUESTA_PRUEBA, SONDA, TRAMAS_PARADA, DivisorTramas, resumen_latencias,
+)
+import protocolo_binario as pb
+from reloj import RELOJ_REAL
+
+
+async def esperar_evento(evento, timeout):
+    """Espera un asyncio.Event con tope. Devuelve False si vencio el timeout."""
+    if evento.is_set():
+        return True
+    try:
+        await asyncio.wait_for(evento.wait(), max(0.0, timeout))
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class BucleAsync:
+    """Loop de asyncio corriendo en un hilo aparte.
+
+    El loop lo crea `reloj` (reloj.py): con un RelojVirtual todas las esperas
+    del controlador corren en tiempo simulado.
+    """
+
+    def __init__(self, reloj=RELOJ_REAL):
+        self.reloj = reloj
+        self.loop = reloj.nuevo_loop()
+        self._hilo = None
+        self._turno = None
+        self._tareas = set()
+
+    def iniciar(self):
+        listo = threading.Event()
+
+        def correr():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(listo.set)
+            try:
+                self.loop.run_forever()
+            finally:
+                # En su hilo: si no se cierra, el GC lo cierra al salir con el
+                # puerto ya cerrado y avisa "Invalid file descriptor"
+                self.loop.close()
+
+        self._hilo = threading.Thread(target=correr, daemon=True)
+        self._hilo.start()
+        listo.wait()
+
+    def detener(self):
+        """Cancela las tareas pendientes, espera que terminen, frena el loop y lo cierra."""
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._apagar(), self.loop)
+        if self._hilo and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout=1.0)
+
+    def llamar(self, fn, *args):
+        """Agenda `fn(*args)` en el loop desde cualquier hilo."""
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def correr(self, coro):
+        """Corre una corrutina en el loop sin esperar turno. Devuelve un Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def ejecutar(self, coro):
+        """Encola un trabajo de movimiento: corren de a uno y en orden."""
+        return asyncio.run_coroutine_threadsafe(self._en_turno(coro), self.loop)
+
+    def cancelar(self):
+        """Cancela el trabajo en curso y los que esperan turno."""
+        self.loop.call_soon_threadsafe(self._cancelar_todo)
+
+    @property
+    def ocupado(self):
+        return bool(self._tareas)
+
+    @property
+    def trabajos(self):
+        """Trabajos en curso o esperando turno."""
+        return len(self._tareas)
+
+    async def _en_turno(self, coro):
+        if self._turno is None:
+            self._turno = asyncio.Lock()
+        tarea = asyncio.current_task()
+        self._tareas.add(tarea)
+        try:
+            async with self._turno:
+                return await coro
+        finally:
+            self._tareas.discard(tarea)
+            coro.close()  # por si se cancelo antes de arrancar
+
+    async def _apagar(self):
+        tareas = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        self.loop.stop()
+
+    def _cancelar_todo(self):
+        for tarea in list(self._tareas):
+            tarea.cancel()
+
+
+class EnlaceSerialAsync:
+    """Puerto serie atendido por el loop: add_reader para leer, cola para escribir.
+
+    Debe usarse solo desde el hilo del loop. `al_recibir(linea)` se llama
+    con cada trama completa; los #FIN ademas activan `fin[eje]`. Con un
+    `registro` (registro_serial.py) se anota cada trama escrita y recibida;
+    `mostrar_tx` ademas las imprime en la consola (solo para depurar).
+
+    Arranca con el protocolo de lineas; `negociar_binario()` pasa a las
+    tramas de protocolo_binario.py si la placa las entiende. En binario cada
+    comando espera su ACK y se reenvia (mismo seq) si no llega a tiempo;
+    `al_recibir` sigue recibiendo las mismas lineas de texto.
+
+    `negociar_baudios()` sube la velocidad del puerto. Sus comandos van
+    siempre en texto, tambien en binario (la placa atiende los dos).
+    """
+
+    def __init__(self, ser, al_recibir, baudios=115200, capacidad=CAPACIDAD_COLA, mostrar_tx=False, registro=None):
+        self.ser = ser
+        self.al_recibir = al_recibir
+        self.registro = registro
+        self.capacidad = capacidad
+        self.mostrar_tx = mostrar_tx
+        # 10 bits por byte en la UART (start + 8 datos + stop)
+        self.baudios = baudios
+        self.seg_por_byte = 10 / baudios
+        self.divisor = DivisorTramas()
+        # Respuesta que espera _pedir: (prefijo, future); no sube al controlador
+        self._espera = None
+        # Errores de lectura/escritura del puerto y comandos ya escritos (para metricas)
+        self.errores = 0
+        self.tramas_tx = 0
+
+        # --- PROTOCOLO BINARIO ---
+        self.binario = False
+        self._seq = 0
+        self._sin_ack = {}  # seq -> [comandos, datos, t_envio, reenvios]
+        self._seq_placa = None  # proximo seq esperado en los avisos de la placa
+        self._id_binario = None
+        # Bits CAPACIDAD_* del ID binario (programas en la placa, etc.)
+        self.capacidades = 0
+        self.reenvios = 0
+        # Comandos que la placa no confirmo (o descarto por viejos) y avisos que faltan
+        self.perdidos_tx = 0
+        self.perdidos_rx = 0
+
+        # t_envio / t_fin con el reloj del loop (ver esperar_movimiento)
+        self.fin = {}
+        self.t_envio = {"H": 0.0, "V": 0.0}
+        self.t_fin = {"H": 0.0, "V": 0.0}
+        self.latencias = {"normal": collections.deque(maxlen=MUESTRAS_LATENCIA),
+                          "parada": collections.deque(maxlen=MUESTRAS_LATENCIA),
+                          "ack": collections.deque(maxlen=MUESTRAS_LATENCIA)}
+
+        self._fd = None
+        self._cola = collections.deque()
+        self._hay_datos = None
+        self._tarea_escritor = None
+        self._salida = bytearray()
+        self._escritos = 0
+        self._marcas = collections.deque()  # (byte final, t_encolado, carril, comandos)
+
+    async def iniciar(self):
+        loop = asyncio.get_running_loop()
+        self.fin = {"H": asyncio.Event(), "V": asyncio.Event()}
+        self._hay_datos = asyncio.Event()
+        self._fd = self.ser.fileno()
+        os.set_blocking(self._fd, False)
+        loop.add_reader(self._fd, self._al_leer)
+        self._tarea_escritor = loop.create_task(self._escritor())
+
+    def detener(self):
+        loop = asyncio.get_event_loop()
+        if self._fd is not None:
+            loop.remove_reader(self._fd)
+            loop.remove_writer(self._fd)
+        if self._tarea_escritor:
+            self._tarea_escritor.cancel()
+
+    # --- LECTURA ---
+    def _al_leer(self):
+        try:
+            datos = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.errores += 1
+            print(f"Error en lector serial: {e}")
+            asyncio.get_event_loop().remove_reader(self._fd)
+            return
+
+        for trama in self.divisor.agregar(datos):
+            if isinstance(trama, str):
+                self._entregar(trama)
+            else:
+                self._al_recibir_binaria(*trama)
+
+    def _entregar(self, linea):
+        if self.registro:
+            self.registro.anotar("RX", linea)
+        if self._espera and linea.startswith(self._espera[0]):
+            if not self._espera[1].done():
+                self._espera[1].set_result(linea)
+            return
+        if linea.startswith("#FIN,") and linea[5:] in self.fin:
+            self.t_fin[linea[5:]] = asyncio.get_event_loop().time()
+            self.fin[linea[5:]].set()
+        try:
+            self.al_recibir(linea)
+        except Exception as e:
+            print(f"Error procesando trama '{linea}': {e}")
+
+    def _al_recibir_binaria(self, seq, tipo, valores):
+        # Todas las tramas de la placa (ACK incluidos) van numeradas
+        if tipo == pb.ID:
+            self._seq_placa = seq
+        if self._seq_placa is not None and seq != self._seq_placa:
+            perdidos = (seq - self._seq_placa) & 0xFF
+            self.perdidos_rx += perdidos
+            print(f"AVISO: faltan {perdidos} avisos de la placa (seq {self._seq_placa} -> {seq})")
+        self._seq_placa = (seq + 1) & 0xFF
+        if tipo == pb.ACK:
+            self._confirmar(*valores)
+            return
+        if tipo == pb.ID:
+            # Respuesta a la negociacion: como la sonda de texto, no sube al controlador
+            if self.registro:
+                self.registro.anotar("RX", pb.aviso_como_linea(tipo, valores))
+            self.capacidades = valores[1]
+            if self._id_binario:
+                self._id_binario.set()
+            return
+        linea = pb.aviso_como_linea(tipo, valores)
+        if linea:
+            self._entregar(linea)
+
+    # --- NEGOCIACION ---
+    async def negociar_binario(self, timeout):
+        """Pide el protocolo binario con el comando de texto `B`.
+
+        La placa que lo entiende contesta con una trama ID y desde ahi habla
+        en tramas. Si no contesta dentro de `timeout` se sigue en texto.
+        Devuelve True si quedo en binario.
+        """
+        self._id_binario = asyncio.Event()
+        # El decodificador binario tambien separa lineas de texto
+        self.divisor = pb.DecodificadorTramas()
+        self.enviar(pb.COMANDO_BINARIO)
+        if await esperar_evento(self._id_binario, timeout):
+            self.binario = True
+            return True
+        self.divisor = DivisorTramas()
+        return False
+
+    async def negociar_baudios(self, candidatos, timeout, ventana):
+        """Prueba cada velocidad de `candidatos` y se queda con la primera que anda.
+
+        Para cada una: `U<baudios>` -> la placa contesta #BAUD a la velocidad
+        actual y cambia; el host cambia tambien, manda PRUEBAS_BAUDIOS
+        patrones `T` que la placa devuelve, y si todos vuelven iguales
+        confirma con `U0`. Si algo falla vuelve a la velocidad anterior: la
+        placa hace lo mismo cuando pasan `ventana` segundos sin confirmacion.
+        Devuelve la velocidad en que quedo el puerto.
+        """
+        base = self.baudios
+        for baudios in candidatos:
+            if baudios == self.baudios:
+                return baudios
+            if await self._probar_baudios(baudios, timeout):
+                return baudios
+            print(f"AVISO: {baudios} baudios no paso la prueba, se vuelve a {base}")
+            self._cambiar_baudios(base)
+            # Esperar a que la placa tambien vuelva y confirmar que contesta
+            await asyncio.sleep(ventana)
+            self.divisor = self._nuevo_divisor()
+            if await self._pedir(SONDA, RESPUESTA_ID, timeout) is None:
+                print(f"AVISO: la placa no contesta a {base} baudios despues de la prueba")
+                break
+        return self.baudios
+
+    async def _probar_baudios(self, baudios, timeout):
+        if await self._pedir(f"{COMANDO_BAUDIOS}{baudios}", RESPUESTA_BAUDIOS, timeout) != f"{RESPUESTA_BAUDIOS}{baudios}":
+            return False
+        self._cambiar_baudios(baudios)
+        await asyncio.sleep(PAUSA_CAMBIO_BAUDIOS)
+        for _ in range(PRUEBAS_BAUDIOS):
+            patron = "UUUU" + os.urandom(10).hex().upper()  # 0x55: el peor caso para el muestreo
+            if await self._pedir(f"{COMANDO_PRUEBA}{patron}", RESPUESTA_PRUEBA, timeout) != f"{RESPUESTA_PRUEBA}{patron}":
+                return False
+        return await self._pedir(CONFIRMAR_BAUDIOS, CONFIRMACION_BAUDIOS, timeout) is not None
+
+    def _cambiar_baudios(self, baudios):
+        # El socketpair del emulador (reloj virtual) no tiene baudrate
+        if hasattr(self.ser, "baudrate"):
+            self.ser.baudrate = baudios
+        self.baudios = baudios
+        self.seg_por_byte = 10 / baudios
+        # Lo que llego a mitad del cambio es basura
+        self.divisor = self._nuevo_divisor()
+
+    def _nuevo_divisor(self):
+        # La placa sigue en binario despues de cambiar de velocidad
+        return pb.DecodificadorTramas() if self.binario else DivisorTramas()
+
+    async def _pedir(self, cmd, prefijo, timeout):
+        """Manda `cmd` en texto y espera la primera linea que empiece con `prefijo` (o None)."""
+        self._espera = (prefijo, asyncio.get_running_loop().create_future())
+        try:
+            # En binario, el '\n' de adelante cierra el resto de una trama rota
+            # que la placa este descartando (texto_descartar en main.c)
+            linea = f"\n{cmd}\n" if self.binario else f"{cmd}\n"
+            self._cola.append(([cmd], linea.encode("utf-8"), None, time.monotonic(), None))
+            self._hay_datos.set()
+            return await asyncio.wait_for(self._espera[1], timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._espera = None
+
+    @property
+    def errores_crc(self):
+        return getattr(self.divisor, "errores_crc", 0)
+
+    # --- ESCRITURA ---
+    def enviar(self, cmd):
+        """Encola un comando. Lanza queue.Full si la cola esta llena.
+
+        En binario lanza protocolo_binario.ErrorProtocolo si el comando no
+        tiene trama equivalente.
+        """
+        self._encolar(cmd, None)
+
+    def _encolar(self, cmd, eje):
+        # eje: el escritor marca t_envio[eje] cuando el comando sale al puerto
+        if len(self._cola) >= self.capacidad:
+            raise queue.Full(f"cola de TX llena ({self.capacidad})")
+        datos, seq = self._codificar(cmd)
+        self._cola.append(([cmd], datos, seq, time.monotonic(), eje))
+        self._hay_datos.set()
+
+    def _codificar(self, cmd):
+        """(bytes, seq) de un comando; seq es None en texto."""
+        if not self.binario:
+            return f"{cmd}\n".encode("utf-8"), None
+        self._seq = (self._seq + 1) & 0xFF
+        return pb.codificar_comando(cmd, self._seq), self._seq
+
+    def enviar_movimiento(self, cmd):
+        """Envia un comando de motor preparando la espera de su #FIN.
+
+        t_envio se marca al escribirlo en el puerto y no al encolarlo: la
+        espera en la cola no es parte del movimiento ni del modelo de tiempos.
+        """
+        self.fin[cmd[0]].clear()
+        self._encolar(cmd, cmd[0])
+
+    def preparar_fin(self, eje):
+        """Un movimiento de `eje` empezo sin pasar por enviar_movimiento (programa de la placa)."""
+        self.fin[eje].clear()
+        self.t_envio[eje] = asyncio.get_event_loop().time()
+
+    def enviar_programa(self, carga, nombre="PRG"):
+        """Encola una trama PROGRAMA (programa_placa.py); solo en binario."""
+        if not self.binario:
+            raise pb.ErrorProtocolo("los programas solo van en binario")
+        if len(self._cola) >= self.capacidad:
+            raise queue.Full(f"cola de TX llena ({self.capacidad})")
+        self._seq = (self._seq + 1) & 0xFF
+        self._cola.append(([nombre], pb.codificar(pb.PROGRAMA, self._seq, carga), self._seq, time.monotonic(), None))
+        self._hay_datos.set()
+
+    def enviar_parada(self, comandos=TRAMAS_PARADA):
+        """Frenado: descarta lo encolado y escribe ya, en una sola escritura."""
+        self._cola.clear()
+        # Nada de lo anterior se reenvia despues de un STOP
+        self._sin_ack.clear()
+        comandos = list(comandos)
+        if not self.binario:
+            self._escribir(comandos, "".join(f"{c}\n" for c in comandos).encode("utf-8"), None,
+                           time.monotonic(), "parada")
+        elif tuple(comandos) == TRAMAS_PARADA:
+            self._seq = (self._seq + 1) & 0xFF
+            self._escribir(comandos, pb.codificar(pb.PARADA, self._seq), self._seq, time.monotonic(), "parada")
+        else:
+            for cmd in comandos:
+                datos, seq = self._codificar(cmd)
+                self._escribir([cmd], datos, seq, time.monotonic(), "parada")
+
+    def pendientes(self):
+        return len(self._cola)
+
+    def estadisticas(self):
+        return resumen_latencias(self.latencias)
+
+    async def _escritor(self):
+        while True:
+            await self._hay_datos.wait()
+            if not self._cola:
+                self._hay_datos.clear()
+                continue
+            comandos, datos, seq, t_encolado, eje = self._cola.popleft()
+            n = self._escribir(comandos, datos, seq, t_encolado, "normal")
+            if eje:
+                self.t_envio[eje] = asyncio.get_running_loop().time()
+            # Esperar lo que tarda la trama en el cable: asi nunca queda mas
+            # de una trama en el buffer del driver delante de un STOP
+            await asyncio.sleep(n * self.seg_por_byte)
+
+    def _escribir(self, comandos, datos, seq, t_encolado, carril):
+        self._salida += datos
+        self._marcas.append((self._escritos + len(self._salida), t_encolado, carril, comandos))
+        if seq is not None:
+            loop = asyncio.get_event_loop()
+            self._sin_ack[seq] = [comandos, datos, loop.time(), 0]
+            loop.call_later(pb.TIMEOUT_ACK, self._revisar_ack, seq, 0)
+        self._vaciar()
+        return len(datos)
+
+    # --- ACK (binario) ---
+    def _confirmar(self, seq, estado):
+        pendiente = self._sin_ack.pop(seq, None)
+        if pendiente is None:
+            return  # ACK de un reenvio ya confirmado, o de antes de un STOP
+        if estado in (pb.ACK_OK, pb.ACK_REPETIDO):
+            # Repetido: el primer ACK se perdio pero el comando se ejecuto una vez
+            self.latencias["ack"].append(asyncio.get_event_loop().time() - pendiente[2])
+        else:
+            self.perdidos_tx += 1
+            print(f"AVISO: la placa no ejecuto {' '.join(pendiente[0])} (seq {seq}, estado {estado})")
+
+    def _revisar_ack(self, seq, reenvios):
+        pendiente = self._sin_ack.get(seq)
+        if pendiente is None or pendiente[3] != reenvios:
+            return
+        if reenvios >= pb.REINTENTOS_ACK:
+            del self._sin_ack[seq]
+            self.perdidos_tx += 1
+            print(f"AVISO: sin ACK para {' '.join(pendiente[0])} (seq {seq})")
+            return
+        # Mismo seq: si la placa ya lo habia ejecutado solo vuelve a confirmar
+        pendiente[3] += 1
+        self.reenvios += 1
+        self._salida += pendiente[1]
+        self._vaciar()
+        asyncio.get_event_loop().call_later(pb.TIMEOUT_ACK, self._revisar_ack, seq, pendiente[3])
+
+    def _vaciar(self):
+        loop = asyncio.get_event_loop()
+        try:
+            n = os.write(self._fd, self._salida)
+        except BlockingIOError:
+            n = 0
+        except OSError as e:
+            self.errores += 1
+            print(f"Error Serial: {e}")
+            self._salida.clear()
+            self._marcas.clear()
+            return
+        del self._salida[:n]
+        self._escritos += n
+
+        ahora = time.monotonic()
+        while self._marcas and self._marcas[0][0] <= self._escritos:
+            _, t_encolado, carril, comandos = self._marcas.popleft()
+            self.latencias[carril].append(ahora - t_encolado)
+            self.tramas_tx += 1
+            if self.registro:
+                self.registro.anotar("TXP" if carril == "parada" else "TX", " ".join(comandos))
+            if self.mostrar_tx:
+                print(f"TX: {' '.join(comandos)}")
+
+        # Lo que no entro se termina de escribir cuando el puerto lo acepte
+        if self._salida:
+            loop.add_writer(self._fd, self._vaciar)
+        else:
+            loop.remove_writer(self._fd)
@@ -0,0 +1,253 @@
+"""Planificador de rutas: el camino legal mas rapido sobre la grilla de zonas.
+
+Busca con Dijkstra sobre tramos rectos (izquierda, derecha o abajo, de una o
+varias celdas), con las mismas reglas que validar_movimiento: nunca se sube y
+a Destino solo se llega bajando desde la fila 7-8-9. Como cada tramo recto se
+manda en un solo comando (ver compilador_movimientos), el costo de un tramo
+es el tiempo de ese comando y no la suma de sus celdas.
+"""
+import heapq
+from functools import lru_cache
+
+from compilador_movimientos import (
+    FILA_DESTINO, coordenadas, planificar, planificar_retorno,
+    tiempo_movimiento, zona_en,
+)
+from config_canicas import STEPS_H, STEPS_V, TIME_SERVO
+from modelo_tiempos import MODELO
+
+COLUMNAS = 3
+# Asentamiento, servo abierto y cierre de cada descarga (ControladorCanicas.ejecutar_ruta)
+TIEMPO_DESCARGA = 0.5 + TIME_SERVO + 1.0
+
+
+def _tramos(fila, col):
+    """Tramos rectos legales desde (fila, col): (segundos, [coords de cada celda])."""
+    if fila == FILA_DESTINO:
+        return  # Destino es final de ruta
+
+    for direccion in (-1, 1):
+        celdas = []
+        c = col + direccion
+        while 0 <= c < COLUMNAS:
+            celdas.append((fila, c))
+            yield tiempo_movimiento("H", len(celdas) * STEPS_H), list(celdas)
+            c += direccion
+
+    celdas = []
+    for f in range(fila + 1, FILA_DESTINO + 1):
+        celdas.append((f, col))
+        yield tiempo_movimiento("V", len(celdas) * STEPS_V), list(celdas)
+
+
+def planificar_ruta(origen, objetivo, visitar=()):
+    """Camino mas rapido de `origen` a `objetivo` pasando por todas las `visitar`.
+
+    Devuelve la lista de zonas en el formato de 'camino' de rutas_programadas
+    (sin el origen), o None si no existe un camino legal.
+    """
+    camino = _planificar(origen, objetivo, tuple(visitar), MODELO.version)
+    return list(camino) if camino is not None else None
+
+
+def costo_ruta(origen, camino):
+    """Segundos estimados de recorrer `camino` desde `origen` (tramos fusionados)."""
+    return planificar(origen, camino).duracion
+
+
+@lru_cache(maxsize=512)
+def _planificar(origen, objetivo, visitar, version_modelo):
+    # version_modelo solo forma parte de la clave: cambia cuando el modelo
+    # de tiempos se corre de verdad (no en cada #FIN) y el mejor camino
+    # puede ser otro
+    if origen == "Destino":
+        return None
+
+    pendientes = [coordenadas(z) for z in visitar if z != "Destino"]
+    bit = {rc: 1 << i for i, rc in enumerate(pendientes)}
+    completo = (1 << len(pendientes)) - 1
+
+    def es_objetivo(rc):
+        if objetivo == "Destino":
+            return rc[0] == FILA_DESTINO
+        return rc == coordenadas(objetivo)
+
+    inicio = coordenadas(origen)
+    mascara0 = bit.get(inicio, 0)
+    mejor = {(inicio, mascara0): 0.0}
+    cola = [(0.0, 0, inicio, mascara0, ())]
+    orden = 1
+
+    while cola:
+        costo, _, rc, mascara, camino = heapq.heappop(cola)
+        if costo > mejor.get((rc, mascara), float("inf")):
+            continue
+        if mascara == completo and camino and es_objetivo(rc):
+            return camino
+
+        for segundos, celdas in _tramos(*rc):
+            nueva = mascara
+            for celda in celdas:
+                nueva |= bit.get(celda, 0)
+            llegada = celdas[-1]
+            total = costo + segundos
+            if total < mejor.get((llegada, nueva), float("inf")):
+                mejor[(llegada, nueva)] = total
+                zonas = tuple(zona_en(*celda) for celda in celdas)
+                heapq.heappush(cola, (total, orden, llegada, nueva, camino + zonas))
+                orden += 1
+    return None
+
+
+# --- ORDEN DE LA COLA DE RUTAS ---
+# Hasta este tamano se usa programacion dinamica exacta (Held-Karp)
+MAX_RUTAS_EXACTO = 10
+
+
+def _costo_retorno(actual, destino, columna_destino):
+    return planificar_retorno(actual, destino, columna_destino).duracion
+
+
+def _traslados():
+    """traslado[(columna, origen)]: de Destino (bajando por `columna`) al origen de otra ruta.
+
+    Solo hay tres columnas y tres origenes, asi que la tabla tiene a lo sumo
+    nueve entradas, sin importar el largo de la cola.
+    """
+    tabla = {}
+
+    def traslado(columna, origen):
+        if (columna, origen) not in tabla:
+            tabla[(columna, origen)] = _costo_retorno("Destino", origen, columna)
+        return tabla[(columna, origen)]
+    return traslado
+
+
+def _matriz_costos(rutas, posicion_inicial, columna_destino):
+    """Costos de traslado: inicio[j], entre[i][j] (fin de i -> origen de j) y fin[i]."""
+    # Columna por la que cada ruta baja a Destino
+    columnas = [planificar(r['origen'], r['camino']).columna_final for r in rutas]
+    traslado = _traslados()
+    inicio = [_costo_retorno(posicion_inicial, r['origen'], columna_destino) for r in rutas]
+    entre = [[traslado(ci, rj['origen']) for rj in rutas] for ci in columnas]
+    fin = [traslado(ci, "S1") for ci in columnas]
+    return inicio, entre, fin
+
+
+def _costo_orden(orden, inicio, entre, fin):
+    total = inicio[orden[0]] + fin[orden[-1]]
+    for a, b in zip(orden, orden[1:]):
+        total += entre[a][b]
+    return total
+
+
+def _orden_exacto(n, inicio, entre, fin):
+    """Held-Karp: dp[mascara][ultima] = menor costo visitando `mascara`."""
+    inf = float("inf")
+    dp = [[inf] * n for _ in range(1 << n)]
+    previo = [[-1] * n for _ in range(1 << n)]
+    for j in range(n):
+        dp[1 << j][j] = inicio[j]
+
+    for mascara in range(1, 1 << n):
+        fila = dp[mascara]
+        for ultima in range(n):
+            costo = fila[ultima]
+            if costo == inf:
+                continue
+            for j in range(n):
+                if mascara & (1 << j):
+                    continue
+                nueva = mascara | (1 << j)
+                total = costo + entre[ultima][j]
+                if total < dp[nueva][j]:
+                    dp[nueva][j] = total
+                    previo[nueva][j] = ultima
+
+    completo = (1 << n) - 1
+    ultima = min(range(n), key=lambda j: dp[completo][j] + fin[j])
+    orden, mascara = [], completo
+    while ultima != -1:
+        orden.append(ultima)
+        ultima, mascara = previo[mascara][ultima], mascara & ~(1 << ultima)
+    return orden[::-1]
+
+
+def _orden_heuristico(n, inicio, entre, fin, max_pasadas=4):
+    """Vecino mas cercano y despues reubicacion de rutas sueltas (or-opt)."""
+    pendientes = set(range(n))
+    actual = min(pendientes, key=lambda j: inicio[j])
+    orden = [actual]
+    pendientes.remove(actual)
+    while pendientes:
+        actual = min(pendientes, key=lambda j: entre[actual][j])
+        orden.append(actual)
+        pendientes.remove(actual)
+
+    def traslado(a, b):
+        # None marca el comienzo (posicion inicial) o el final (retorno a S1)
+        if a is None: return inicio[b]
+        if b is None: return fin[a]
+        return entre[a][b]
+
+    for _ in range(max_pasadas):
+        mejoro = False
+        for i in range(n):
+            ruta = orden[i]
+            antes = orden[i - 1] if i > 0 else None
+            despues = orden[i + 1] if i < n - 1 else None
+            quitar = traslado(antes, despues) - traslado(antes, ruta) - traslado(ruta, despues)
+
+            resto = orden[:i] + orden[i + 1:]
+            mejor_k, mejor_delta = None, -1e-9
+            for k in range(n):
+                a = resto[k - 1] if k > 0 else None
+                b = resto[k] if k < n - 1 else None
+                delta = quitar + traslado(a, ruta) + traslado(ruta, b) - traslado(a, b)
+                if delta < mejor_delta:
+                    mejor_k, mejor_delta = k, delta
+            if mejor_k is not None:
+                resto.insert(mejor_k, ruta)
+                orden, mejoro = resto, True
+        if not mejoro:
+            break
+    return orden
+
+
+def duracion_secuencia(rutas, posicion_inicial="S1", columna_destino=1):
+    """Segundos estimados de correr la cola en este orden (sin la espera de carga)."""
+    if not rutas:
+        return 0.0
+    # Solo los traslados del orden dado: O(n), sin armar la matriz de optimizar_orden
+    planes = [planificar(r['origen'], r['camino']) for r in rutas]
+    traslado = _traslados()
+    total = _costo_retorno(posicion_inicial, rutas[0]['origen'], columna_destino)
+    for plan, siguiente in zip(planes, rutas[1:]):
+        total += traslado(plan.columna_final, siguiente['origen'])
+    total += traslado(planes[-1].columna_final, "S1")
+    return total + sum(plan.duracion for plan in planes) + len(rutas) * TIEMPO_DESCARGA
+
+
+def optimizar_orden(rutas, posicion_inicial="S1", columna_destino=1):
+    """Reordena la cola para minimizar traslados y retornos.
+
+    Devuelve (rutas_reordenadas, segundos_ahorrados) respecto del orden
+    recibido. El tiempo de cada ruta y de cada descarga no depende del
+    orden, solo los traslados entre el fin de una ruta y el origen de la
+    siguiente.
+    """
+    n = len(rutas)
+    if n < 2:
+        return list(rutas), 0.0
+
+    inicio, entre, fin = _matriz_costos(rutas, posicion_inicial, columna_destino)
+    if n <= MAX_RUTAS_EXACTO:
+        orden = _orden_exacto(n, inicio, entre, fin)
+    else:
+        orden = _orden_heuristico(n, inicio, entre, fin)
+
+    antes = _costo_orden(list(range(n)), inicio, entre, fin)
+    despues = _costo_orden(orden, inicio, entre, fin)
+    if despues >= antes:
+        return list(rutas), 0.0
+    return [rutas[i] for i in orden], antes - despues
@@ -0,0 +1,114 @@
+"""Programas de la placa: una ruta entera en una sola trama.
+
+Con la placa en binario, en lugar de mandar cada segmento y esperar su #FIN
+para mandar el siguiente, la ruta (bajadas, asentamiento y descarga) se
+arma como una lista de operaciones y va en una trama PROGRAMA. La placa las
+encadena en su while(1) sin esperar al host (EjecutarPrograma en main.c) y
+avisa cuando empieza cada paso:
+
+    #PRG,programa,paso,0   empieza el paso
+    #PRG,programa,n,1      termino (n = cantidad de pasos)
+    #PRG,programa,paso,2   se aborto (STOP)
+
+Los movimientos siguen avisando #FIN como siempre. Carga de la trama:
+
+    programa (uint8) | op (uint8) valores | op valores | ...
+"""
+import struct
+
+import protocolo_binario as pb
+
+# --- OPERACIONES ---
+OP_MOVER_H = 0x01    # pasos (int32); sigue cuando salio el #FIN,H
+OP_MOVER_V = 0x02    # pasos (int32); sigue cuando salio el #FIN,V
+OP_COMBINADO = 0x03  # pasos H y V (int32); espera los dos
+OP_SERVO = 0x04      # angulo (uint16); no espera
+OP_PAUSA = 0x05      # milisegundos (uint16)
+
+FORMATOS_OP = {
+    OP_MOVER_H: struct.Struct("<i"),
+    OP_MOVER_V: struct.Struct("<i"),
+    OP_COMBINADO: struct.Struct("<ii"),
+    OP_SERVO: struct.Struct("<H"),
+    OP_PAUSA: struct.Struct("<H"),
+}
+
+# Estados de los avisos de progreso
+PASO = 0
+TERMINADO = 1
+ABORTADO = 2
+
+_PAUSA_MAXIMA_MS = 0xFFFF
+
+
+class Paso:
+    """Una operacion del programa. `segmento` es el del compilador si es un movimiento."""
+
+    def __init__(self, op, valores, segmento=None, duracion=0.0):
+        self.op = op
+        self.valores = valores
+        self.segmento = segmento
+        self.duracion = duracion
+
+    def __repr__(self):
+        return f"Paso({self.op:#04x}, {self.valores})"
+
+
+class Programa:
+    """Lista de pasos que la placa ejecuta seguidos."""
+
+    def __init__(self):
+        self.pasos = []
+
+    def mover(self, seg):
+        """Agrega un Segmento o SegmentoCombinado de compilador_movimientos."""
+        if len(seg.partes) == 2:
+            horizontal, vertical = seg.partes
+            valores = (horizontal.pasos, vertical.pasos)
+            op = OP_COMBINADO
+        else:
+            valores = (seg.pasos,)
+            op = OP_MOVER_H if seg.eje == "H" else OP_MOVER_V
+        self.pasos.append(Paso(op, valores, seg, seg.tiempo_estimado()))
+
+    def servo(self, angulo):
+        self.pasos.append(Paso(OP_SERVO, (angulo & 0xFFFF,)))
+
+    def pausa(self, segundos):
+        ms = round(segundos * 1000)
+        while ms > 0:
+            tramo = min(ms, _PAUSA_MAXIMA_MS)
+            self.pasos.append(Paso(OP_PAUSA, (tramo,), duracion=tramo / 1000))
+            ms -= tramo
+
+    def duracion(self):
+        """Segundos estimados del programa completo (tiempo de placa)."""
+        return sum(p.duracion for p in self.pasos)
+
+    def codificar(self, programa):
+        """Carga de la trama PROGRAMA. Lanza ErrorProtocolo si no entra en una trama."""
+        carga = bytearray([programa & 0xFF])
+        for paso in self.pasos:
+            carga.append(paso.op)
+            carga += FORMATOS_OP[paso.op].pack(*paso.valores)
+        if len(carga) > pb.CARGA_MAXIMA:
+            raise pb.ErrorProtocolo(f"programa de {len(carga)} bytes (maximo {pb.CARGA_MAXIMA})")
+        return bytes(carga)
+
+    def __len__(self):
+        return len(self.pasos)
+
+
+def decodificar(carga):
+    """(programa, [(op, valores), ...]) de una carga. Lanza ErrorProtocolo si esta mal armada."""
+    if not carga:
+        raise pb.ErrorProtocolo("programa vacio")
+    operaciones = []
+    i = 1
+    while i < len(carga):
+        formato = FORMATOS_OP.get(carga[i])
+        if formato is None or i + 1 + formato.size > len(carga):
+            raise pb.ErrorProtocolo(f"operacion invalida en el byte {i}")
+        operaciones.append((carga[i], formato.unpack_from(carga, i + 1)))
+        i += 1 + formato.size
+    return carga[0], operaciones
@@ -0,0 +1,301 @@
+"""Protocolo binario con el STM32: tramas con largo, secuencia y CRC-16.
+
+Cada trama es:
+
+    A5 | largo | seq | tipo | carga (largo bytes) | CRC-16 (2 bytes)
+
+El CRC es CRC-16/CCITT-FALSE (polinomio 0x1021, inicio 0xFFFF, el mismo
+que binascii.crc_hqx) sobre largo, seq, tipo y carga, y los enteros van en
+little-endian como los guarda el Cortex-M4. 0xA5 no aparece en el texto
+ASCII del protocolo de lineas, asi que un mismo lector separa tramas
+binarias de lineas de texto.
+
+El host numera sus comandos en orden y la placa contesta cada uno con un
+ACK que repite ese numero. La placa recuerda cuales de los ultimos
+VENTANA_SEQ numeros ya ejecuto: un reenvio de uno de ellos se confirma como
+repetido sin ejecutarlo (el motor nunca se mueve dos veces) y uno que se
+habia perdido se ejecuta aunque ya hayan llegado otros posteriores. La
+placa numera sus propios avisos y un salto en la secuencia indica tramas
+perdidas.
+
+Las capas de arriba siguen viendo lineas: `codificar_comando("H1520", seq)`
+arma la trama de un comando y `aviso_como_linea` convierte un aviso de la
+placa en la linea de siempre ("#FIN,H", "#IN,e,s,a"...). La negociacion
+(texto `B` -> la placa contesta con una trama ID) esta en EnlaceSerialAsync.
+
+La trama PROGRAMA es la unica de largo variable: lleva una ruta entera
+(programa_placa.py) y la placa avisa el avance con tramas PROGRESO
+("#PRG,programa,paso,estado").
+"""
+import binascii
+import struct
+
+SYNC = 0xA5
+CABECERA = 4  # sync, largo, seq, tipo
+LARGO_CRC = 2
+CARGA_MAXIMA = 64
+# Bits de capacidades en el ID: la placa habla este protocolo / ejecuta programas
+CAPACIDAD_BINARIO = 0x01
+CAPACIDAD_PROGRAMAS = 0x02
+# Comando de texto que pide pasar a binario (la placa contesta con una trama ID)
+COMANDO_BINARIO = "B"
+# El while(1) manda los ACK entre mediciones de ultrasonido: puede tardar decenas de ms
+TIMEOUT_ACK = 0.25
+REINTENTOS_ACK = 2
+# Cuantos seq recientes recuerda la placa para no ejecutar dos veces un reenvio
+VENTANA_SEQ = 32
+
+# --- TIPOS: HOST -> PLACA ---
+MOVER_H = 0x01
+MOVER_V = 0x02
+MOVER_L = 0x03
+MOVER_R = 0x04
+SERVO = 0x05
+RESET_CONTADORES = 0x06
+IDENTIFICAR = 0x07
+PARADA = 0x08  # H0 + V0 + S65 en una sola trama
+PROGRAMA = 0x09  # carga de largo variable (programa_placa.py)
+
+# --- TIPOS: PLACA -> HOST ---
+ACK = 0x80
+FIN = 0x81
+EVENTO_IN = 0x82
+EVENTO_OUT = 0x83
+BOTON_STOP = 0x84
+ID = 0x85
+RST = 0x86
+PROGRESO = 0x87
+
+# Estados del ACK
+ACK_OK = 0
+ACK_REPETIDO = 1    # ya se habia ejecutado (se perdio el primer ACK)
+ACK_DESCONOCIDO = 2
+ACK_VIEJO = 3       # fuera de la ventana: no se ejecuto
+
+# Formato de la carga de cada tipo (struct, little-endian)
+FORMATOS = {
+    MOVER_H: struct.Struct("<i"), MOVER_V: struct.Struct("<i"),
+    MOVER_L: struct.Struct("<i"), MOVER_R: struct.Struct("<i"),
+    SERVO: struct.Struct("<H"),
+    RESET_CONTADORES: struct.Struct("<"), IDENTIFICAR: struct.Struct("<"), PARADA: struct.Struct("<"),
+    ACK: struct.Struct("<BB"),
+    FIN: struct.Struct("<c"),
+    EVENTO_IN: struct.Struct("<hhh"), EVENTO_OUT: struct.Struct("<hhh"),
+    BOTON_STOP: struct.Struct("<"),
+    ID: struct.Struct("<BB"),
+    RST: struct.Struct("<"),
+    PROGRESO: struct.Struct("<BBB"),
+}
+# Tipos cuya carga va entera, sin formato fijo: valores = (bytes,)
+LARGO_VARIABLE = {PROGRAMA}
+_NOMBRES_CAPACIDAD = ((CAPACIDAD_BINARIO, "BIN"), (CAPACIDAD_PROGRAMAS, "PRG"))
+
+_CABECERA = struct.Struct("<BBBB")
+_CRC = struct.Struct("<H")
+
+# Letra del protocolo de texto <-> tipo binario
+_COMANDOS = {"H": MOVER_H, "V": MOVER_V, "L": MOVER_L, "R": MOVER_R, "S": SERVO,
+             "C": RESET_CONTADORES, "I": IDENTIFICAR}
+_LETRAS = {tipo: letra for letra, tipo in _COMANDOS.items()}
+
+
+class ErrorProtocolo(ValueError):
+    pass
+
+
+class VentanaSeq:
+    """Seq ya ejecutados por la placa (la misma cuenta que main.c).
+
+    `registrar(seq)` devuelve ACK_OK si hay que ejecutarlo, ACK_REPETIDO si
+    ya se ejecuto o ACK_VIEJO si es anterior a la ventana.
+    """
+
+    def __init__(self):
+        self.ultimo = None
+        self.vistos = 0  # bit k: se ejecuto ultimo - k
+
+    def registrar(self, seq):
+        if self.ultimo is None:
+            self.ultimo, self.vistos = seq, 1
+            return ACK_OK
+        d = ((seq - self.ultimo + 128) & 0xFF) - 128
+        if d > 0:
+            self.vistos = ((self.vistos << d) | 1) & ((1 << VENTANA_SEQ) - 1)
+            self.ultimo = seq
+            return ACK_OK
+        if -d >= VENTANA_SEQ:
+            return ACK_VIEJO
+        if (self.vistos >> -d) & 1:
+            return ACK_REPETIDO
+        self.vistos |= 1 << -d
+        return ACK_OK
+
+
+def crc16(datos, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE de un objeto tipo bytes (acepta memoryview sin copiar)."""
+    return binascii.crc_hqx(datos, crc)
+
+
+def codificar(tipo, seq, *valores):
+    """Arma una trama completa con la carga de `valores` segun FORMATOS[tipo].
+
+    Para los tipos de LARGO_VARIABLE `valores` es la carga ya armada (bytes).
+    """
+    if tipo in LARGO_VARIABLE:
+        (carga,) = valores
+        largo = len(carga)
+        if largo > CARGA_MAXIMA:
+            raise ErrorProtocolo(f"carga de {largo} bytes (maximo {CARGA_MAXIMA})")
+    else:
+        formato = FORMATOS[tipo]
+        largo = formato.size
+    trama = bytearray(CABECERA + largo + LARGO_CRC)
+    _CABECERA.pack_into(trama, 0, SYNC, largo, seq & 0xFF, tipo)
+    if tipo in LARGO_VARIABLE:
+        trama[CABECERA:CABECERA + largo] = carga
+    else:
+        formato.pack_into(trama, CABECERA, *valores)
+    _CRC.pack_into(trama, CABECERA + largo, crc16(memoryview(trama)[1:CABECERA + largo]))
+    return bytes(trama)
+
+
+def codificar_comando(cmd, seq):
+    """Trama de un comando del protocolo de texto ("H1520", "S65", "C"...)."""
+    letra = cmd[:1].upper()
+    tipo = _COMANDOS.get(letra)
+    if tipo is None:
+        raise ErrorProtocolo(f"comando sin equivalente binario: {cmd!r}")
+    if FORMATOS[tipo].size == 0:
+        return codificar(tipo, seq)
+    try:
+        valor = int(cmd[1:])
+    except ValueError:
+        raise ErrorProtocolo(f"valor invalido en {cmd!r}") from None
+    if tipo == SERVO:
+        valor &= 0xFFFF  # el firmware lo recibe como uint16_t
+    return codificar(tipo, seq, valor)
+
+
+def comando_como_linea(tipo, valores):
+    """Comando recibido por la placa en el formato de texto (para el emulador)."""
+    if tipo == PARADA:
+        return None
+    letra = _LETRAS.get(tipo)
+    if letra is None:
+        return None
+    return letra + (str(valores[0]) if valores else "")
+
+
+def codificar_aviso(linea, seq):
+    """Trama de un aviso de la placa a partir de su linea de texto (emulador)."""
+    if linea.startswith("#FIN,"):
+        return codificar(FIN, seq, linea[5:6].encode("ascii"))
+    if linea.startswith(("#IN,", "#OUT,")):
+        tipo, *contadores = linea[1:].split(",")
+        return codificar(EVENTO_IN if tipo == "IN" else EVENTO_OUT, seq, *(int(c) for c in contadores))
+    if linea == "#STOP":
+        return codificar(BOTON_STOP, seq)
+    if linea == "#RST":
+        return codificar(RST, seq)
+    if linea.startswith("#PRG,"):
+        return codificar(PROGRESO, seq, *(int(v) for v in linea[5:].split(",")))
+    if linea.startswith("#ID,CANICAS,"):
+        _, _, version, *nombres = linea.split(",")
+        capacidades = CAPACIDAD_BINARIO
+        for bit, nombre in _NOMBRES_CAPACIDAD:
+            if nombre in nombres:
+                capacidades |= bit
+        return codificar(ID, seq, int(version), capacidades)
+    raise ErrorProtocolo(f"aviso sin equivalente binario: {linea!r}")
+
+
+def aviso_como_linea(tipo, valores):
+    """Linea de texto equivalente a un aviso binario de la placa (o None)."""
+    if tipo == FIN:
+        return f"#FIN,{valores[0].decode('ascii', errors='replace')}"
+    if tipo in (EVENTO_IN, EVENTO_OUT):
+        return f"#{'IN' if tipo == EVENTO_IN else 'OUT'},{valores[0]},{valores[1]},{valores[2]}"
+    if tipo == BOTON_STOP:
+        return "#STOP"
+    if tipo == RST:
+        return "#RST"
+    if tipo == PROGRESO:
+        return f"#PRG,{valores[0]},{valores[1]},{valores[2]}"
+    if tipo == ID:
+        nombres = [nombre for bit, nombre in _NOMBRES_CAPACIDAD if valores[1] & bit]
+        return ",".join(["#ID,CANICAS", str(valores[0])] + nombres)
+    return None
+
+
+class DecodificadorTramas:
+    """Separa tramas binarias y lineas de texto de lo que va llegando.
+
+    `agregar(datos)` devuelve una lista con tuplas (seq, tipo, valores) para
+    cada trama valida y cadenas para cada linea de texto completa. Las
+    tramas se leen con struct.unpack_from sobre el buffer (sin copiar la
+    carga); si el CRC no coincide se descarta el byte de sync y se busca el
+    proximo.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.errores_crc = 0
+        self.descartados = 0  # bytes que no eran ni trama ni texto
+
+    def agregar(self, datos):
+        buf = self._buffer
+        buf += datos
+        salida = []
+        vista = memoryview(buf)
+        i = 0
+        n = len(buf)
+        try:
+            while i < n:
+                if buf[i] != SYNC:
+                    if not 0x20 <= buf[i] < 0x7F and buf[i] not in b"\r\n":
+                        # Resto de una trama rota: una linea nunca empieza asi
+                        self.descartados += 1
+                        i += 1
+                        continue
+                    # Texto: hasta el '\n' o hasta el proximo sync
+                    fin = buf.find(b"\n", i)
+                    sync = buf.find(SYNC, i)
+                    if fin < 0 or (0 <= sync < fin):
+                        if sync < 0:
+                            break  # linea incompleta: esperar mas bytes
+                        self.descartados += sync - i
+                        i = sync
+                        continue
+                    texto = bytes(vista[i:fin]).decode("utf-8", errors="ignore").strip()
+                    if texto:
+                        salida.append(texto)
+                    i = fin + 1
+                    continue
+
+                if n - i < CABECERA:
+                    break
+                _, largo, seq, tipo = _CABECERA.unpack_from(buf, i)
+                formato = FORMATOS.get(tipo)
+                variable = tipo in LARGO_VARIABLE
+                if largo > CARGA_MAXIMA or (formato is not None and formato.size != largo):
+                    self.errores_crc += 1
+                    i += 1
+                    continue
+                total = CABECERA + largo + LARGO_CRC
+                if n - i < total:
+                    break
+                (crc,) = _CRC.unpack_from(buf, i + CABECERA + largo)
+                if crc != crc16(vista[i + 1:i + CABECERA + largo]) or (formato is None and not variable):
+                    self.errores_crc += 1
+                    i += 1
+                    continue
+                if variable:
+                    valores = (bytes(vista[i + CABECERA:i + CABECERA + largo]),)
+                else:
+                    valores = formato.unpack_from(buf, i + CABECERA)
+                salida.append((seq, tipo, valores))
+                i += total
+        finally:
+            vista.release()
+        del buf[:i]
+        return salida
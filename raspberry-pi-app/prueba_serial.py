@@ -1,58 +1,185 @@
-import serial
+"""Prueba de comandos del STM32 por el puerto serie.
+
+Abre el puerto una sola vez y lo deja abierto (reabrirlo por cada comando
+puede reiniciar el enlace USB de la Nucleo). Dos modos:
+
+    python3 prueba_serial.py                          # interactivo
+    python3 prueba_serial.py --lote comandos.txt      # lote desde archivo
+    cat comandos.txt | python3 prueba_serial.py --lote - --esperar-fin
+
+En el lote va un comando por linea. Las lineas vacias y las que empiezan con
+'#' se ignoran, y `ESPERA <segundos>` hace una pausa. Con --esperar-fin cada
+movimiento espera su #FIN (C espera #RST, I espera #ID) antes del siguiente.
+Por cada comando se imprime el tiempo de ida y vuelta, y al final un resumen.
+"""
+import argparse
+import statistics
+import sys
 import time
 
-# --- CONFIGURACIÓN SERIAL ---
-# 1. Identificamos el puerto correcto para la Raspberry Pi
-PORT_NAME = '/dev/ttyACM0' 
-# 2. Usamos la misma velocidad que configuraste en el STM32
-BAUD_RATE = 115200 
-
-def enviar_comando(comando):
-    """Envía un comando serial al STM32."""
-    
-    # CRÍTICO: El comando debe terminar en '\n'
-    mensaje = comando.strip() + '\n'
-    
+import serial
+
+from config_canicas import PORT_NAME, BAUD_RATE, BAUDIOS_RAPIDOS, MARGEN_FIN, TIMEOUT_SONDA
+from enlace_serial import DivisorTramas, buscar_placa
+from modelo_tiempos import MODELO
+
+
+def respuesta_esperada(comando):
+    """(prefijo de la respuesta, timeout) para un comando, o None si no contesta."""
+    letra = comando[:1].upper()
     try:
-        # Abrir el puerto serial
-        ser = serial.Serial(PORT_NAME, BAUD_RATE, timeout=0.1)
-        
-        # Esperar un momento para que la conexión se estabilice
-        time.sleep(0.1) 
-        
-        # Enviar el comando codificado en bytes (UTF-8)
-        ser.write(mensaje.encode('utf-8'))
-        print(f"✅ Enviado: {comando.strip()}")
-        
-        # Cerrar el puerto
-        ser.close()
+        valor = int(comando[1:] or 0)
+    except ValueError:
+        valor = 0
+    if letra == "H" and valor != 0:
+        return "#FIN,H", MODELO.duracion("H", valor) + MARGEN_FIN
+    if letra in ("V", "L", "R") and valor != 0:
+        return "#FIN,V", MODELO.duracion("V", valor) + MARGEN_FIN
+    if letra == "C":
+        return "#RST", 1.0
+    if letra == "I":
+        return "#ID,", 1.0
+    return None
 
-    except serial.SerialException as e:
-        print(f"❌ Error de conexión serial: {e}")
-        print("Asegúrate de que el STM32 esté conectado y que el puerto no esté abierto en otra aplicación.")
-    except Exception as e:
-        print(f"❌ Ocurrió un error: {e}")
 
+class Sesion:
+    """Conexion abierta con la placa y las mediciones de cada comando."""
 
-# --- BUCLE DE PRUEBA INTERACTIVO ---
-print("--- TEST DE COMANDOS STM32 ---")
-print("Protocolo:")
-print("  - Motores: H[pasos] o V[pasos]. Ej: H4096, V-2000")
-print("  - Servo:   S[angulo]. Ej: S45, S0, S90")
-print(" CUIDADO: Si el servo esta en la estructura, moverlo entre 25 y 65 grados")
+    def __init__(self, ser, silencioso=False):
+        self.ser = ser
+        self.silencioso = silencioso
+        self.divisor = DivisorTramas()
+        self.tiempos = []     # segundos de ida y vuelta (comandos con respuesta)
+        self.escrituras = []  # segundos de escritura (comandos sin respuesta)
+        self.sin_respuesta = 0
+        self.errores = 0
 
-while True:
-    try:
-        # Usamos input() para capturar el comando
-        comando = input("Comando a enviar (o 'q' para salir): ").strip()
-        
+    def enviar(self, comando, esperar_fin=False):
+        esperado = respuesta_esperada(comando) if esperar_fin else None
+        inicio = time.perf_counter()
+        try:
+            self.ser.write((comando + "\n").encode("utf-8"))
+        except serial.SerialException as e:
+            self.errores += 1
+            print(f"❌ Error de conexión serial: {e}")
+            return False
+
+        respuesta = self._esperar(*esperado) if esperado else None
+        rtt = time.perf_counter() - inicio
+        if esperado and respuesta is None:
+            self.sin_respuesta += 1
+            print(f"⚠️  {comando}: sin {esperado[0]} en {esperado[1]:.1f} s")
+            return True
+
+        (self.tiempos if esperado else self.escrituras).append(rtt)
+        if not self.silencioso:
+            detalle = f" <- {respuesta}" if respuesta else ""
+            print(f"✅ {comando}{detalle} ({rtt * 1000:.1f} ms)")
+        return True
+
+    def _esperar(self, prefijo, timeout):
+        limite = time.perf_counter() + timeout
+        while time.perf_counter() < limite:
+            datos = self.ser.read(max(1, self.ser.in_waiting))
+            for linea in self.divisor.agregar(datos):
+                if linea.startswith(prefijo):
+                    return linea
+                if not self.silencioso:
+                    print(f"   RX: {linea}")
+        return None
+
+    def resumen(self, duracion):
+        total = len(self.tiempos) + len(self.escrituras) + self.sin_respuesta
+        print(f"--- {total} comandos en {duracion:.2f} s ({total / duracion if duracion else 0:.1f} cmd/s) ---")
+        for nombre, tiempos in (("Ida y vuelta", self.tiempos), ("Escritura", self.escrituras)):
+            if not tiempos:
+                continue
+            ms = sorted(t * 1000 for t in tiempos)
+            p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+            print(f"{nombre}: media {statistics.mean(ms):.2f} ms | p50 {statistics.median(ms):.2f} ms"
+                  f" | p95 {p95:.2f} ms | max {ms[-1]:.2f} ms (n={len(ms)})")
+        if self.sin_respuesta or self.errores:
+            print(f"Sin respuesta: {self.sin_respuesta} | Errores: {self.errores}")
+
+
+def correr_lote(sesion, lineas, esperar_fin):
+    for linea in lineas:
+        linea = linea.strip()
+        if not linea or linea.startswith("#"):
+            continue
+        partes = linea.split()
+        if partes[0].upper() == "ESPERA":
+            time.sleep(float(partes[1]))
+            continue
+        if not sesion.enviar(linea, esperar_fin):
+            break
+
+
+def correr_interactivo(sesion, esperar_fin):
+    print("--- TEST DE COMANDOS STM32 ---")
+    print("Protocolo:")
+    print("  - Motores: H[pasos] o V[pasos]. Ej: H4096, V-2000")
+    print("  - Servo:   S[angulo]. Ej: S45, S0, S90")
+    print(" CUIDADO: Si el servo esta en la estructura, moverlo entre 25 y 65 grados")
+    while True:
+        try:
+            comando = input("Comando a enviar (o 'q' para salir): ").strip()
+        except (KeyboardInterrupt, EOFError):
+            break
         if comando.lower() == 'q':
             break
-        
         if comando:
-            enviar_comando(comando)
-            
+            sesion.enviar(comando, esperar_fin)
+
+
+def conectar(puerto, emulador):
+    if emulador:
+        from emulador_stm32 import EmuladorSTM32
+        emu = EmuladorSTM32()
+        puerto = emu.iniciar()
+    encontrado = buscar_placa(puerto, BAUD_RATE, TIMEOUT_SONDA, buscar=False, alternativas=BAUDIOS_RAPIDOS)
+    if encontrado:
+        print(f"Conectado a {encontrado[1]} (protocolo {encontrado[2]})")
+        return encontrado[0]
+    # Firmware sin el comando I: abrir igual
+    ser = serial.Serial(puerto, BAUD_RATE, timeout=0.1)
+    print(f"Conectado a {puerto} (sin respuesta a la sonda)")
+    return ser
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--puerto", default=PORT_NAME)
+    parser.add_argument("--emulador", action="store_true", help="usar emulador_stm32 en lugar de la placa")
+    parser.add_argument("--lote", metavar="ARCHIVO", help="archivo de comandos ('-' = stdin)")
+    parser.add_argument("--esperar-fin", action="store_true", help="esperar la respuesta de cada comando")
+    parser.add_argument("-q", "--silencioso", action="store_true", help="solo imprimir el resumen")
+    args = parser.parse_args()
+
+    try:
+        ser = conectar(args.puerto, args.emulador)
+    except serial.SerialException as e:
+        print(f"❌ Error de conexión serial: {e}")
+        print("Asegúrate de que el STM32 esté conectado y que el puerto no esté abierto en otra aplicación.")
+        return 1
+
+    sesion = Sesion(ser, args.silencioso)
+    inicio = time.perf_counter()
+    try:
+        if args.lote:
+            archivo = sys.stdin if args.lote == "-" else open(args.lote)
+            with archivo:
+                correr_lote(sesion, archivo, args.esperar_fin)
+        else:
+            correr_interactivo(sesion, args.esperar_fin)
     except KeyboardInterrupt:
-        break
-    
-print("Prueba finalizada.")
\ No newline at end of file
+        pass
+    finally:
+        ser.close()
+    sesion.resumen(time.perf_counter() - inicio)
+    print("Prueba finalizada.")
+    return 0 if not (sesion.errores or sesion.sin_respuesta) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Puente hacia el hilo de Tk para llamadas que vienen de otros hilos.
+
+Las llamadas se encolan y se despierta a Tk escribiendo un byte en un pipe
+registrado con createfilehandler: el mainloop de Tk lo atiende como
+cualquier otro evento, sin sondeo. Donde Tk no tiene createfilehandler
+(Windows) se usa root.after.
+
+El pipe se escribe una vez por tanda (no por llamada) y la cola se vacia a
+lo sumo `fps` veces por segundo: en una rafaga de tramas Tk recibe un solo
+aviso por cuadro. Las actualizaciones que solo muestran el ultimo estado
+(contador, posicion) van con `llamar_ultimo`, que conserva solo la ultima
+llamada de cada clave hasta el proximo cuadro.
+"""
+import collections
+import os
+import time
+import tkinter as tk
+
+from config_canicas import FPS_INTERFAZ
+
+
+class PuenteTk:
+    def __init__(self, root, fps=FPS_INTERFAZ):
+        self.root = root
+        self.periodo = 1.0 / fps
+        self._pendientes = collections.deque()
+        self._ultimos = {}  # clave -> (fn, args); se pisan hasta el proximo cuadro
+        self._despierto = False
+        self._cuadro_agendado = False
+        self._proximo_cuadro = 0.0
+        self._lectura = self._escritura = None
+        if hasattr(root.tk, "createfilehandler"):
+            self._lectura, self._escritura = os.pipe()
+            os.set_blocking(self._lectura, False)
+            os.set_blocking(self._escritura, False)
+            root.tk.createfilehandler(self._lectura, tk.READABLE, self._drenar)
+
+    def llamar(self, fn, *args):
+        """Agenda `fn(*args)` en el hilo de Tk desde cualquier hilo."""
+        self._pendientes.append((fn, args))
+        self._despertar()
+
+    def llamar_ultimo(self, fn, *args, clave=None):
+        """Como `llamar`, pero si ya hay una llamada con la misma `clave`
+        (por defecto `fn`) esperando el cuadro, solo queda la nueva."""
+        self._ultimos[fn if clave is None else clave] = (fn, args)
+        self._despertar()
+
+    def _despertar(self):
+        # Un solo aviso por tanda: el que vacia la cola vuelve a bajar la bandera
+        if self._despierto:
+            return
+        self._despierto = True
+        if self._escritura is None:
+            self.root.after(0, self._drenar, None, None)
+            return
+        try:
+            os.write(self._escritura, b"\0")
+        except BlockingIOError:
+            pass  # pipe lleno: Tk ya tiene un aviso pendiente
+
+    def _drenar(self, fd, mascara):
+        if fd is not None:
+            try:
+                while os.read(fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+        if self._cuadro_agendado:
+            return
+        restante = self._proximo_cuadro - time.monotonic()
+        if restante > 0:
+            # Ya hubo un cuadro hace menos de `periodo`: se junta con el siguiente
+            self._cuadro_agendado = True
+            self.root.after(max(1, round(restante * 1000)), self._cuadro)
+        else:
+            self._cuadro()
+
+    def _cuadro(self):
+        self._cuadro_agendado = False
+        self._despierto = False
+        self._proximo_cuadro = time.monotonic() + self.periodo
+        while self._pendientes:
+            fn, args = self._pendientes.popleft()
+            self._ejecutar(fn, args)
+        while self._ultimos:
+            try:
+                _, (fn, args) = self._ultimos.popitem()
+            except KeyError:
+                break
+            self._ejecutar(fn, args)
+
+    def _ejecutar(self, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Error en llamada a la GUI: {e!r}")
@@ -0,0 +1,92 @@
+"""Registro de tramas del puerto serie con marca de tiempo en nanosegundos.
+
+Cada anotacion es una tupla (time.monotonic_ns(), tipo, texto) que se agrega
+a un anillo en memoria (un deque con tope: nunca bloquea ni crece). Si hay
+archivo, un hilo lo vacia a disco cada `intervalo` segundos; si el disco se
+atrasa, el anillo pisa las anotaciones mas viejas y las cuenta como perdidas.
+
+Tipos que se anotan:
+  TX      comando normal escrito en el puerto
+  TXP     tramas de frenado escritas por el carril de STOP
+  PARADA  se pidio un STOP (antes de pasar al loop)
+  RX      trama recibida de la placa
+  UI      la interfaz mostro un cambio (texto: "contador" o "posicion")
+
+El archivo tiene una anotacion por linea, "t_ns TIPO texto", y se analiza con
+analizar_registro.py.
+"""
+import collections
+import itertools
+import threading
+import time
+
+CAPACIDAD_REGISTRO = 65536
+
+
+class RegistroSerial:
+    def __init__(self, archivo=None, capacidad=CAPACIDAD_REGISTRO, intervalo=0.5):
+        self.archivo = archivo
+        self.intervalo = intervalo
+        self._anillo = collections.deque(maxlen=capacidad)
+        # Contadores atomicos bajo el GIL: anotar no toma ningun lock
+        self._anotados = itertools.count()
+        self._n_anotados = 0
+        self.escritos = 0
+        self._detener = threading.Event()
+        self._hilo = None
+        self._salida = None
+        if archivo:
+            self._salida = open(archivo, "a", encoding="utf-8")
+            self._hilo = threading.Thread(target=self._bucle, daemon=True)
+            self._hilo.start()
+
+    def anotar(self, tipo, texto=""):
+        """Agrega una anotacion. Se puede llamar desde cualquier hilo."""
+        self._anillo.append((time.monotonic_ns(), tipo, texto))
+        self._n_anotados = next(self._anotados) + 1
+
+    @property
+    def perdidos(self):
+        """Anotaciones que el anillo piso antes de llegar al archivo."""
+        if not self._salida:
+            return 0
+        return max(0, self._n_anotados - self.escritos - len(self._anillo))
+
+    def recientes(self):
+        """Copia de lo que hay en el anillo (lo ultimo anotado sin escribir)."""
+        return list(self._anillo)
+
+    def volcar(self, archivo):
+        """Escribe el contenido actual del anillo (uso sin hilo de fondo)."""
+        with open(archivo, "w", encoding="utf-8") as f:
+            for t, tipo, texto in self.recientes():
+                f.write(f"{t} {tipo} {texto}\n")
+
+    def cerrar(self):
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=2.0)
+        if self._salida:
+            self._vaciar()
+            self._salida.close()
+            self._salida = None
+
+    def _bucle(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self._vaciar()
+            except OSError as e:
+                print(f"Error escribiendo el registro serial: {e}")
+
+    def _vaciar(self):
+        lineas = []
+        try:
+            while True:
+                t, tipo, texto = self._anillo.popleft()
+                lineas.append(f"{t} {tipo} {texto}\n")
+        except IndexError:
+            pass
+        if lineas:
+            self._salida.writelines(lineas)
+            self._salida.flush()
+            self.escritos += len(lineas)
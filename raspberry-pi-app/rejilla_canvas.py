@@ -0,0 +1,101 @@
+"""Rejilla de zonas dibujada en un solo Canvas, con el carro animado.
+
+Antes eran 13 Labels y cada cambio de posicion reconfiguraba los 13. Aca
+cada zona es un rectangulo del Canvas y `marcar` solo recolorea la zona que
+se apaga y la que se enciende. El carro es un circulo que se mueve entre
+celdas con RastreadorPosicion.estimar(): mientras hay un trayecto se
+redibuja a lo sumo FPS_ANIMACION veces por segundo (y solo si se movio al
+menos un pixel); sin trayecto no queda ningun timer corriendo.
+"""
+import tkinter as tk
+
+from compilador_movimientos import MAPA_COORDS, FILA_DESTINO
+from config_canicas import FPS_ANIMACION
+
+FONDO = "#0f172a"
+COLOR_ORIGEN = "#3b82f6"
+COLOR_DESTINO = "#10b981"
+COLOR_CELDA = "#475569"
+COLOR_ACTUAL = "#f59e0b"
+COLOR_CARRO = "#facc15"
+
+ANCHO_CELDA = 96
+ALTO_CELDA = 56
+SEPARACION = 20
+RADIO_CARRO = 12
+
+
+def color_base(zona):
+    if str(zona).startswith("S"):
+        return COLOR_ORIGEN
+    return COLOR_DESTINO if zona == "Destino" else COLOR_CELDA
+
+
+def centro(fila, columna):
+    """Pixel del centro de la celda (fila, columna); acepta decimales."""
+    x = SEPARACION + columna * (ANCHO_CELDA + SEPARACION) + ANCHO_CELDA / 2
+    y = SEPARACION + fila * (ALTO_CELDA + SEPARACION) + ALTO_CELDA / 2
+    return x, y
+
+
+class RejillaCanvas(tk.Canvas):
+    """Zonas S1..S3, 1..9 y Destino; `posicion` es el RastreadorPosicion del controlador."""
+
+    def __init__(self, padre, posicion, fps=FPS_ANIMACION):
+        ancho = SEPARACION + 3 * (ANCHO_CELDA + SEPARACION)
+        alto = SEPARACION + (FILA_DESTINO + 1) * (ALTO_CELDA + SEPARACION)
+        super().__init__(padre, width=ancho, height=alto, bg=FONDO, highlightthickness=0)
+        self.posicion = posicion
+        self.periodo_ms = max(1, round(1000 / fps))
+        self._celdas = {}  # zona -> id del rectangulo
+        self._marcada = None
+        self._xy_carro = None
+        self._cuadro_pendiente = None
+
+        for zona, (fila, columna) in MAPA_COORDS.items():
+            # Destino ocupa las tres columnas
+            izquierda, derecha = (0, 2) if zona == "Destino" else (columna, columna)
+            x0, y = centro(fila, izquierda)
+            x1, _ = centro(fila, derecha)
+            x0, x1 = x0 - ANCHO_CELDA / 2, x1 + ANCHO_CELDA / 2
+            y0, y1 = y - ALTO_CELDA / 2, y + ALTO_CELDA / 2
+            self._celdas[zona] = self.create_rectangle(x0, y0, x1, y1, fill=color_base(zona), outline="#94a3b8", width=2)
+            self.create_text((x0 + x1) / 2, (y0 + y1) / 2, text=str(zona), fill="white", font=("Arial", 12, "bold"))
+        self._carro = self.create_oval(0, 0, 0, 0, outline=COLOR_CARRO, width=3)
+
+        self.marcar(posicion.zona)
+        self.animar()
+
+    def marcar(self, zona):
+        """Resalta la zona actual. Solo toca los rectangulos que cambian."""
+        if zona == self._marcada:
+            return
+        if self._marcada in self._celdas:
+            self.itemconfig(self._celdas[self._marcada], fill=color_base(self._marcada))
+        if zona in self._celdas:
+            self.itemconfig(self._celdas[zona], fill=COLOR_ACTUAL)
+        self._marcada = zona
+
+    def animar(self):
+        """Dibuja el carro y, si hay un trayecto en curso, sigue hasta que termine."""
+        if self._cuadro_pendiente is None:
+            self._cuadro()
+
+    def _cuadro(self):
+        self._cuadro_pendiente = None
+        self._mover_carro(*self.posicion.estimar())
+        if self.posicion.trayecto is not None:
+            self._cuadro_pendiente = self.after(self.periodo_ms, self._cuadro)
+
+    def _mover_carro(self, fila, columna):
+        x, y = centro(fila, columna)
+        if self._xy_carro and abs(x - self._xy_carro[0]) < 1 and abs(y - self._xy_carro[1]) < 1:
+            return
+        self._xy_carro = (x, y)
+        self.coords(self._carro, x - RADIO_CARRO, y - RADIO_CARRO, x + RADIO_CARRO, y + RADIO_CARRO)
+
+    def destroy(self):
+        if self._cuadro_pendiente is not None:
+            self.after_cancel(self._cuadro_pendiente)
+            self._cuadro_pendiente = None
+        super().destroy()
@@ -0,0 +1,109 @@
+"""Reloj inyectable: tiempo real o virtual.
+
+El controlador y el enlace toman el tiempo del loop de asyncio
+(loop.time() y asyncio.sleep), asi que alcanza con cambiar el loop:
+RelojReal da el loop de siempre y RelojVirtual uno cuyo tiempo no corre solo.
+
+  * automatico (por defecto): cuando el loop no tiene nada listo salta
+    directo al proximo timer. Una hora de produccion se simula en lo que
+    tarda el CPU en procesar los eventos.
+  * manual: el tiempo solo corre con `avanzar(segundos)`, que libera en el
+    acto todas las esperas que vencen (pruebas paso a paso).
+
+Con reloj virtual la placa tiene que vivir en el mismo loop
+(EmuladorSTM32.conectar_loop): un puerto real no espera al reloj.
+"""
+import asyncio
+import selectors
+import threading
+import time
+
+
+class RelojReal:
+    virtual = False
+
+    def ahora(self):
+        return time.monotonic()
+
+    def dormir(self, segundos):
+        time.sleep(segundos)
+
+    def nuevo_loop(self):
+        return asyncio.new_event_loop()
+
+
+class RelojVirtual:
+    virtual = True
+
+    def __init__(self, inicio=0.0, automatico=True):
+        self.t = inicio
+        self.automatico = automatico
+        self._cambio = threading.Condition()
+        self._loops = []
+
+    def ahora(self):
+        return self.t
+
+    def avanzar(self, segundos):
+        """Adelanta el reloj y despierta a todo lo que esperaba hasta ese instante."""
+        self._avanzar_hasta(self.t + segundos)
+
+    def dormir(self, segundos):
+        """Espera bloqueante para hilos. En modo automatico adelanta el reloj."""
+        limite = self.t + segundos
+        if self.automatico:
+            self._avanzar_hasta(limite)
+            return
+        with self._cambio:
+            self._cambio.wait_for(lambda: self.t >= limite)
+
+    def nuevo_loop(self):
+        loop = BucleVirtual(self)
+        self._loops.append(loop)
+        return loop
+
+    def _avanzar_hasta(self, t, despertar=True):
+        with self._cambio:
+            if t <= self.t:
+                return
+            self.t = t
+            self._cambio.notify_all()
+        # Los loops bloqueados en select vuelven a mirar sus timers
+        if despertar:
+            for loop in self._loops:
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(_nada)
+
+
+def _nada():
+    pass
+
+
+class SelectorVirtual(selectors.DefaultSelector):
+    """Selector que, sin nada listo, mueve el reloj virtual en vez de dormir."""
+
+    def __init__(self, reloj):
+        super().__init__()
+        self.reloj = reloj
+
+    def select(self, timeout=None):
+        listos = super().select(0)
+        if listos or timeout == 0:
+            return listos
+        if self.reloj.automatico and timeout is not None:
+            self.reloj._avanzar_hasta(self.reloj.t + timeout, despertar=False)
+            return []
+        # Manual (o sin timers): esperar I/O o un avanzar() desde otro hilo
+        return super().select(None)
+
+
+class BucleVirtual(asyncio.SelectorEventLoop):
+    def __init__(self, reloj):
+        super().__init__(SelectorVirtual(reloj))
+        self.reloj = reloj
+
+    def time(self):
+        return self.reloj.t
+
+
+RELOJ_REAL = RelojReal()
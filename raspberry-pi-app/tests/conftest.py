@@ -0,0 +1,18 @@
+"""Configuracion de pytest: los modulos de la app estan sueltos en raspberry-pi-app/."""
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo_tiempos import MODELO  # noqa: E402
+
+
+@pytest.fixture
+def modelo():
+    """El MODELO compartido, restaurado al terminar la prueba."""
+    guardado = copy.deepcopy({k: v for k, v in vars(MODELO).items() if k != "_lock"})
+    yield MODELO
+    vars(MODELO).update(guardado)
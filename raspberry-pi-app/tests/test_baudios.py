@@ -0,0 +1,72 @@
+import asyncio
+
+import protocolo_binario as pb
+from emulador_stm32 import BAUDIOS_BASE, VENTANA_BAUDIOS, EmuladorSTM32
+from nucleo_async import EnlaceSerialAsync
+from reloj import RelojVirtual
+
+TIMEOUT = 0.5
+
+
+def correr(prueba, emulador=None):
+    """Corre `prueba(emu, enlace)` con la placa emulada en el mismo loop, en tiempo virtual."""
+    emu = emulador or EmuladorSTM32()
+    loop = RelojVirtual().nuevo_loop()
+
+    async def principal():
+        ser = await emu.conectar_loop(BAUDIOS_BASE)
+        enlace = EnlaceSerialAsync(ser, lambda linea: None, BAUDIOS_BASE, mostrar_tx=False)
+        await enlace.iniciar()
+        try:
+            return await prueba(emu, enlace)
+        finally:
+            enlace.detener()
+            emu.detener()
+            ser.close()
+
+    try:
+        return loop.run_until_complete(principal())
+    finally:
+        loop.close()
+
+
+def test_negociacion_exitosa():
+    async def prueba(emu, enlace):
+        assert await enlace.negociar_baudios((921600,), TIMEOUT, VENTANA_BAUDIOS) == 921600
+        # Confirmada con U0: pasada la ventana la placa no vuelve atras
+        await asyncio.sleep(2 * VENTANA_BAUDIOS)
+        assert emu.baudios == enlace.baudios == 921600
+        assert await enlace._pedir("T" + "UUUU1234", "#T,", TIMEOUT) == "#T,UUUU1234"
+    correr(prueba)
+
+
+def test_patron_que_no_vuelve_igual_descarta_la_velocidad():
+    # A 921600 el enlace emulado corrompe los bytes: el eco del patron no coincide
+    async def prueba(emu, enlace):
+        assert await enlace.negociar_baudios((921600, 460800), TIMEOUT, VENTANA_BAUDIOS) == 460800
+        assert emu.baudios == 460800
+    correr(prueba, EmuladorSTM32(baudios_max=460800))
+
+
+def test_sin_confirmacion_la_placa_vuelve_a_la_base():
+    async def prueba(emu, enlace):
+        assert await enlace._pedir("U460800", "#BAUD,", TIMEOUT) == "#BAUD,460800"
+        assert emu.baudios == 460800
+        # Sin U0 dentro de la ventana
+        await asyncio.sleep(VENTANA_BAUDIOS + 0.1)
+        assert emu.baudios == BAUDIOS_BASE
+    correr(prueba)
+
+
+def test_volver_a_la_base_en_binario_sigue_leyendo_tramas():
+    async def prueba(emu, enlace):
+        assert await enlace.negociar_binario(TIMEOUT)
+        assert await enlace.negociar_baudios((921600,), TIMEOUT, VENTANA_BAUDIOS) == 921600
+        # Lo que hace ControladorCanicas.cerrar
+        assert await enlace.negociar_baudios((BAUDIOS_BASE,), TIMEOUT, VENTANA_BAUDIOS) == BAUDIOS_BASE
+        assert isinstance(enlace.divisor, pb.DecodificadorTramas)
+        enlace.enviar("S65")
+        await asyncio.sleep(pb.TIMEOUT_ACK * (pb.REINTENTOS_ACK + 1))
+        assert not enlace._sin_ack
+        assert enlace.perdidos_tx == 0 and enlace.reenvios == 0
+    correr(prueba)
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from controlador_canicas import cargar_cola, guardar_cola
+
+
+def escribir(tmp_path, datos):
+    archivo = tmp_path / "cola.json"
+    archivo.write_text(json.dumps(datos))
+    return str(archivo)
+
+
+def test_guardar_y_cargar(tmp_path):
+    rutas = [{"origen": "S1", "camino": [1, 4, 7, "Destino"]},
+             {"origen": "S3", "camino": [3, 6, 5, 8, "Destino"]}]
+    archivo = str(tmp_path / "cola.json")
+    guardar_cola(rutas, archivo)
+    assert cargar_cola(archivo) == rutas
+    guardada = json.loads(open(archivo).read())["rutas"][0]
+    assert guardada["comandos"] and guardada["segundos"] > 0
+
+
+@pytest.mark.parametrize("datos", [
+    {"rutas": [{"origen": "S1", "camino": [1, 4, 1, 4, 7, "Destino"]}]},  # sube
+    {"rutas": [{"origen": "S1", "camino": [4, 7, "Destino"]}]},           # salta una fila
+    {"rutas": [{"origen": "Destino", "camino": ["Destino"]}]},
+    {"rutas": [{"origen": "S1", "camino": [1, 4, 7]}]},
+    {"rutas": [{"origen": "S1", "camino": [[1], "Destino"]}]},            # no hasheable
+    {"rutas": [{"origen": "S1", "camino": ["x", "Destino"]}]},
+    {"rutas": [{"origen": "S1"}]},
+    {"rutas": ["S1"]},
+    {"rutas": [None]},
+    {"rutas": {}},
+    [1, 2],
+])
+def test_cola_invalida(tmp_path, datos):
+    with pytest.raises(ValueError):
+        cargar_cola(escribir(tmp_path, datos))
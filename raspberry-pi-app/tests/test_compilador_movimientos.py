@@ -0,0 +1,64 @@
+import pytest
+
+from compilador_movimientos import (
+    SegmentoCombinado, compilar_camino, planificar, planificar_retorno, validar_movimiento,
+)
+from config_canicas import STEPS_H, STEPS_V
+
+
+def test_bajada_en_una_columna_es_un_solo_comando():
+    segmentos = compilar_camino("S1", [1, 4, 7, "Destino"])
+    assert [seg.comando for seg in segmentos] == [f"V-{4 * STEPS_V}"]
+    assert [zona for zona, _ in segmentos[0].recorrido] == [1, 4, 7, "Destino"]
+
+
+def test_cambio_de_sentido_abre_otro_segmento():
+    segmentos = compilar_camino("S1", [1, 2, 3, 6, 9, "Destino"])
+    assert [seg.comando for seg in segmentos] == [f"V-{STEPS_V}", f"H{2 * STEPS_H}", f"V-{3 * STEPS_V}"]
+
+
+def test_movimiento_no_soportado():
+    with pytest.raises(ValueError):
+        compilar_camino("S1", [5])
+
+
+def test_validar_movimiento_no_deja_subir():
+    assert validar_movimiento(4, 1) == (False, "No se puede subir en ruta")
+    assert validar_movimiento(1, 4)[0]
+    assert not validar_movimiento(4, "Destino")[0]
+
+
+def test_plan_sale_del_cache():
+    plan = planificar("S2", [2, 5, 8, "Destino"])
+    assert planificar("S2", (2, 5, 8, "Destino")) is plan
+    assert plan.comandos == (f"V-{4 * STEPS_V}",)
+    assert plan.destino == "Destino" and plan.columna_final == 1
+    # La columna de Destino solo cuenta si se sale desde Destino
+    assert planificar("S2", [2], 0) is planificar("S2", [2], 2)
+
+
+def test_reajuste_del_modelo_no_vacia_el_cache(modelo):
+    plan = planificar("S1", [1, 4, 7, "Destino"])
+    antes = plan.duracion
+    for _ in range(20):
+        modelo.registrar("V", 4 * STEPS_V, antes + 0.5)
+    assert planificar("S1", [1, 4, 7, "Destino"]) is plan
+    assert plan.duracion == pytest.approx(sum(seg.tiempo_estimado() for seg in plan))
+    assert plan.duracion > antes
+
+
+def test_retorno_combinado_desde_destino():
+    plan = planificar_retorno("Destino", "S1", 2, combinado=True)
+    [seg] = plan.segmentos
+    assert isinstance(seg, SegmentoCombinado)
+    assert sorted(seg.comandos) == sorted([f"H-{2 * STEPS_H}", f"V{4 * STEPS_V}"])
+    assert seg.destino == "S1"
+    tiempos = [t for t, _ in seg.hitos()]
+    assert tiempos == sorted(tiempos) and tiempos[-1] < seg.tiempo_estimado()
+
+
+def test_retorno_por_separado():
+    plan = planificar_retorno("Destino", "S3", 2, combinado=False)
+    assert plan.comandos == (f"H-{2 * STEPS_H}", f"V{4 * STEPS_V}", f"H{2 * STEPS_H}")
+    assert plan.destino == "S3"
+    assert len(planificar_retorno("S2", "S2")) == 0
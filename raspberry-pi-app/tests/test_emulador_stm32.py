@@ -0,0 +1,40 @@
+import protocolo_binario as pb
+from emulador_stm32 import EmuladorSTM32, ReceptorUART
+
+
+def binario():
+    emu = EmuladorSTM32()
+    emu.procesar_linea("B", 0.0)
+    return emu
+
+
+def test_trama_repetida_se_confirma_sin_ejecutar():
+    emu = binario()
+    primera = emu.procesar_trama(5, pb.MOVER_H, (1328,), 0.0)
+    assert primera[0] == (pb.ACK, 5, pb.ACK_OK)
+    pasos = emu.motores["H"]["pasos"]
+    assert pasos != 0
+    # El host no vio el ACK y reenvia el mismo seq: se confirma, no se repite
+    assert emu.procesar_trama(5, pb.MOVER_H, (1328,), 0.001) == [(pb.ACK, 5, pb.ACK_REPETIDO)]
+    assert emu.motores["H"]["pasos"] == pasos
+
+
+def test_tipo_desconocido():
+    emu = binario()
+    assert emu.procesar_trama(1, 0x7F, None, 0.0) == [(pb.ACK, 1, pb.ACK_DESCONOCIDO)]
+
+
+def test_receptor_descarta_el_resto_de_una_trama_rota():
+    receptor = ReceptorUART()
+    receptor.binario = True
+    rota = bytearray(pb.codificar_comando("H1328", 1))
+    rota[-1] ^= 0xFF
+    # Lo que sigue a la trama rota hasta el '\n' no se ejecuta como texto
+    salida = receptor.agregar(bytes(rota) + b"H1520\nS65\n" + pb.codificar_comando("V0", 2))
+    assert salida == ["S65", (2, pb.MOVER_V, (0,))]
+    assert receptor.errores == 1
+
+
+def test_receptor_ignora_bytes_no_imprimibles():
+    receptor = ReceptorUART()
+    assert receptor.agregar(b"\x00\xffH1\x7f0\r\n") == ["H10"]
@@ -0,0 +1,99 @@
+import pytest
+
+from modelo_tiempos import OLVIDO, PERIODO_PASO, TOLERANCIA_PERIODO, ModeloTiempos
+
+
+def test_recupera_periodo_y_sobrecarga():
+    modelo = ModeloTiempos()
+    periodo, sobrecarga = PERIODO_PASO * 1.02, 0.15
+    for pasos in (1328, 2656, 3984, 5312) * 3:
+        modelo.registrar("V", pasos, pasos * periodo + sobrecarga)
+    assert modelo.parametros["V"] == pytest.approx([periodo, sobrecarga])
+    assert modelo.duracion("V", -2000) == pytest.approx(2000 * periodo + sobrecarga)
+    assert modelo.parametros["H"] == [PERIODO_PASO, 0.1]  # el otro eje no cambia
+
+
+def test_minimos_cuadrados_ponderados_con_olvido():
+    modelo = ModeloTiempos()
+    medidas = [(1000, 2.2), (3000, 6.1), (2000, 4.35), (5000, 10.05), (4000, 8.3)]
+    for x, y in medidas:
+        modelo.registrar("H", x, y)
+    # Mismo ajuste a mano: la medida k-esima pesa OLVIDO ** (ultimas - k)
+    pesos = [OLVIDO ** (len(medidas) - 1 - k) for k in range(len(medidas))]
+    n = sum(pesos)
+    sx = sum(w * x for w, (x, _) in zip(pesos, medidas))
+    sy = sum(w * y for w, (_, y) in zip(pesos, medidas))
+    sxx = sum(w * x * x for w, (x, _) in zip(pesos, medidas))
+    sxy = sum(w * x * y for w, (x, y) in zip(pesos, medidas))
+    periodo = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+    assert modelo.parametros["H"] == pytest.approx([periodo, (sy - periodo * sx) / n])
+
+
+def test_un_solo_largo_solo_ajusta_la_sobrecarga():
+    modelo = ModeloTiempos()
+    for _ in range(5):
+        modelo.registrar("H", 1520, 1520 * PERIODO_PASO + 0.3)
+    assert modelo.parametros["H"] == pytest.approx([PERIODO_PASO, 0.3])
+
+
+def test_periodo_acotado_a_la_tolerancia():
+    modelo = ModeloTiempos()
+    for pasos in (1000, 2000, 3000, 4000):
+        modelo.registrar("V", pasos, pasos * PERIODO_PASO * 2)
+    assert modelo.parametros["V"][0] == pytest.approx(PERIODO_PASO * (1 + TOLERANCIA_PERIODO))
+
+
+def test_olvido_sigue_los_cambios():
+    modelo = ModeloTiempos()
+    for _ in range(50):
+        modelo.registrar("H", 1520, 1520 * PERIODO_PASO + 0.1)
+    for _ in range(60):
+        modelo.registrar("H", 1520, 1520 * PERIODO_PASO + 0.3)
+    assert modelo.parametros["H"][1] > 0.28
+
+
+def test_version_solo_cambia_con_ajustes_que_importan():
+    modelo = ModeloTiempos()
+    for _ in range(30):
+        modelo.registrar("H", 1520, 1520 * PERIODO_PASO + 0.1)
+    assert modelo.version == 0
+    assert modelo.ajustes == 30
+    modelo.registrar("H", 1520, 1520 * PERIODO_PASO + 1.0)
+    assert modelo.version == 1
+
+
+def test_descarta_mediciones_invalidas():
+    modelo = ModeloTiempos()
+    modelo.registrar("H", 0, 1.0)
+    modelo.registrar("H", 100, 0.0)
+    assert modelo.ajustes == 0 and modelo.duracion("H", 0) == 0.0
+
+
+def test_guardar_y_cargar(tmp_path):
+    archivo = str(tmp_path / "modelo.json")
+    modelo = ModeloTiempos()
+    for pasos in (1000, 2000, 3000):
+        modelo.registrar("V", pasos, pasos * PERIODO_PASO * 1.01 + 0.2)
+    modelo.guardar(archivo)
+
+    otro = ModeloTiempos()
+    assert otro.cargar(archivo)
+    assert otro.parametros == pytest.approx(modelo.parametros)
+    assert not ModeloTiempos().cargar(str(tmp_path / "no_existe.json"))
+
+
+@pytest.mark.parametrize("contenido", [
+    "[1, 2]",
+    '{"parametros": {"H": [0.002, 0.1]}}',
+    '{"parametros": {"H": [0.002]}, "sumas": {"H": [0, 0, 0, 0, 0]}}',
+    '{"parametros": {"H": ["x", 0.1]}, "sumas": {"H": [0, 0, 0, 0, 0]}}',
+    '{"parametros": [1, 2]}',
+    "{no es json",
+])
+def test_cargar_archivo_danado(tmp_path, contenido):
+    archivo = tmp_path / "modelo.json"
+    archivo.write_text(contenido)
+    modelo = ModeloTiempos()
+    assert not modelo.cargar(str(archivo))
+    assert modelo.parametros == {"H": [PERIODO_PASO, 0.1], "V": [PERIODO_PASO, 0.1]}
+    assert modelo.version == 0
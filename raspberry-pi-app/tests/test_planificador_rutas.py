@@ -0,0 +1,65 @@
+import itertools
+import random
+
+import pytest
+
+from compilador_movimientos import MAPA_COORDS, planificar, validar_movimiento
+from planificador_rutas import (
+    TIEMPO_DESCARGA, _costo_orden, _matriz_costos, duracion_secuencia, optimizar_orden,
+    planificar_ruta,
+)
+
+ORIGENES = ("S1", "S2", "S3")
+INTERMEDIAS = [z for z in MAPA_COORDS if z not in ORIGENES + ("Destino",)]
+
+
+def cola_al_azar(n, semilla):
+    azar = random.Random(semilla)
+    rutas = []
+    while len(rutas) < n:
+        origen = azar.choice(ORIGENES)
+        camino = planificar_ruta(origen, "Destino", azar.sample(INTERMEDIAS, azar.randint(0, 2)))
+        if camino:
+            rutas.append({"origen": origen, "camino": camino})
+    return rutas
+
+
+def test_planificador_nunca_sube():
+    for origen in ORIGENES:
+        for visitar in itertools.combinations(INTERMEDIAS, 2):
+            camino = planificar_ruta(origen, "Destino", visitar)
+            if camino is None:
+                continue
+            assert camino[-1] == "Destino"
+            assert set(visitar) <= set(camino)
+            for desde, hasta in zip([origen] + camino, camino):
+                assert validar_movimiento(desde, hasta)[0], (origen, visitar, camino)
+
+
+def test_sin_camino_legal():
+    # Para pasar por 9 y terminar en 4 habria que subir
+    assert planificar_ruta("S1", 4, [9]) is None
+    assert planificar_ruta(7, 1) is None
+    assert planificar_ruta("Destino", "Destino") is None
+
+
+@pytest.mark.parametrize("n", [2, 5, 10, 11, 25])
+def test_optimizar_nunca_empeora_el_orden(n):
+    for semilla in range(5):
+        rutas = cola_al_azar(n, semilla)
+        ordenadas, ahorro = optimizar_orden(rutas)
+        assert sorted(map(repr, ordenadas)) == sorted(map(repr, rutas))
+        assert ahorro >= 0
+        antes, despues = duracion_secuencia(rutas), duracion_secuencia(ordenadas)
+        assert despues <= antes + 1e-9
+        assert antes - despues == pytest.approx(ahorro)
+
+
+def test_duracion_secuencia_coincide_con_la_matriz():
+    rutas = cola_al_azar(30, 7)
+    recorridos = sum(planificar(r['origen'], r['camino']).duracion for r in rutas)
+    for inicio, columna in (("S1", 1), ("S3", 1), ("Destino", 0)):
+        traslados = _costo_orden(list(range(len(rutas))), *_matriz_costos(rutas, inicio, columna))
+        esperado = traslados + recorridos + len(rutas) * TIEMPO_DESCARGA
+        assert duracion_secuencia(rutas, inicio, columna) == pytest.approx(esperado)
+    assert duracion_secuencia([]) == 0.0
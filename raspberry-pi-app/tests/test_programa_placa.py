@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+import programa_placa as pp
+import protocolo_binario as pb
+from compilador_movimientos import compilar_camino, planificar_retorno
+from controlador_canicas import ControladorCanicas, ProgramaAbortado
+from emulador_stm32 import BAUDIOS_BASE, EmuladorSTM32
+from nucleo_async import EnlaceSerialAsync
+from reloj import RelojVirtual
+
+RUTA = {"origen": "S1", "camino": [1, 4, 7, "Destino"]}
+
+
+def programa_de_prueba():
+    programa = pp.Programa()
+    for seg in compilar_camino("S1", [1, 2, 3, 6, 9, "Destino"]):
+        programa.mover(seg)
+    for seg in planificar_retorno("Destino", "S1", columna_destino=3):
+        programa.mover(seg)
+    programa.pausa(0.5)
+    programa.servo(65)
+    programa.pausa(1.0)
+    return programa
+
+
+def test_codificar_y_decodificar():
+    programa = programa_de_prueba()
+    numero, operaciones = pp.decodificar(programa.codificar(300))
+    assert numero == 300 & 0xFF
+    assert operaciones == [(paso.op, paso.valores) for paso in programa.pasos]
+    assert {op for op, _ in operaciones} == set(pp.FORMATOS_OP)
+
+
+def test_pausa_larga_se_parte_en_varios_pasos():
+    programa = pp.Programa()
+    programa.pausa(70.0)
+    assert [paso.valores for paso in programa.pasos] == [(65535,), (4465,)]
+    assert programa.duracion() == pytest.approx(70.0)
+
+
+def test_programa_que_no_entra_en_una_trama():
+    programa = pp.Programa()
+    for _ in range(pb.CARGA_MAXIMA):
+        programa.servo(65)
+    with pytest.raises(pb.ErrorProtocolo):
+        programa.codificar(1)
+
+
+@pytest.mark.parametrize("carga", [b"", b"\x01\x7f", b"\x01\x01\x00\x00"])
+def test_decodificar_carga_mal_armada(carga):
+    with pytest.raises(pb.ErrorProtocolo):
+        pp.decodificar(carga)
+
+
+# --- EMULADOR ---
+def binario():
+    emu = EmuladorSTM32()
+    emu.procesar_linea("B", 0.0)
+    return emu
+
+
+def progreso(salida):
+    return [tuple(int(v) for v in s[5:].split(",")) for s in salida if isinstance(s, str) and s.startswith("#PRG,")]
+
+
+def test_emulador_ejecuta_el_programa_y_avisa_cada_paso():
+    emu = binario()
+    programa = programa_de_prueba()
+    assert emu.procesar_trama(1, pb.PROGRAMA, (programa.codificar(7),), 0.0) == [(pb.ACK, 1, pb.ACK_OK)]
+    salida = emu.avanzar(programa.duracion() + 5.0)
+    pasos = [(7, i, pp.PASO) for i in range(len(programa))]
+    assert progreso(salida) == pasos + [(7, len(programa), pp.TERMINADO)]
+    assert salida.count("#FIN,H") and salida.count("#FIN,V")
+
+
+def test_emulador_aborta_el_programa_con_una_parada():
+    emu = binario()
+    programa = programa_de_prueba()
+    emu.procesar_trama(1, pb.PROGRAMA, (programa.codificar(7),), 0.0)
+    emu.avanzar(0.1)
+    salida = emu.procesar_trama(2, pb.PARADA, (), 0.1)
+    assert salida[0] == (pb.ACK, 2, pb.ACK_OK)
+    assert progreso(salida) == [(7, 0, pp.ABORTADO)]
+    # Nada del programa sigue despues de la parada
+    assert progreso(emu.avanzar(programa.duracion() + 5.0)) == []
+
+
+def test_emulador_rechaza_un_programa_mal_armado():
+    emu = binario()
+    assert emu.procesar_trama(1, pb.PROGRAMA, (b"\x01\x7f",), 0.0) == [(pb.ACK, 1, pb.ACK_DESCONOCIDO)]
+
+
+# --- CONTROLADOR ---
+def correr(prueba, emu):
+    """Corre `prueba(control)` con la placa emulada en binario, en tiempo virtual."""
+    control = ControladorCanicas(reloj=RelojVirtual())
+    control.ajustar_modelo = lambda seg: None  # no tocar el MODELO compartido
+    loop = control.nucleo.loop
+
+    async def principal():
+        ser = await emu.conectar_loop(BAUDIOS_BASE)
+        control.enlace = EnlaceSerialAsync(ser, control._al_recibir_linea, BAUDIOS_BASE)
+        await control.enlace.iniciar()
+        try:
+            assert await control.enlace.negociar_binario(1.0)
+            assert control.programas_en_placa
+            return await prueba(control)
+        finally:
+            control.enlace.detener()
+            emu.detener()
+            ser.close()
+
+    try:
+        return loop.run_until_complete(principal())
+    finally:
+        loop.close()
+
+
+def test_secuencia_con_programas_en_la_placa():
+    async def prueba(control):
+        await control.secuencia([RUTA, {"origen": "S3", "camino": [3, 6, 9, "Destino"]}])
+        return control
+
+    control = correr(prueba, EmuladorSTM32())
+    assert control.contadores.canicas == 2
+    assert control.posicion.zona == "S1"
+    assert control._programa is None
+    assert control.enlace.perdidos_tx == 0 and control.enlace.reenvios == 0
+    # Cada ruta va en un programa (el retorno a S3 en otro)
+    assert control.metricas._valores[("canicas_programas_total", ())] >= 2
+    assert ("canicas_fin_perdidos_total", ()) not in control.metricas._valores
+
+
+@pytest.mark.parametrize("perder_stop", [False, True])
+def test_boton_azul_aborta_el_programa(perder_stop):
+    emu = EmuladorSTM32()
+    if perder_stop:
+        # Sin el #STOP el controlador se entera por el aviso de abortado
+        codificar = emu._codificar
+        emu._codificar = lambda respuesta: b"" if respuesta == "#STOP" else codificar(respuesta)
+
+    async def prueba(control):
+        asyncio.get_running_loop().call_later(3.0, emu.presionar_boton)
+        with pytest.raises(ProgramaAbortado):
+            await control.secuencia([RUTA, RUTA])
+        return control
+
+    control = correr(prueba, emu)
+    assert control.detenido
+    assert control._programa is None
+    assert control.contadores.canicas == 0
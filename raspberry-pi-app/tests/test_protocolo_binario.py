@@ -0,0 +1,98 @@
+import pytest
+
+import protocolo_binario as pb
+
+
+# --- CRC ---
+def test_crc16_vectores_conocidos():
+    # CRC-16/CCITT-FALSE: el check del catalogo es 0x29B1
+    assert pb.crc16(b"123456789") == 0x29B1
+    assert pb.crc16(b"") == 0xFFFF
+    assert pb.crc16(b"A") == 0xB915
+
+
+def test_crc16_acepta_memoryview_y_continua():
+    datos = b"123456789"
+    assert pb.crc16(memoryview(datos)) == 0x29B1
+    assert pb.crc16(datos[4:], pb.crc16(datos[:4])) == 0x29B1
+
+
+# --- CODIFICACION ---
+def test_comando_ida_y_vuelta():
+    trama = pb.codificar_comando("H-1520", 7)
+    assert trama[0] == pb.SYNC
+    assert pb.DecodificadorTramas().agregar(trama) == [(7, pb.MOVER_H, (-1520,))]
+
+
+def test_comando_sin_trama():
+    with pytest.raises(pb.ErrorProtocolo):
+        pb.codificar_comando("Z1", 1)
+    with pytest.raises(pb.ErrorProtocolo):
+        pb.codificar_comando("Habc", 1)
+
+
+def test_carga_variable_demasiado_larga():
+    with pytest.raises(pb.ErrorProtocolo):
+        pb.codificar(pb.PROGRAMA, 1, bytes(pb.CARGA_MAXIMA + 1))
+
+
+def test_aviso_id_lleva_las_capacidades():
+    trama = pb.codificar_aviso("#ID,CANICAS,4,BIN,BAUD,PRG", 3)
+    [(seq, tipo, valores)] = pb.DecodificadorTramas().agregar(trama)
+    assert (seq, tipo) == (3, pb.ID)
+    assert valores[1] == pb.CAPACIDAD_BINARIO | pb.CAPACIDAD_PROGRAMAS
+    assert pb.aviso_como_linea(tipo, valores) == "#ID,CANICAS,4,BIN,PRG"
+
+
+# --- VENTANA DE SEQ ---
+def test_ventana_seq_da_la_vuelta():
+    ventana = pb.VentanaSeq()
+    for seq in (253, 254, 255, 0, 1):
+        assert ventana.registrar(seq) == pb.ACK_OK
+    assert ventana.ultimo == 1
+    # Los de antes de la vuelta siguen dentro de la ventana
+    assert ventana.registrar(255) == pb.ACK_REPETIDO
+    assert ventana.registrar(0) == pb.ACK_REPETIDO
+
+
+def test_ventana_seq_repetidos_y_desordenados():
+    ventana = pb.VentanaSeq()
+    assert ventana.registrar(10) == pb.ACK_OK
+    assert ventana.registrar(12) == pb.ACK_OK
+    # 11 llego tarde (se reenvio) pero nunca se ejecuto
+    assert ventana.registrar(11) == pb.ACK_OK
+    assert ventana.registrar(11) == pb.ACK_REPETIDO
+    assert ventana.registrar(12) == pb.ACK_REPETIDO
+
+
+def test_ventana_seq_viejo():
+    ventana = pb.VentanaSeq()
+    ventana.registrar(100)
+    assert ventana.registrar(100 - pb.VENTANA_SEQ) == pb.ACK_VIEJO
+    assert ventana.registrar(100 - pb.VENTANA_SEQ + 1) == pb.ACK_OK
+
+
+# --- DECODIFICADOR DEL HOST ---
+def test_decodificador_resincroniza_despues_de_una_trama_corrupta():
+    rota = bytearray(pb.codificar_aviso("#FIN,H", 1))
+    rota[-1] ^= 0xFF
+    buena = pb.codificar_aviso("#FIN,V", 2)
+    decodificador = pb.DecodificadorTramas()
+    salida = decodificador.agregar(bytes(rota) + buena + b"#RST\n")
+    assert salida == [(2, pb.FIN, (b"V",)), "#RST"]
+    assert decodificador.errores_crc >= 1
+
+
+def test_decodificador_byte_a_byte():
+    datos = pb.codificar_comando("S65", 9) + b"#IN,1,0,1\n" + pb.codificar_comando("V1328", 10)
+    decodificador = pb.DecodificadorTramas()
+    salida = []
+    for i in range(len(datos)):
+        salida += decodificador.agregar(datos[i:i + 1])
+    assert salida == [(9, pb.SERVO, (65,)), "#IN,1,0,1", (10, pb.MOVER_V, (1328,))]
+
+
+def test_decodificador_largo_imposible():
+    # Un sync suelto con un largo mayor que la carga maxima no traba la lectura
+    decodificador = pb.DecodificadorTramas()
+    assert decodificador.agregar(bytes([pb.SYNC, 0xFF]) + b"#STOP\n") == ["#STOP"]
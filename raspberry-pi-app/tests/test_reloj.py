@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+
+from reloj import RelojVirtual
+
+
+def test_automatico_salta_las_esperas():
+    reloj = RelojVirtual()
+    loop = reloj.nuevo_loop()
+    try:
+        inicio = time.monotonic()
+        loop.run_until_complete(asyncio.sleep(3600))
+        assert loop.time() == reloj.ahora() >= 3600
+        assert time.monotonic() - inicio < 1.0
+    finally:
+        loop.close()
+
+
+def test_automatico_respeta_el_orden_de_los_timers():
+    reloj = RelojVirtual(inicio=10.0)
+    loop = reloj.nuevo_loop()
+    orden = []
+
+    async def esperar(segundos):
+        await asyncio.sleep(segundos)
+        orden.append((segundos, loop.time()))
+
+    async def todas():
+        await asyncio.gather(esperar(3), esperar(1), esperar(2))
+
+    try:
+        loop.run_until_complete(todas())
+    finally:
+        loop.close()
+    assert orden == [(1, 11.0), (2, 12.0), (3, 13.0)]
+
+
+def test_manual_solo_avanza_con_avanzar():
+    reloj = RelojVirtual(automatico=False)
+    loop = reloj.nuevo_loop()
+    hilo = threading.Timer(0.05, reloj.avanzar, (5.0,))
+    hilo.start()
+    try:
+        loop.run_until_complete(asyncio.wait_for(asyncio.sleep(5.0), 60))
+        assert reloj.ahora() == 5.0
+    finally:
+        hilo.join()
+        loop.close()
+
+
+def test_dormir_en_automatico():
+    reloj = RelojVirtual()
+    reloj.dormir(2.5)
+    assert reloj.ahora() == 2.5
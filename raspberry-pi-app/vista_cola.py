@@ -0,0 +1,171 @@
+"""Lista de la cola de rutas para la interfaz, virtualizada.
+
+Antes cada cambio destruia y volvia a crear un Frame con sus botones por
+cada ruta de la cola (O(n) widgets por click). VistaCola tiene solo las filas
+que entran en pantalla y las reutiliza: mostrar una cola de 500 rutas,
+subir, bajar o borrar una toca como mucho esas filas, y de ellas solo
+reconfigura las que cambiaron de texto o de botones.
+"""
+import tkinter as tk
+
+from compilador_movimientos import planificar
+
+FONDO = "#334155"
+BOTON = "#475569"
+BORRAR = "#ef4444"
+# Cuantos pasos del camino se muestran antes de "..."
+PASOS_VISIBLES = 4
+# Tamano pedido por la lista (las filas no lo agrandan: ver _al_redimensionar)
+ALTO_FILA = 30
+ANCHO_LISTA = 260
+
+
+def texto_ruta(indice, ruta):
+    camino = "->".join(map(str, ruta['camino'][:PASOS_VISIBLES]))
+    if len(ruta['camino']) > PASOS_VISIBLES:
+        camino += "..."
+    # El plan sale del cache: pintar la lista no recompila las rutas
+    segundos = planificar(ruta['origen'], ruta['camino']).duracion
+    return f"[{ruta['origen']}] # {indice + 1}: {camino} ({segundos:.0f} s)"
+
+
+class VistaCola(tk.Frame):
+    """Cola de rutas con un grupo fijo de filas que se desplaza con la barra o la rueda.
+
+    `al_mover(indice, direccion)` y `al_borrar(indice)` reciben el indice en
+    la cola, no el de la fila.
+    """
+
+    def __init__(self, padre, al_mover, al_borrar, filas=8):
+        super().__init__(padre, bg=FONDO)
+        self.al_mover = al_mover
+        self.al_borrar = al_borrar
+        self.rutas = []
+        self.inicio = 0  # indice de la ruta en la primera fila
+
+        self.barra = tk.Scrollbar(self, orient="vertical", command=self._desplazar)
+        self.barra.pack(side="right", fill="y")
+        self.cuerpo = tk.Frame(self, bg=FONDO, width=ANCHO_LISTA, height=filas * ALTO_FILA)
+        self.cuerpo.pack_propagate(False)
+        self.cuerpo.pack(side="left", fill="both", expand=True)
+        self.lbl_vacia = tk.Label(self.cuerpo, text="Cola vacía", bg=FONDO, fg="#94a3b8")
+
+        self._filas = []
+        self._alto_fila = None
+        for _ in range(filas):
+            self._agregar_fila()
+        self.cuerpo.bind("<Configure>", self._al_redimensionar)
+        self._enlazar_rueda(self.cuerpo)
+        self._pintar()
+
+    # --- API ---
+    def mostrar(self, rutas):
+        """Muestra `rutas` (la lista de la cola) tocando solo las filas que cambian."""
+        self.rutas = rutas
+        self.inicio = max(0, min(self.inicio, len(rutas) - len(self._filas)))
+        self._pintar()
+
+    def ver(self, indice):
+        """Desplaza lo minimo para que la ruta `indice` quede visible."""
+        if indice < self.inicio:
+            self.inicio = indice
+        elif indice >= self.inicio + len(self._filas):
+            self.inicio = indice - len(self._filas) + 1
+        self.mostrar(self.rutas)
+
+    # --- FILAS ---
+    def _agregar_fila(self):
+        fila = {"indice": None, "estado": None}
+        fila["frame"] = tk.Frame(self.cuerpo, bg=FONDO, pady=2)
+        f_prio = tk.Frame(fila["frame"], bg=FONDO)
+        f_prio.pack(side="left")
+        fila["arriba"] = tk.Button(f_prio, text="▲", font=("Arial", 6), height=1, bg=BOTON, fg="white",
+                                   command=lambda: self._mover(fila, -1))
+        fila["arriba"].pack(side="top", padx=1)
+        fila["abajo"] = tk.Button(f_prio, text="▼", font=("Arial", 6), height=1, bg=BOTON, fg="white",
+                                  command=lambda: self._mover(fila, 1))
+        fila["abajo"].pack(side="bottom", padx=1)
+        fila["texto"] = tk.Label(fila["frame"], bg=FONDO, fg="white", anchor="w", font=("Arial", 9))
+        fila["texto"].pack(side="left", fill="x", expand=True, padx=5)
+        tk.Button(fila["frame"], text="X", bg=BORRAR, fg="white", width=3,
+                  command=lambda: self._borrar(fila)).pack(side="right", padx=2)
+        for w in (fila["frame"], f_prio, fila["texto"], fila["arriba"], fila["abajo"]):
+            self._enlazar_rueda(w)
+        self._filas.append(fila)
+        return fila
+
+    def _quitar_fila(self):
+        fila = self._filas.pop()
+        fila["frame"].destroy()
+
+    def _mover(self, fila, direccion):
+        if fila["indice"] is not None:
+            self.al_mover(fila["indice"], direccion)
+
+    def _borrar(self, fila):
+        if fila["indice"] is not None:
+            self.al_borrar(fila["indice"])
+
+    def _pintar(self):
+        n = len(self.rutas)
+        if n == 0:
+            self.lbl_vacia.pack(pady=10)
+        else:
+            self.lbl_vacia.pack_forget()
+
+        for i, fila in enumerate(self._filas):
+            indice = self.inicio + i
+            estado = (texto_ruta(indice, self.rutas[indice]), indice > 0, indice < n - 1) if indice < n else None
+            fila["indice"] = indice if estado else None
+            if estado == fila["estado"]:
+                continue
+            if estado is None:
+                fila["frame"].pack_forget()
+            else:
+                texto, puede_subir, puede_bajar = estado
+                fila["texto"].config(text=texto)
+                self._flecha(fila["arriba"], "▲", puede_subir)
+                self._flecha(fila["abajo"], "▼", puede_bajar)
+                if fila["estado"] is None:
+                    fila["frame"].pack(fill="x", pady=1)
+            fila["estado"] = estado
+
+        if n:
+            self.barra.set(self.inicio / n, min(1.0, (self.inicio + len(self._filas)) / n))
+        else:
+            self.barra.set(0.0, 1.0)
+
+    def _flecha(self, boton, texto, activa):
+        if activa:
+            boton.config(text=texto, state="normal", bg=BOTON, relief="raised")
+        else:
+            boton.config(text=" ", state="disabled", bg=FONDO, relief="flat")
+
+    # --- DESPLAZAMIENTO ---
+    def _desplazar(self, accion, cantidad, unidad=None):
+        visibles = len(self._filas)
+        if accion == "moveto":
+            self.inicio = int(float(cantidad) * len(self.rutas))
+        elif unidad == "pages":
+            self.inicio += int(cantidad) * visibles
+        else:
+            self.inicio += int(cantidad)
+        self.mostrar(self.rutas)
+
+    def _enlazar_rueda(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self._desplazar("scroll", -1 if e.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda e: self._desplazar("scroll", -1))
+        widget.bind("<Button-5>", lambda e: self._desplazar("scroll", 1))
+
+    def _al_redimensionar(self, evento):
+        # Tantas filas como entren en el alto disponible
+        if self._alto_fila is None:
+            self._alto_fila = max(1, self._filas[0]["frame"].winfo_reqheight() + 2)
+        caben = max(1, evento.height // self._alto_fila)
+        if caben == len(self._filas):
+            return
+        while len(self._filas) < caben:
+            self._agregar_fila()
+        while len(self._filas) > caben:
+            self._quitar_fila()
+        self.mostrar(self.rutas)